@@ -6,230 +6,442 @@
 # of the ISC license.  See the LICENSE file for details.
 
 from argparse import ArgumentParser, FileType
+from asmcache import BlockCache, source_stamp
+from asmprof import Profiler
+from cycles import budget_warnings, listing
+from expr import evaluate, parse as parse_expr, split, uses_pc
 from functools import partial
-from opcodes import first_mode, INSTRUCTION_LENGTH, is_illegal, OPCODES
-from sys import stderr
-
-lo = lambda x: x & 0xff
-hi = lambda x: (x >> 8) & 0xff
+from link import (
+    BUDGET, DATA, EQU, FILE, image, INST, LABEL, link, Linker, lo, Object, ORG,
+    TABLE, write, write_mmap, write_segments,
+)
+from optables import ENCODE, ILLEGAL, INSTRUCTION_LENGTH, MODES, NAMES
+from os import cpu_count
+from os.path import join, dirname
+from peephole import Optimizer
+from preproc import INCLUDES, Preprocessor
+from re import compile as re_compile
+from sys import stderr, stdout
+from tabulate import as_bytes, tabulate, unresolved
 
 warn = partial(print, file=stderr)
 
-
-def parse_num(arg, return_use_long=False):
-    use_long = False
-    num = None
-    if arg[0] == "$":
-        arg = arg[1:]
-        if len(arg) > 2:
-            use_long = True
-        num = int(arg, 16)
-    else:
-        if arg[0] == "0" and len(arg) > 1:
-            use_long = True
-        num = int(arg)
-    if return_use_long:
-        return use_long, num
-    return num
+# (value,X), (value),Y, (value) or value[,X|,Y], in that order
+OPERAND = re_compile(
+    r"\((?P<izx>.*),[xX]\)|\((?P<izy>.*)\),[yY]|\((?P<ind>.*)\)|"
+    r"(?:\$(?P<hex>[0-9a-fA-F]+)|(?P<dec>[0-9]+)|(?P<sym>[^,]*))"
+    r"(?:,(?P<idx>[xXyY]))?"
+)
+INDIRECT = {"izx": "iz,x", "izy": "iz,y", "ind": "ind"}
+PAIRS = {
+    None: ("zp", "abs"),
+    "x": ("zp,x", "abs,x"),
+    "X": ("zp,x", "abs,x"),
+    "y": ("zp,y", "abs,y"),
+    "Y": ("zp,y", "abs,y"),
+}
 
 
 class Instruction:
-    def __init__(self, parser, mnemonic, opcode, arg):
+    def __init__(self, parser, mnemonic, name, arg):
         self.parser = parser
-        self.opcode = opcode
+        # the canonical mnemonic, self.mnemonic may be an alias
+        self.name = name
         dot = mnemonic.find(".")
         self.mnemonic = (mnemonic if dot < 0 else mnemonic[:dot]).upper()
-        assert(self.mnemonic == opcode.mnemonic)
+        assert(NAMES[self.mnemonic] == name)
         self.mode = mnemonic[dot + 1:] if dot >= 0 else None
         self.arg = arg
         self.num = None
-        self.inst = None
-        self.len = 1
 
     def parse_mode(self):
-        if self.arg is None:
-            if "a" in self.opcode.modes:
-                return "a"
-            return "_"
-        if self.arg.upper() is "A":
-            return "a"
-        if self.arg[0] == "#":
-            self.arg = self.arg[1:]
-            return "#"
-        if "r" in self.opcode.modes:
-            return "r"
-        if self.arg[0] == "(" and self.arg[-3:].upper() == ",X)":
-            self.arg = self.arg[1:-3]
-            return "zi,x"
-        if self.arg[0] == "(" and self.arg[-3:].upper() == "),Y":
-            self.arg = self.arg[1:-3]
-            return "zi,y"
-        if self.arg[0] == "(" and self.arg[-1] == ")":
-            self.arg = self.arg[1:-1]
-            return "ind"
-        pair = ["zp", "abs"]
-        if self.arg[-2:].upper() == ",X":
-            self.arg = self.arg[:-2]
-            pair = ["zp,x", "abs,x"]
-        elif self.arg[-2:].upper() == ",Y":
-            self.arg = self.arg[:-2]
-            pair = ["zp,y", "abs,y"]
-        for i in range(len(pair) - 1, -1, -1):
-            if pair[i] not in self.opcode.modes:
-                pair.pop(i)
-        assert(len(pair) > 0)
-        use_long, self.num = self.parse_num_or_label(True)
-        return pair[-1 if use_long else 0]
-
-    def adjust(self):
-        if self.len == 1:
-            return self.inst,
-        elif self.len == 2:
-            return self.inst, self.num
-        elif self.len == 3:
-            return self.inst, lo(self.num), hi(self.num)
-        raise ValueError(str(self))
+        modes = MODES[self.name]
+        arg = self.arg
+        if arg is None:
+            if "a" in modes:
+                return "a",
+            return "_",
+        if arg == "A" or arg == "a":
+            return "a",
+        if arg[0] == "#":
+            self.arg = arg[1:]
+            return "#",
+        if "r" in modes:
+            return "r",
+        m = OPERAND.fullmatch(arg)
+        if m is None:
+            raise ValueError("bad operand {}".format(arg))
+        kind = m.lastgroup
+        if kind in INDIRECT:
+            self.arg = m[kind]
+            return INDIRECT[kind],
+        pair = [mode for mode in PAIRS[m["idx"]] if mode in modes]
+        if len(pair) == 0:
+            raise ValueError("no such addressing mode for {}".format(
+                self.mnemonic
+            ))
+        hexdigits, decimal, symbol = m.group("hex", "dec", "sym")
+        if hexdigits is not None:
+            self.num = int(hexdigits, 16)
+            return pair[-1 if len(hexdigits) > 2 else 0],
+        if decimal is not None:
+            self.num = int(decimal)
+            return pair[-1 if len(decimal) > 1 and decimal[0] == "0" else 0],
+        self.arg = symbol
+        self.num = parse_expr(symbol)
+        if type(self.num) is int:
+            return pair[-1 if self.num > 0xff or self.num < 0 else 0],
+        # symbols, the linker picks the shortest mode that fits
+        return tuple(pair)
 
     def parse(self):
         if self.mode is None:
-            self.mode = self.parse_mode()
-            assert(self.mode in self.opcode.modes)
-        self.len = INSTRUCTION_LENGTH[self.mode]
-        if self.inst is None:
-            self.inst = first_mode(self.opcode, self.mode)
-        if self.mode == "r":
-            return self.inst, self.relative()
-        if self.len > 1 and self.num is None:
-            self.num = self.parse_num_or_label()
-        return self.adjust()
-
-    def parse_num_or_label(self, return_use_long=False):
-        use_long = False
-        num = None
-        label = self.parser.labels.get(self.arg, None)
-        if label is not None:
-            num = self.parser.org + label
-            use_long = True
-        try:
-            if num is None:
-                use_long, num = parse_num(self.arg, True)
-        except ValueError:
-            num = 0
-            use_long = True
-            if self.arg not in self.parser.forward_labels:
-                self.parser.forward_labels[self.arg] = []
-            self.parser.forward_labels[self.arg].append({
-                "offset": len(self.parser.output),
-                "mode": "abs",
-            })
-        if return_use_long:
-            return use_long, num
-        return num
-
-    def relative(self):
-        j = None
-        label = self.parser.labels.get(self.arg, None)
-        if label is not None:
-            j = self.parser.labels[self.arg] - len(self.parser.output) - 2
-            assert(j > -129 and j < 128)
-            return lo(j)
-        try:
-            if j is None:
-                j = self.parser.org + parse_num(self.arg) - 2
-        except ValueError:
-            j = 0
-            if self.arg not in self.parser.forward_labels:
-                self.parser.forward_labels[self.arg] = []
-            self.parser.forward_labels[self.arg].append({
-                "offset": len(self.parser.output),
-                "mode": "r",
-            })
-        assert(j > -129 and j < 128)
-        return lo(j)
-
+            modes = self.parse_mode()
+        else:
+            modes = self.mode,
+        if not all(mode in MODES[self.name] for mode in modes):
+            raise ValueError("{} for {}".format(
+                "missing operand" if modes == ("_", ) else
+                "no such addressing mode", self.mnemonic
+            ))
+        if self.num is None and INSTRUCTION_LENGTH[modes[0]] > 1:
+            if self.arg is None:
+                raise ValueError("missing operand for {}".format(
+                    self.mnemonic
+                ))
+            self.num = parse_expr(self.arg)
+        return INST, self.name, modes, self.num, self.parser.lineno
 
     def __str__(self):
         return "<Instruction({})>".format(str({
-            "opcode": self.opcode,
+            "name": self.name,
             "mnemonic": self.mnemonic,
             "mode": self.mode,
             "arg": self.arg,
             "num": self.num,
-            "inst": self.inst,
-            "len": self.len,
         }))
 
 
 class MOS6502Parser:
     comment_chars = (";", )
+    instruction = Instruction
 
-    def __init__(self, infh, warn_illegal):
+    def __init__(self, infh=None, warn_illegal=False, cache=None, name=None,
+                 profiler=None, include_path=(), relax=False, optimizer=None):
         self.warn_illegal = warn_illegal
+        self.relax = relax
+        self.optimizer = optimizer
+        self.cache = cache
+        self.name = name
+        self.profiler = profiler
+        self.preproc = Preprocessor(include_path)
+        # the file the current line came from, differs from name in includes
+        self.filename = name
         self.org = None
-        self.output = bytearray()
+        self.segments = []
+        self.linker = None
+        self.items = [] if name is None else [(FILE, name, 0)]
         self.labels = {}
-        self.forward_labels = {}
-        for line in infh.readlines():
-            for cc in self.comment_chars:
-                comment = line.find(cc)
-                if comment >= 0:
-                    line = line[:comment]
-            colon = line.find(":")
-            if colon >= 0:
-                # todo: remove label from beginning of line
-                label, line = line.split(":", 1)
-                label = label.strip()
-                self.labels[label] = len(self.output)
-                if label in self.forward_labels:
-                    self.insert_forward_label(self.forward_labels.pop(label))
-            line = line.split()
+        # the names .export makes visible to other modules, see object()
+        self.exports = []
+        # the equates among items[:scanned] that have a value without labels
+        self.constants = {}
+        self.scanned = 0
+        # set when a line depends on equates outside its cache block
+        self.volatile = False
+        # the start of a line that feed_text() has not seen the end of yet
+        self.pending = []
+        self.lineno = 0
+        self.srcno = 0
+        self.block = []
+        if profiler is not None:
+            profiler.attach(self)
+        self.add_line = self.parse_line if cache is None else self.cache_line
+        if infh is not None:
+            self.feed(infh)
+            self.finish()
+
+    def feed(self, lines):
+        # one line per item, as from a file, with or without its newline
+        assert not isinstance(lines, str), "text goes to feed_text()"
+        if self.profiler is not None:
+            lines = self.profiler.timed_iter(lines)
+        for line in lines:
+            if line[-1:] == "\n":
+                line = line[:-1]
+            self.source_line(line)
+        return self
+
+    def feed_text(self, chunk):
+        # text in chunks that need not end at the end of a line
+        *complete, tail = chunk.split("\n")
+        if len(complete) > 0 and len(self.pending) > 0:
+            self.pending.append(complete[0])
+            complete[0] = "".join(self.pending)
+            self.pending = []
+        for line in complete:
+            self.source_line(line)
+        if tail:
+            self.pending.append(tail)
+        return self
+
+    def source_line(self, line):
+        self.srcno += 1
+        lines = self.preproc.line(self.name, self.srcno, line)
+        if lines is None:
+            if self.filename == self.name and \
+                    self.srcno == self.lineno + len(self.block) + 1:
+                self.add_line(line)
+                return
+            lines = (self.name, self.srcno, line),
+        for name, lineno, line in lines:
+            # cache blocks only ever hold consecutive lines of one file
+            if name != self.filename:
+                if len(self.block) > 0:
+                    self.flush_block()
+                self.filename = name
+                self.items.append((FILE, name, 0))
+            if lineno != self.lineno + len(self.block) + 1:
+                if len(self.block) > 0:
+                    self.flush_block()
+                self.lineno = lineno - 1
+            self.add_line(line)
+
+    def flush(self):
+        if len(self.pending) > 0:
+            self.source_line("".join(self.pending))
+            self.pending = []
+        self.preproc.finish()
+        if len(self.block) > 0:
+            self.flush_block()
+
+    def object(self):
+        self.flush()
+        # the leading FILE item is link()'s business, those of includes stay
+        items = self.items[1:] if self.name is not None else self.items
+        defined = {item[1] for item in items if item[0] in (LABEL, EQU)}
+        missing = [name for name in self.exports if name not in defined]
+        if len(missing) > 0:
+            raise ValueError("{}: .export of undefined {}".format(
+                self.name, ", ".join(missing)
+            ))
+        return Object(
+            self.name, items, tuple(self.exports),
+            tuple(self.preproc.includes.items()),
+        )
+
+    def finish(self):
+        self.flush()
+        linker = Linker(
+            self.items, self.profiler, self.relax, self.optimizer
+        ).link()
+        self.linker = linker
+        self.org = linker.org
+        self.segments = linker.segments
+        self.labels = linker.symbols
+        return self
+
+    @property
+    def output(self):
+        return image(self.segments)[1]
+
+    def strip_comment(self, line):
+        for cc in self.comment_chars:
+            comment = line.find(cc)
+            if comment >= 0:
+                line = line[:comment]
+        return line
+
+    def cache_line(self, line):
+        # blocks start at labels and .org, so an edit re-parses one routine
+        if len(self.block) > 0:
+            line_ = self.strip_comment(line)
+            if ":" in line_ or line_.lstrip()[:4].upper() == ".ORG":
+                self.flush_block()
+        self.block.append(line)
+
+    def flush_block(self):
+        block, self.block = self.block, []
+        key = self.cache.key(block)
+        base = self.lineno
+        items = self.cache.get(key)
+        if items is None:
+            start = len(self.items)
+            self.volatile = False
+            for line in block:
+                self.parse_line(line)
+            if self.volatile:
+                return
+            self.cache.put(key, tuple(
+                item[:-1] + (item[-1] - base, ) for item in self.items[start:]
+            ))
+            return
+        for item in items:
+            item = item[:-1] + (item[-1] + base, )
+            if item[0] == INST:
+                self.check_illegal(item)
+            self.items.append(item)
+        self.lineno += len(block)
+
+    def parse_line(self, line):
+        self.lineno += 1
+        line = self.strip_comment(line)
+        colon = line.find(":")
+        if colon >= 0:
+            # todo: remove label from beginning of line
+            label, line = line.split(":", 1)
+            self.items.append((LABEL, label.strip(), self.lineno))
+        try:
+            name, eq, value = line.partition("=")
+            if eq and name.strip().isidentifier():
+                self.items.append(
+                    (EQU, name.strip(), parse_expr(value.strip()), self.lineno)
+                )
+                return
+            # the operand is the rest of the line, whitespace and all
+            line = line.split(None, 1)
             if len(line) > 0:
                 self.interpret(line)
-        assert(len(self.forward_labels) == 0)
-
-    def insert_forward_label(self, forward_labels):
-        for fwl in forward_labels:
-            if fwl["mode"] == "r":
-                addr = len(self.output) - fwl["offset"] - 2
-                self.output[fwl["offset"] + 1] = addr
-            elif fwl["mode"] == "abs":
-                addr = self.org + len(self.output)
-                self.output[fwl["offset"] + 1] = lo(addr)
-                self.output[fwl["offset"] + 2] = hi(addr)
+        except ValueError as e:
+            msg = "line {}: {}".format(self.lineno, e)
+            raise ValueError(msg if self.filename is None else "{}: {}".format(
+                self.filename, msg
+            ))
 
     def interpret(self, line):
         if line[0].upper().startswith(".ORG"):
-            assert(len(line) == 2)
-            if self.org is None:
-                self.org = parse_num(line[1])
-            else:
-                pad = parse_num(line[1]) - (self.org + len(self.output))
-                assert(pad >= 0)
-                if pad > 0:
-                    self.output.extend(bytearray(pad))
+            org = self.constant(line[1].strip()) if len(line) == 2 else None
+            if org is None:
+                raise ValueError(".org needs a constant")
+            self.items.append((ORG, org, self.lineno))
+            return
+        elif line[0].upper().startswith(".BUDGET"):
+            if len(line) != 2:
+                raise ValueError(".budget needs a cycle count")
+            self.items.append(
+                (BUDGET, parse_expr(line[1].strip()), self.lineno)
+            )
+            return
+        elif line[0].upper().startswith(".EXPORT"):
+            # only matters to modules linked with others
+            names = split(line[1]) if len(line) == 2 else []
+            if len(names) == 0 or not all(x.isidentifier() for x in names):
+                raise ValueError(".export takes label names")
+            self.exports.extend(x for x in names if x not in self.exports)
+            # it leaves no item, so a cached block would lose it
+            self.volatile = True
             return
         elif line[0].upper().startswith(".HEX"):
-            for x in line[1:]:
+            text = " ".join(line[1:])
+            tokens = text.split()
+            if all(len(x) == 2 for x in tokens):
+                self.items.append((DATA, bytes.fromhex(text), self.lineno))
+                return
+            data = bytearray()
+            for x in tokens:
                 num = int(x[-4:], 16)
                 if len(x) > 2:
-                    self.output.append(lo(num))
+                    data.append(lo(num))
                     num >>= 8
-                self.output.append(num)
+                data.append(num)
+            self.items.append((DATA, bytes(data), self.lineno))
             return
-        assert(len(line) in (1, 2))
-        for op in OPCODES:
-            if line[0].upper().startswith(op.mnemonic):
-                inst = Instruction(
-                    self, line[0], op, line[1] if len(line) > 1 else None
-                ).parse()
-                if self.warn_illegal and is_illegal(inst[0]):
-                    warn("illegal opcode: {}[{:02X}]", line[0], inst[0])
-                self.output.extend(inst)
-                return
+        elif line[0].upper().startswith(".BYTE"):
+            if len(line) != 2:
+                raise ValueError(".byte needs values")
+            data = bytearray()
+            for x in split(line[1]):
+                tree = parse_expr(x)
+                if type(tree) is int:
+                    data += as_bytes((tree, ))
+                    continue
+                self.table(tree, 0, 1, data)
+                data = bytearray()
+            if len(data) > 0:
+                self.items.append((DATA, bytes(data), self.lineno))
+            return
+        elif line[0].upper().startswith(".FILL"):
+            count, tree = self.table_args(line, 2)
+            self.table(tree, 0, count)
+            return
+        elif line[0].upper().startswith(".TABLE"):
+            first, last, tree = self.table_args(line, 3)
+            self.table(tree, first, last + 1 - first)
+            return
+        dot = line[0].find(".")
+        name = NAMES.get((line[0] if dot < 0 else line[0][:dot]).upper())
+        if name is not None:
+            inst = self.instruction(
+                self, line[0], name,
+                "".join(line[1].split()) if len(line) > 1 else None
+            ).parse()
+            self.check_illegal(inst)
+            self.items.append(inst)
+
+    def constant(self, text):
+        # text with the equates defined so far, None if that is not enough
+        items = self.items
+        constants = self.constants
+        for i in range(self.scanned, len(items)):
+            item = items[i]
+            if item[0] == EQU:
+                value = evaluate(item[2], constants)
+                if value is not None:
+                    constants[item[1]] = value
+        self.scanned = len(items)
+        tree = parse_expr(text)
+        if type(tree) is not int:
+            self.volatile = True
+        return evaluate(tree, constants)
 
-    def write(self, fh):
-        fh.write(bytes((lo(self.org), hi(self.org))))
-        fh.write(self.output)
+    def table_args(self, line, n):
+        # the numbers, then the expression of .fill and .table
+        args = split(line[1]) if len(line) == 2 else []
+        if len(args) != n:
+            raise ValueError("{} takes {} arguments".format(line[0], n))
+        numbers = [parse_expr(x) for x in args[:-1]]
+        if any(type(x) is not int for x in numbers):
+            raise ValueError("{} needs numbers before the expression".format(
+                line[0]
+            ))
+        return numbers + [parse_expr(args[-1])]
+
+    def table(self, tree, first, count, data=b""):
+        if count < 0:
+            raise ValueError("negative size")
+        # bytes that only depend on the index are data right away, the rest
+        # is left to the linker; data goes before them
+        if len(unresolved(tree, {})) == 0 and not uses_pc(tree):
+            self.items.append((
+                DATA, bytes(data) + tabulate(tree, first, count, {}),
+                self.lineno
+            ))
+            return
+        if len(data) > 0:
+            self.items.append((DATA, bytes(data), self.lineno))
+        self.items.append((TABLE, tree, first, count, self.lineno))
+
+    def check_illegal(self, inst):
+        if self.warn_illegal:
+            x = ENCODE[inst[1], inst[2][-1]][0]
+            if ILLEGAL[x]:
+                msg = "line {}: illegal opcode: {}[{:02X}]".format(
+                    inst[-1], inst[1], x
+                )
+                warn(msg if self.filename is None else "{}: {}".format(
+                    self.filename, msg
+                ))
+
+    def rewarn(self, obj):
+        # what assembling obj printed, for an object from the cache
+        for item in obj.items:
+            if item[0] == FILE:
+                self.filename = item[1]
+            elif item[0] == INST:
+                self.check_illegal(item)
+
+    def write(self, fh, fmt="prg"):
+        write(fh, self.segments, fmt)
 
 
 def warn_arg(ap, name, default=False):
@@ -246,14 +458,201 @@ def warn_arg(ap, name, default=False):
     )
 
 
-def main():
+def assemble_object(name, text, warn_illegal=False, profiler=None,
+                    include_path=()):
+    parser = MOS6502Parser(
+        warn_illegal=warn_illegal, name=name, profiler=profiler,
+        include_path=include_path
+    )
+    parser.feed_text(text)
+    return parser.object()
+
+
+def up_to_date(obj):
+    return all(INCLUDES.digest(path) == digest for path, digest in obj.depends)
+
+
+def assemble_objects(inputs, jobs, warn_illegal=False, cache=None,
+                     profiler=None, include_path=()):
+    objects = [None] * len(inputs)
+    todo = []
+    for i, fh in enumerate(inputs):
+        if profiler is None:
+            text = fh.read()
+        else:
+            with profiler.phase("read"):
+                text = fh.read()
+        key = None
+        if cache is not None:
+            # -I picks the included files
+            key = cache.key((fh.name, "\0".join(include_path), text))
+            obj = cache.get(key)
+            if obj is not None and up_to_date(obj):
+                objects[i] = obj
+                if warn_illegal:
+                    MOS6502Parser(warn_illegal=True, name=fh.name).rewarn(obj)
+        if objects[i] is None:
+            todo.append((i, key, fh.name, text))
+    # a profile only covers this process, so it assembles everything here
+    if len(todo) > 1 and jobs > 1 and profiler is None:
+        # imported here, it costs more start-up than a small build takes
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(min(jobs, len(todo))) as pool:
+            done = pool.map(
+                assemble_object, *zip(*(t[2:] for t in todo)),
+                [warn_illegal] * len(todo), [None] * len(todo),
+                [include_path] * len(todo)
+            )
+            done = list(done)
+    else:
+        done = [
+            assemble_object(t[2], t[3], warn_illegal, profiler, include_path)
+            for t in todo
+        ]
+    for (i, key, _, _), obj in zip(todo, done):
+        objects[i] = obj
+        if cache is not None:
+            cache.put(key, obj)
+    return objects
+
+
+def write_output(segments, path, fmt, use_mmap=False):
+    if fmt == "segments":
+        write_segments(path, segments)
+    elif path == "-":
+        # not stdout.buffer, whether it seeks is decided once and asmd.py
+        # swaps the file under fd 1
+        stdout.flush()
+        with open(stdout.fileno(), "wb", closefd=False) as fh:
+            write(fh, segments, fmt)
+    elif use_mmap:
+        write_mmap(path, segments, fmt)
+    else:
+        with open(path, "wb") as fh:
+            write(fh, segments, fmt)
+
+
+def main(argv=None):
     ap = ArgumentParser(description="simple 6502 Assembler")
     ap.add_argument("-o", "--output", dest="output", default="a.prg",
-                    type=FileType("wb"), help="output file")
-    ap.add_argument("input", metavar="FILE", type=FileType("r"), nargs=1)
+                    help="output file, - for stdout")
+    ap.add_argument("-f", "--format", dest="format", default="prg",
+                    choices=("prg", "raw", "segments"),
+                    help="PRG, raw binary without load address, or one PRG "
+                         "per .org segment as OUTPUT.xxxx.prg")
+    ap.add_argument("--mmap", dest="mmap", action="store_true",
+                    help="write prg or raw output through mmap, for large "
+                         "sparse images")
+    ap.add_argument("input", metavar="FILE", type=FileType("r"), nargs="+")
+    ap.add_argument("-j", "--jobs", dest="jobs", type=int,
+                    default=cpu_count() or 1,
+                    help="assemble modules in this many processes")
+    ap.add_argument("--cache", dest="cache", action="store_true",
+                    help="reuse unchanged blocks from OUTPUT.cache")
+    ap.add_argument("--clear-cache", dest="clear_cache", action="store_true",
+                    help="drop OUTPUT.cache before assembling")
+    ap.add_argument("--profile", dest="profile", metavar="JSON", default=None,
+                    help="write phase timings and the slowest lines as JSON "
+                         "to this file, - for stdout")
+    ap.add_argument("--relax", dest="relax", action="store_true",
+                    help="turn branches that are out of range into the "
+                         "opposite branch over a JMP")
+    ap.add_argument("-O", "--peephole", dest="peephole", action="store_true",
+                    help="drop redundant loads, turn JSR/RTS into JMP and "
+                         "send jumps to jumps straight on; -Wpeephole "
+                         "lists the changes")
+    ap.add_argument("-I", dest="include_path", metavar="DIR", default=[],
+                    action="append", help="search DIR for .include files")
+    ap.add_argument("--listing", dest="listing", metavar="FILE", default=None,
+                    help="write the disassembly with cycle counts per "
+                         "instruction and block to FILE, - for stdout")
+    ap.add_argument("--crunch", dest="crunch", action="store_true",
+                    help="write a packed PRG that unpacks itself when RUN "
+                         "and starts at the SYS line at $0801, if there is "
+                         "one, or else at the first segment")
     warn_arg(ap, "illegal")
-    args = ap.parse_args()
-    MOS6502Parser(args.input[0], args.warn_illegal).write(args.output)
+    warn_arg(ap, "budget", True)
+    warn_arg(ap, "peephole")
+    args = ap.parse_args(argv)
+    if args.crunch and args.format != "prg":
+        ap.error("--crunch only writes prg files")
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler()
+    optimizer = Optimizer() if args.peephole else None
+    cache = None
+    if args.cache or args.clear_cache:
+        here = dirname(__file__)
+        cache = BlockCache("{}.cache".format(args.output), source_stamp(*(
+            join(here, x) for x in (
+                "asm.py", "expr.py", "link.py", "optables.py", "preproc.py",
+                "tabulate.py"
+            )
+        )))
+        if args.clear_cache:
+            cache.clear()
+        if not args.cache:
+            cache = None
+    try:
+        if len(args.input) == 1:
+            out = MOS6502Parser(
+                warn_illegal=args.warn_illegal, cache=cache,
+                name=args.input[0].name, profiler=profiler,
+                include_path=args.include_path, relax=args.relax,
+                optimizer=optimizer
+            )
+            out.feed(args.input[0])
+            out.finish()
+        else:
+            out = link(assemble_objects(
+                args.input, args.jobs, args.warn_illegal, cache, profiler,
+                args.include_path
+            ), profiler, args.relax, optimizer)
+    except ValueError as e:
+        ap.exit(1, "{}\n".format(e))
+    linker = out if isinstance(out, Linker) else out.linker
+    if optimizer is not None and args.warn_peephole:
+        for msg in optimizer.changes:
+            warn(msg)
+    if args.warn_budget:
+        for msg in budget_warnings(linker):
+            warn(msg)
+    if args.listing == "-":
+        for line in listing(linker):
+            print(line)
+    elif args.listing is not None:
+        with open(args.listing, "w") as fh:
+            for line in listing(linker):
+                print(line, file=fh)
+    segments = out.segments
+    if args.crunch:
+        # imported here, crunch.py imports this module
+        from crunch import crunch
+        try:
+            if profiler is None:
+                prg = crunch(segments)
+            else:
+                with profiler.phase("crunch"):
+                    prg = crunch(segments)
+        except ValueError as e:
+            ap.exit(1, "{}\n".format(e))
+        segments = [(prg[0] | prg[1] << 8, prg[2:])]
+    if profiler is None:
+        write_output(segments, args.output, args.format, args.mmap)
+    else:
+        with profiler.phase("write"):
+            write_output(segments, args.output, args.format, args.mmap)
+    if cache is not None:
+        cache.save()
+        if profiler is not None:
+            profiler.count("cache_hits", cache.hits)
+            profiler.count("cache_misses", cache.misses)
+    if profiler is not None:
+        if args.profile == "-":
+            profiler.dump(stdout)
+        else:
+            with open(args.profile, "w") as fh:
+                profiler.dump(fh)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from hashlib import blake2b
+from os import replace, unlink
+from pickle import dump, HIGHEST_PROTOCOL, load, UnpicklingError
+
+CACHE_VERSION = 1
+
+
+def source_stamp(*paths):
+    h = blake2b(str(CACHE_VERSION).encode(), digest_size=16)
+    for path in paths:
+        with open(path, "rb") as fh:
+            h.update(fh.read())
+    return h.digest()
+
+
+class BlockCache:
+    # blocks: content hash -> [pass one items, build number of last use]
+    def __init__(self, path, stamp, max_blocks=65536, max_age=32):
+        self.path = path
+        self.stamp = stamp
+        self.max_blocks = max_blocks
+        self.max_age = max_age
+        self.build = 0
+        self.blocks = {}
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as fh:
+                stamp, build, blocks = load(fh)
+        except (OSError, EOFError, UnpicklingError, ValueError, TypeError):
+            return
+        # a different assembler or cache format invalidates everything
+        if stamp == self.stamp:
+            self.build = build + 1
+            self.blocks = blocks
+
+    def key(self, lines):
+        return blake2b("\n".join(lines).encode(), digest_size=16).digest()
+
+    def get(self, key):
+        entry = self.blocks.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[1] = self.build
+        return entry[0]
+
+    def put(self, key, items):
+        self.blocks[key] = [items, self.build]
+
+    def evict(self):
+        oldest = self.build - self.max_age
+        blocks = {k: v for k, v in self.blocks.items() if v[1] >= oldest}
+        if len(blocks) > self.max_blocks:
+            keep = sorted(blocks.items(), key=lambda kv: kv[1][1])
+            blocks = dict(keep[-self.max_blocks:])
+        self.blocks = blocks
+
+    def save(self):
+        self.evict()
+        tmp = "{}.tmp".format(self.path)
+        with open(tmp, "wb") as fh:
+            dump((self.stamp, self.build, self.blocks), fh, HIGHEST_PROTOCOL)
+        replace(tmp, self.path)
+
+    def clear(self):
+        self.blocks = {}
+        try:
+            unlink(self.path)
+        except FileNotFoundError:
+            pass
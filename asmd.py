@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+# asm.py as a long-lived server, for builds that run the assembler once
+# per small source and spend most of that in interpreter start-up.
+#
+#   asmd.py --serve [-w WORKERS] &    start the server
+#   asmd.py [asm.py arguments]        assemble, exactly like asm.py
+#   asmd.py --stop                    stop the server
+#
+# The client sends its working directory, its arguments and its stdin,
+# stdout and stderr over a Unix socket, and gets asm.py's exit status
+# back. A worker puts the three descriptors in place of its own and runs
+# asm.main(), so output, warnings and errors go straight to the client's
+# terminal or files. Workers are forked from a server that has already
+# imported asm.py, one request at a time each, so chdir() is safe.
+#
+# Without a server, or when asm.py or one of its modules changed since
+# it started, the client assembles in-process instead; in the latter case
+# the server also shuts down, to be restarted with the new code.
+#
+# The socket lives in $XDG_RUNTIME_DIR, or else in a directory of /tmp
+# that the server makes for the user alone; ASMD_SOCKET overrides that.
+# Either side only talks to a process of the same user, as the client
+# hands over its terminal and the server runs in the client's directory.
+
+from os import (
+    _exit, close, dup, dup2, environ, fork, getcwd, getuid, kill, wait,
+)
+from os.path import dirname, join
+# not socket, whose imports cost the client most of its own start-up
+from _socket import (
+    AF_UNIX, SCM_RIGHTS, SHUT_WR, SO_PEERCRED, SOCK_STREAM, socket,
+    SOL_SOCKET,
+)
+from struct import calcsize, pack, unpack
+from sys import argv, exit
+
+DIRECTORY = environ.get("XDG_RUNTIME_DIR") or "/tmp/asmd-{}".format(getuid())
+SOCKET = environ.get("ASMD_SOCKET") or join(DIRECTORY, "asmd.sock")
+STOP = "--stop"
+# the reply when a worker will not run a request, see worker()
+DECLINED = b"-"
+
+
+def peer(sock):
+    # the uid of the process at the other end
+    pid, uid, gid = unpack(
+        "3i", sock.getsockopt(SOL_SOCKET, SO_PEERCRED, calcsize("3i"))
+    )
+    return uid
+
+
+def request(args, path=SOCKET):
+    # asm.py's exit status, None when nobody ran it
+    from os import stat
+    sock = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        sock.connect(path)
+        if stat(path).st_uid != getuid() or peer(sock) != getuid():
+            raise PermissionError(path)
+    except OSError:
+        sock.close()
+        return None
+    try:
+        sock.sendmsg(["\0".join([getcwd()] + args).encode()], [
+            (SOL_SOCKET, SCM_RIGHTS, pack("3i", 0, 1, 2))
+        ])
+        sock.shutdown(SHUT_WR)
+        reply = b""
+        while True:
+            data = sock.recv(64)
+            if len(data) == 0:
+                break
+            reply += data
+    finally:
+        sock.close()
+    if reply in (b"", DECLINED):
+        return None
+    return int(reply)
+
+
+def receive(conn):
+    from socket import recv_fds
+    data, fds, _, _ = recv_fds(conn, 65536, 3)
+    while True:
+        more = conn.recv(65536)
+        if len(more) == 0:
+            break
+        data += more
+    cwd, *args = data.decode().split("\0")
+    if len(args) == 1 and args[0] == "":
+        args = []
+    return cwd, args, fds
+
+
+def run(cwd, args, fds):
+    # asm.main() with the client's directory and standard streams; the
+    # exit status and whether this process can go on serving
+    from os import chdir
+    from sys import stderr, stdout
+    from traceback import print_exc
+    import asm
+    saved = [dup(fd) for fd in (0, 1, 2)]
+    here = getcwd()
+    status = 0
+    clean = True
+    try:
+        for fd, target in zip(fds, (0, 1, 2)):
+            dup2(fd, target)
+        chdir(cwd)
+        asm.main(args)
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif type(e.code) is int:
+            status = e.code
+        else:
+            print(e.code, file=stderr)
+            status = 1
+    except Exception:
+        print_exc()
+        status = 1
+    finally:
+        try:
+            stdout.flush()
+            stderr.flush()
+        except OSError:
+            # output still buffered would go to the next client
+            clean = False
+        chdir(here)
+        for fd, target in zip(saved, (0, 1, 2)):
+            dup2(fd, target)
+            close(fd)
+        for fd in fds:
+            close(fd)
+    return status, clean
+
+
+def loaded():
+    # every module loaded from next to asm.py
+    from os.path import dirname
+    from sys import modules
+    import asm
+    here = dirname(asm.__file__)
+    return sorted(
+        m.__file__ for m in list(modules.values())
+        if dirname(getattr(m, "__file__", None) or "") == here
+    )
+
+
+def stamp(files):
+    from os import stat
+    return [(f, stat(f).st_mtime_ns, stat(f).st_size) for f in files]
+
+
+def worker(listener, started):
+    from os import getppid
+    from signal import SIGTERM
+    clean = True
+    while clean:
+        conn, _ = listener.accept()
+        with conn:
+            if peer(conn) != getuid():
+                continue
+            try:
+                cwd, args, fds = receive(conn)
+                changed = stamp(f for f, _, _ in started) != started
+                if args == [STOP] or changed:
+                    for fd in fds:
+                        close(fd)
+                    conn.sendall(DECLINED)
+                    kill(getppid(), SIGTERM)
+                    continue
+                status, clean = run(cwd, args, fds)
+                conn.sendall(str(status).encode())
+            except OSError:
+                # the client went away
+                pass
+
+
+def spawn(listener, started):
+    pid = fork()
+    if pid == 0:
+        try:
+            worker(listener, started)
+        finally:
+            _exit(1)
+    return pid
+
+
+def private(directory):
+    # make directory for this user alone, or make sure it is
+    from os import lstat, mkdir
+    from stat import S_ISDIR
+    try:
+        mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    st = lstat(directory)
+    if not S_ISDIR(st.st_mode) or st.st_uid != getuid() or \
+            st.st_mode & 0o077:
+        raise SystemExit("{} is not a private directory".format(directory))
+
+
+def serve(path, workers):
+    from os import umask, unlink
+    from signal import SIGINT, SIGTERM, signal
+    from socket import socket
+    # everything the workers need is loaded before they are forked
+    import asm  # noqa: F401
+    import crunch  # noqa: F401
+    try:
+        # tabulate.py evaluates tables with it if it is loaded
+        import numpy  # noqa: F401
+    except ImportError:
+        pass
+    started = stamp(loaded())
+    if dirname(path) == DIRECTORY:
+        private(DIRECTORY)
+    listener = socket(AF_UNIX, SOCK_STREAM)
+    try:
+        unlink(path)
+    except FileNotFoundError:
+        pass
+    # connecting takes write permission on the socket
+    mask = umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        umask(mask)
+    listener.listen(128)
+    pids = set()
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+    signal(SIGTERM, stop)
+    signal(SIGINT, stop)
+    try:
+        for _ in range(workers):
+            pids.add(spawn(listener, started))
+        while True:
+            # workers only exit after a client broke their output
+            pid, _ = wait()
+            pids.discard(pid)
+            pids.add(spawn(listener, started))
+    finally:
+        listener.close()
+        unlink(path)
+        for pid in pids:
+            try:
+                kill(pid, SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main():
+    args = argv[1:]
+    if len(args) > 0 and args[0] == "--serve":
+        from argparse import ArgumentParser
+        from os import cpu_count
+        ap = ArgumentParser(description="asm.py server")
+        ap.add_argument("--serve", action="store_true")
+        ap.add_argument("-w", "--workers", dest="workers", type=int,
+                        default=cpu_count() or 1,
+                        help="assemble this many requests at a time")
+        ap.add_argument("-s", "--socket", dest="socket", default=SOCKET,
+                        help="listen here, default: {}".format(SOCKET))
+        args = ap.parse_args()
+        serve(args.socket, max(1, args.workers))
+    elif args == [STOP]:
+        request(args)
+    else:
+        status = request(args)
+        if status is None:
+            import asm
+            asm.main(args)
+            status = 0
+        exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from contextlib import contextmanager
+from heapq import heappush, heappushpop
+from itertools import count
+from json import dump
+from time import perf_counter
+
+
+class Profiler:
+    # Attached to a MOS6502Parser (and handed to its Linker) only when
+    # profiling, by replacing the parser's hot methods on the instance;
+    # an unprofiled parser runs exactly the same code as before.
+    def __init__(self, top=10):
+        self.top = top
+        self.phases = {}
+        self.counters = {}
+        self.slowest = []
+        self.seq = count()
+        self.hooks = []
+
+    def add_hook(self, hook):
+        # hook(phase, seconds) runs whenever a phase() block ends
+        self.hooks.append(hook)
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - start
+            self.add(name, seconds)
+            for hook in self.hooks:
+                hook(name, seconds)
+
+    def timed_iter(self, chunks):
+        # only the time spent producing input counts as reading
+        chunks = iter(chunks)
+        while True:
+            start = perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self.add("read", perf_counter() - start)
+                return
+            self.add("read", perf_counter() - start)
+            yield chunk
+
+    def attach(self, parser):
+        prof = self
+        parse_line = parser.parse_line
+
+        def timed_parse_line(line):
+            start = perf_counter()
+            parse_line(line)
+            seconds = perf_counter() - start
+            prof.add("interpret", seconds)
+            prof.count("lines")
+            entry = seconds, next(prof.seq), parser.name, parser.lineno, line
+            if len(prof.slowest) < prof.top:
+                heappush(prof.slowest, entry)
+            else:
+                heappushpop(prof.slowest, entry)
+
+        base = parser.instruction
+
+        class ProfiledInstruction(base):
+            def parse_mode(self):
+                start = perf_counter()
+                try:
+                    return base.parse_mode(self)
+                finally:
+                    prof.add("parse_mode", perf_counter() - start)
+
+        parser.parse_line = timed_parse_line
+        parser.instruction = ProfiledInstruction
+
+    def report(self):
+        return {
+            "phases": self.phases,
+            "counters": self.counters,
+            "slowest_lines": [{
+                "seconds": seconds,
+                "file": name,
+                "line": lineno,
+                "text": text,
+            } for seconds, _, name, lineno, text in sorted(
+                self.slowest, reverse=True
+            )],
+        }
+
+    def dump(self, fh):
+        dump(self.report(), fh, indent=2)
+        fh.write("\n")
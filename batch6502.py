@@ -0,0 +1,652 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from argparse import ArgumentParser, FileType
+from optables import DECODE
+from sys import argv
+from time import perf_counter
+import numpy as np
+
+# N machine states stepped in lockstep: registers are int32 arrays of
+# length N, memory is an N x 64K uint8 block. Each step groups the live
+# lanes by the opcode at their pc, so lanes that diverged still run, one
+# vectorized group per distinct opcode; halted and finished lanes are
+# masked off.
+
+
+def rd(b, idx, addr):
+    return b.mem[idx, addr & 0xffff].astype(np.int32)
+
+
+def rd16(b, idx, addr):
+    return rd(b, idx, addr) | rd(b, idx, addr + 1) << 8
+
+
+def mode_implied(b, idx, pc):
+    return None, None, (pc + 1) & 0xffff
+
+
+def mode_immediate(b, idx, pc):
+    return (pc + 1) & 0xffff, None, (pc + 2) & 0xffff
+
+
+def mode_zp(b, idx, pc):
+    return rd(b, idx, pc + 1), None, (pc + 2) & 0xffff
+
+
+def mode_zp_x(b, idx, pc):
+    return (rd(b, idx, pc + 1) + b.x[idx]) & 0xff, None, (pc + 2) & 0xffff
+
+
+def mode_zp_y(b, idx, pc):
+    return (rd(b, idx, pc + 1) + b.y[idx]) & 0xff, None, (pc + 2) & 0xffff
+
+
+def mode_abs(b, idx, pc):
+    return rd16(b, idx, pc + 1), None, (pc + 3) & 0xffff
+
+
+def mode_abs_x(b, idx, pc):
+    base = rd16(b, idx, pc + 1)
+    return (base + b.x[idx]) & 0xffff, base, (pc + 3) & 0xffff
+
+
+def mode_abs_y(b, idx, pc):
+    base = rd16(b, idx, pc + 1)
+    return (base + b.y[idx]) & 0xffff, base, (pc + 3) & 0xffff
+
+
+def mode_iz_x(b, idx, pc):
+    z = (rd(b, idx, pc + 1) + b.x[idx]) & 0xff
+    ea = rd(b, idx, z) | rd(b, idx, (z + 1) & 0xff) << 8
+    return ea, None, (pc + 2) & 0xffff
+
+
+def mode_iz_y(b, idx, pc):
+    z = rd(b, idx, pc + 1)
+    base = rd(b, idx, z) | rd(b, idx, (z + 1) & 0xff) << 8
+    return (base + b.y[idx]) & 0xffff, base, (pc + 2) & 0xffff
+
+
+def mode_ind(b, idx, pc):
+    z = rd16(b, idx, pc + 1)
+    ea = rd(b, idx, z) | rd(b, idx, (z & 0xff00) | ((z + 1) & 0xff)) << 8
+    return ea, None, (pc + 3) & 0xffff
+
+
+def mode_relative(b, idx, pc):
+    pc = (pc + 2) & 0xffff
+    return (pc + ((rd(b, idx, pc - 1) ^ 0x80) - 0x80)) & 0xffff, None, pc
+
+
+MODES = {
+    "_": mode_implied,
+    "a": mode_implied,
+    "#": mode_immediate,
+    "zp": mode_zp,
+    "zp,x": mode_zp_x,
+    "zp,y": mode_zp_y,
+    "abs": mode_abs,
+    "abs,x": mode_abs_x,
+    "abs,y": mode_abs_y,
+    "iz,x": mode_iz_x,
+    "iz,y": mode_iz_y,
+    "ind": mode_ind,
+    "r": mode_relative,
+}
+
+
+def wr(b, idx, ea, value):
+    b.mem[idx, ea] = value
+
+
+def nz(b, idx, value):
+    b.nf[idx] = value
+    b.zf[idx] = value
+
+
+def push(b, idx, value):
+    b.mem[idx, 0x100 | b.s[idx]] = value
+    b.s[idx] = (b.s[idx] - 1) & 0xff
+
+
+def pull(b, idx):
+    b.s[idx] = (b.s[idx] + 1) & 0xff
+    return rd(b, idx, 0x100 | b.s[idx])
+
+
+def compare(b, idx, r, m):
+    r = r - m
+    b.c[idx] = r >= 0
+    nz(b, idx, r & 0xff)
+
+
+def adc(b, idx, m):
+    a = b.a[idx]
+    c = b.c[idx]
+    r = a + m + c
+    res = r & 0xff
+    nf = res
+    v = ~(a ^ m) & (a ^ r) & 0x80
+    carry = r >> 8
+    d = b.d[idx] != 0
+    if d.any():
+        lo = (a & 0x0f) + (m & 0x0f) + c
+        lo = np.where(lo > 9, lo + 6, lo)
+        hi = (a >> 4) + (m >> 4) + (lo > 0x0f)
+        nf = np.where(d, hi << 4 & 0xff, nf)
+        v = np.where(d, ~(a ^ m) & (a ^ hi << 4) & 0x80, v)
+        hi = np.where(hi > 9, hi + 6, hi)
+        carry = np.where(d, hi > 0x0f, carry)
+        res = np.where(d, (hi << 4 | lo & 0x0f) & 0xff, res)
+    b.a[idx] = res
+    b.nf[idx] = nf
+    b.zf[idx] = r & 0xff
+    b.v[idx] = v
+    b.c[idx] = carry
+
+
+def sbc(b, idx, m):
+    a = b.a[idx]
+    c = b.c[idx]
+    r = a - m - 1 + c
+    res = r & 0xff
+    d = b.d[idx] != 0
+    if d.any():
+        lo = (a & 0x0f) - (m & 0x0f) - 1 + c
+        hi = (a >> 4) - (m >> 4)
+        hi = np.where(lo < 0, hi - 1, hi)
+        lo = np.where(lo < 0, lo - 6, lo)
+        hi = np.where(hi < 0, hi - 6, hi)
+        res = np.where(d, (hi << 4 | lo & 0x0f) & 0xff, res)
+    b.v[idx] = (a ^ m) & (a ^ r) & 0x80
+    b.c[idx] = r >= 0
+    nz(b, idx, r & 0xff)
+    b.a[idx] = res
+
+
+def shift(m, mnemonic, c):
+    # returns result byte and carry out for ASL/LSR/ROL/ROR
+    if mnemonic == "ASL":
+        return m << 1 & 0xff, m >> 7
+    if mnemonic == "LSR":
+        return m >> 1, m & 1
+    if mnemonic == "ROL":
+        return (m << 1 | c) & 0xff, m >> 7
+    return m >> 1 | c << 7, m & 1
+
+
+def op_load(reg):
+    def op(b, idx, ea, base):
+        m = rd(b, idx, ea)
+        for r in reg:
+            getattr(b, r)[idx] = m
+        nz(b, idx, m)
+    return op
+
+
+def op_store(value):
+    def op(b, idx, ea, base):
+        wr(b, idx, ea, value(b, idx, base))
+    return op
+
+
+def op_logic(fn):
+    def op(b, idx, ea, base):
+        b.a[idx] = m = fn(b.a[idx], rd(b, idx, ea))
+        nz(b, idx, m)
+    return op
+
+
+def op_shift(mnemonic, then=None):
+    def op(b, idx, ea, base):
+        m, b.c[idx] = shift(rd(b, idx, ea), mnemonic, b.c[idx])
+        wr(b, idx, ea, m)
+        if then is None:
+            nz(b, idx, m)
+        else:
+            then(b, idx, m)
+    return op
+
+
+def op_shift_a(mnemonic):
+    def op(b, idx, ea, base):
+        b.a[idx], b.c[idx] = shift(b.a[idx], mnemonic, b.c[idx])
+        nz(b, idx, b.a[idx])
+    return op
+
+
+def op_step(reg, delta):
+    def op(b, idx, ea, base):
+        r = getattr(b, reg)
+        r[idx] = m = (r[idx] + delta) & 0xff
+        nz(b, idx, m)
+    return op
+
+
+def op_step_mem(delta, then=None):
+    def op(b, idx, ea, base):
+        m = (rd(b, idx, ea) + delta) & 0xff
+        wr(b, idx, ea, m)
+        if then is None:
+            nz(b, idx, m)
+        else:
+            then(b, idx, m)
+    return op
+
+
+def op_transfer(src, dst, flags=True):
+    def op(b, idx, ea, base):
+        getattr(b, dst)[idx] = m = getattr(b, src)[idx]
+        if flags:
+            nz(b, idx, m)
+    return op
+
+
+def op_flag(flag, value):
+    def op(b, idx, ea, base):
+        getattr(b, flag)[idx] = value
+    return op
+
+
+def op_branch(cond):
+    def op(b, idx, ea, base):
+        taken = cond(b, idx)
+        b.pc[idx] = np.where(taken, ea, b.pc[idx])
+    return op
+
+
+def op_nop(b, idx, ea, base):
+    pass
+
+
+def op_bit(b, idx, ea, base):
+    m = rd(b, idx, ea)
+    b.nf[idx] = m
+    b.v[idx] = m & 0x40
+    b.zf[idx] = b.a[idx] & m
+
+
+def op_jmp(b, idx, ea, base):
+    b.pc[idx] = ea
+
+
+def op_jsr(b, idx, ea, base):
+    pc = (b.pc[idx] - 1) & 0xffff
+    push(b, idx, pc >> 8)
+    push(b, idx, pc & 0xff)
+    b.pc[idx] = ea
+
+
+def op_rts(b, idx, ea, base):
+    pc = pull(b, idx)
+    b.pc[idx] = ((pull(b, idx) << 8 | pc) + 1) & 0xffff
+
+
+def op_rti(b, idx, ea, base):
+    b.set_p(idx, pull(b, idx))
+    pc = pull(b, idx)
+    b.pc[idx] = pull(b, idx) << 8 | pc
+
+
+def op_brk(b, idx, ea, base):
+    pc = (b.pc[idx] + 1) & 0xffff
+    push(b, idx, pc >> 8)
+    push(b, idx, pc & 0xff)
+    push(b, idx, b.get_p(idx) | 0x10)
+    b.i[idx] = 1
+    b.pc[idx] = rd16(b, idx, np.full(len(idx), 0xfffe))
+
+
+def op_php(b, idx, ea, base):
+    push(b, idx, b.get_p(idx) | 0x10)
+
+
+def op_plp(b, idx, ea, base):
+    b.set_p(idx, pull(b, idx))
+
+
+def op_pla(b, idx, ea, base):
+    b.a[idx] = m = pull(b, idx)
+    nz(b, idx, m)
+
+
+def op_jam(b, idx, ea, base):
+    b.halted[idx] = True
+    b.pc[idx] = (b.pc[idx] - 1) & 0xffff
+
+
+def op_anc(b, idx, ea, base):
+    b.a[idx] = m = b.a[idx] & rd(b, idx, ea)
+    nz(b, idx, m)
+    b.c[idx] = m >> 7
+
+
+def op_asr(b, idx, ea, base):
+    m = b.a[idx] & rd(b, idx, ea)
+    b.c[idx] = m & 1
+    b.a[idx] = m = m >> 1
+    nz(b, idx, m)
+
+
+def op_arr(b, idx, ea, base):
+    m = (b.a[idx] & rd(b, idx, ea)) >> 1 | b.c[idx] << 7
+    b.a[idx] = m
+    nz(b, idx, m)
+    b.c[idx] = m >> 6 & 1
+    b.v[idx] = (m >> 6 ^ m >> 5) & 1
+
+
+def op_sbx(b, idx, ea, base):
+    m = (b.a[idx] & b.x[idx]) - rd(b, idx, ea)
+    b.c[idx] = m >= 0
+    b.x[idx] = m = m & 0xff
+    nz(b, idx, m)
+
+
+def op_lae(b, idx, ea, base):
+    m = rd(b, idx, ea) & b.s[idx]
+    b.a[idx] = b.x[idx] = b.s[idx] = m
+    nz(b, idx, m)
+
+
+def op_shs(b, idx, ea, base):
+    b.s[idx] = b.a[idx] & b.x[idx]
+    wr(b, idx, ea, b.s[idx] & ((base >> 8) + 1) & 0xff)
+
+
+def then_adc(b, idx, m):
+    adc(b, idx, m)
+
+
+def then_sbc(b, idx, m):
+    sbc(b, idx, m)
+
+
+def then_cmp(b, idx, m):
+    compare(b, idx, b.a[idx], m)
+
+
+def then_logic(fn):
+    def then(b, idx, m):
+        b.a[idx] = m = fn(b.a[idx], m)
+        nz(b, idx, m)
+    return then
+
+
+def op_read(fn):
+    def op(b, idx, ea, base):
+        fn(b, idx, rd(b, idx, ea))
+    return op
+
+
+def op_cmp(reg):
+    def op(b, idx, ea, base):
+        compare(b, idx, getattr(b, reg)[idx], rd(b, idx, ea))
+    return op
+
+
+def op_lxa(b, idx, ea, base):
+    b.a[idx] = b.x[idx] = m = (b.a[idx] | 0xee) & rd(b, idx, ea)
+    nz(b, idx, m)
+
+
+def op_ane(b, idx, ea, base):
+    b.a[idx] = m = (b.a[idx] | 0xee) & b.x[idx] & rd(b, idx, ea)
+    nz(b, idx, m)
+
+
+def op_pha(b, idx, ea, base):
+    push(b, idx, b.a[idx])
+
+
+AND = np.bitwise_and
+ORA = np.bitwise_or
+EOR = np.bitwise_xor
+
+OPS = {
+    "LDA": op_load(("a", )),
+    "LDX": op_load(("x", )),
+    "LDY": op_load(("y", )),
+    "LAX": op_load(("a", "x")),
+    "STA": op_store(lambda b, idx, base: b.a[idx]),
+    "STX": op_store(lambda b, idx, base: b.x[idx]),
+    "STY": op_store(lambda b, idx, base: b.y[idx]),
+    "SAX": op_store(lambda b, idx, base: b.a[idx] & b.x[idx]),
+    "AND": op_logic(AND),
+    "ORA": op_logic(ORA),
+    "EOR": op_logic(EOR),
+    "ADC": op_read(adc),
+    "SBC": op_read(sbc),
+    "CMP": op_cmp("a"),
+    "CPX": op_cmp("x"),
+    "CPY": op_cmp("y"),
+    "BIT": op_bit,
+    "ASL": op_shift("ASL"),
+    "LSR": op_shift("LSR"),
+    "ROL": op_shift("ROL"),
+    "ROR": op_shift("ROR"),
+    "INC": op_step_mem(1),
+    "DEC": op_step_mem(-1),
+    "INX": op_step("x", 1),
+    "INY": op_step("y", 1),
+    "DEX": op_step("x", -1),
+    "DEY": op_step("y", -1),
+    "TAX": op_transfer("a", "x"),
+    "TAY": op_transfer("a", "y"),
+    "TXA": op_transfer("x", "a"),
+    "TYA": op_transfer("y", "a"),
+    "TSX": op_transfer("s", "x"),
+    "TXS": op_transfer("x", "s", False),
+    "CLC": op_flag("c", 0),
+    "SEC": op_flag("c", 1),
+    "CLI": op_flag("i", 0),
+    "SEI": op_flag("i", 1),
+    "CLD": op_flag("d", 0),
+    "SED": op_flag("d", 1),
+    "CLV": op_flag("v", 0),
+    "NOP": op_nop,
+    "JMP": op_jmp,
+    "JSR": op_jsr,
+    "RTS": op_rts,
+    "RTI": op_rti,
+    "BRK": op_brk,
+    "PHA": op_pha,
+    "PHP": op_php,
+    "PLA": op_pla,
+    "PLP": op_plp,
+    "JAM": op_jam,
+    "BPL": op_branch(lambda b, idx: (b.nf[idx] & 0x80) == 0),
+    "BMI": op_branch(lambda b, idx: (b.nf[idx] & 0x80) != 0),
+    "BVC": op_branch(lambda b, idx: b.v[idx] == 0),
+    "BVS": op_branch(lambda b, idx: b.v[idx] != 0),
+    "BCC": op_branch(lambda b, idx: b.c[idx] == 0),
+    "BCS": op_branch(lambda b, idx: b.c[idx] != 0),
+    "BNE": op_branch(lambda b, idx: b.zf[idx] != 0),
+    "BEQ": op_branch(lambda b, idx: b.zf[idx] == 0),
+    # illegal opcodes
+    "SLO": op_shift("ASL", then_logic(ORA)),
+    "RLA": op_shift("ROL", then_logic(AND)),
+    "SRE": op_shift("LSR", then_logic(EOR)),
+    "RRA": op_shift("ROR", then_adc),
+    "DCP": op_step_mem(-1, then_cmp),
+    "ISB": op_step_mem(1, then_sbc),
+    "ANC": op_anc,
+    "ASR": op_asr,
+    "ARR": op_arr,
+    "ANE": op_ane,
+    "LXA": op_lxa,
+    "SBX": op_sbx,
+    "SHA": op_store(
+        lambda b, idx, base: b.a[idx] & b.x[idx] & ((base >> 8) + 1) & 0xff
+    ),
+    "SHX": op_store(lambda b, idx, base: b.x[idx] & ((base >> 8) + 1) & 0xff),
+    "SHY": op_store(lambda b, idx, base: b.y[idx] & ((base >> 8) + 1) & 0xff),
+    "SHS": op_shs,
+    "LAE": op_lae,
+}
+
+
+def compile_op(mnemonic, mode):
+    addressing = MODES[mode]
+    if mode == "a":
+        operation = op_shift_a(mnemonic)
+    else:
+        operation = OPS[mnemonic]
+
+    def op(b, idx):
+        ea, base, pc = addressing(b, idx, b.pc[idx])
+        b.pc[idx] = pc
+        operation(b, idx, ea, base)
+    return op
+
+
+DISPATCH = tuple(compile_op(mnemonic, mode) for mnemonic, mode in DECODE)
+
+
+class Batch6502:
+    registers = ("a", "x", "y", "s", "pc", "nf", "zf", "v", "d", "i", "c")
+
+    def __init__(self, n, mem=None):
+        self.n = n
+        if mem is None:
+            mem = np.zeros((n, 0x10000), np.uint8)
+        assert(mem.shape == (n, 0x10000) and mem.dtype == np.uint8)
+        self.mem = mem
+        for r in self.registers:
+            setattr(self, r, np.zeros(n, np.int32))
+        self.s[:] = 0xff
+        # N is bit 7 of nf, Z is set when zf is 0
+        self.zf[:] = 1
+        self.halted = np.zeros(n, bool)
+        self.steps = np.zeros(n, np.int64)
+
+    def get_p(self, idx=slice(None)):
+        return (
+            (self.nf[idx] & 0x80) | np.where(self.v[idx] != 0, 0x40, 0) |
+            0x20 | self.d[idx] << 3 | self.i[idx] << 2 |
+            np.where(self.zf[idx] == 0, 2, 0) | self.c[idx]
+        )
+
+    def set_p(self, idx, p):
+        self.nf[idx] = p
+        self.zf[idx] = np.where(p & 2, 0, 1)
+        self.v[idx] = p & 0x40
+        self.d[idx] = p >> 3 & 1
+        self.i[idx] = p >> 2 & 1
+        self.c[idx] = p & 1
+
+    def load_prg(self, data, lanes=slice(None)):
+        org = data[0] | data[1] << 8
+        self.mem[lanes, org:org + len(data) - 2] = np.frombuffer(
+            data, np.uint8, offset=2
+        )
+        return org
+
+    def step(self, live):
+        idx = np.flatnonzero(live)
+        if len(idx) == 0:
+            return 0
+        ops = self.mem[idx, self.pc[idx]]
+        first = ops[0]
+        if (ops == first).all():
+            DISPATCH[first](self, idx)
+        else:
+            for x in np.unique(ops):
+                DISPATCH[x](self, idx[ops == x])
+        self.steps[idx] += 1
+        return len(idx)
+
+    def run(self, until=None, count=-1):
+        # steps all lanes until each reached until, halted on a JAM or
+        # ran count instructions; returns the number of lockstep steps
+        n = 0
+        while n != count:
+            live = ~self.halted
+            if until is not None:
+                live &= self.pc != until
+            if self.step(live) == 0:
+                break
+            n += 1
+        return n
+
+    def call(self, addr, count=-1):
+        # JSR to addr on every lane and run until the matching RTS
+        idx = np.arange(self.n)
+        push(self, idx, 0xff)
+        push(self, idx, 0xfe)
+        self.pc[:] = addr
+        return self.run(0xffff, count)
+
+
+def main():
+    ap = ArgumentParser(description="run a PRG on N 6502s in lockstep")
+    ap.add_argument("input", metavar="FILE", type=FileType("rb"))
+    ap.add_argument("start", metavar="START", nargs="?",
+                    type=lambda x: int(x, 16), help="entry point (hex)")
+    ap.add_argument("-N", "--lanes", dest="lanes", type=int, default=1024)
+    ap.add_argument("-n", "--count", dest="count", type=int, default=100000,
+                    help="stop after this many steps")
+    args = ap.parse_args()
+    batch = Batch6502(args.lanes)
+    org = batch.load_prg(args.input.read())
+    # give every lane its own x so the lanes do different work
+    batch.x[:] = np.arange(args.lanes) & 0xff
+    start = perf_counter()
+    steps = batch.call(org if args.start is None else args.start, args.count)
+    elapsed = perf_counter() - start
+    total = int(batch.steps.sum())
+    print("{} steps, {} instructions in {:.3f}s, {:.0f}/s".format(
+        steps, total, elapsed, total / elapsed if elapsed > 0 else 0
+    ))
+
+
+def check(lanes=256, rounds=20, steps=4, seed=6502):
+    # every lane against a CPU6502 from the same random registers, flags
+    # and memory, all opcodes, a few steps so that lanes diverge
+    # only the check needs the scalar core
+    from cpu6502 import CPU6502
+    rnd = np.random.default_rng(seed)
+    idx = np.arange(lanes)
+    for _ in range(rounds):
+        mem = rnd.integers(0, 0x100, (lanes, 0x10000), np.uint8)
+        batch = Batch6502(lanes, mem.copy())
+        for r in ("a", "x", "y", "s"):
+            getattr(batch, r)[:] = rnd.integers(0, 0x100, lanes)
+        batch.set_p(idx, rnd.integers(0, 0x100, lanes) | 0x30)
+        batch.pc[:] = rnd.integers(0x200, 0xff00, lanes)
+        cpus = []
+        p = batch.get_p()
+        for k in range(lanes):
+            cpu = CPU6502(bytearray(mem[k].tobytes()))
+            cpu.a, cpu.x, cpu.y, cpu.s, cpu.pc = (
+                int(getattr(batch, r)[k]) for r in ("a", "x", "y", "s", "pc")
+            )
+            cpu.set_p(int(p[k]))
+            cpus.append(cpu)
+        ops = [[] for _ in range(lanes)]
+        for _ in range(steps):
+            for k, cpu in enumerate(cpus):
+                if not cpu.halted:
+                    ops[k].append(" ".join(DECODE[cpu.mem[cpu.pc]]))
+                    cpu.step()
+            batch.step(~batch.halted)
+        p = batch.get_p()
+        for k, cpu in enumerate(cpus):
+            assert(
+                (cpu.a, cpu.x, cpu.y, cpu.s, cpu.pc, cpu.get_p()) ==
+                tuple(int(getattr(batch, r)[k]) for r in (
+                    "a", "x", "y", "s", "pc"
+                )) + (int(p[k]), ) and cpu.mem == batch.mem[k].tobytes()
+            ), "{} differs from cpu6502".format(", ".join(ops[k]))
+
+
+if __name__ == "__main__":
+    if argv[1:] == ["--check"]:
+        check()
+    else:
+        main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from argparse import ArgumentParser
+from asm import MOS6502Parser
+from importlib import import_module
+from io import StringIO
+from json import dump, load
+from optables import ENCODE
+from os import environ
+from os.path import abspath, dirname, exists
+from platform import python_implementation, python_version
+from random import Random
+from subprocess import Popen, run
+from sys import executable, modules
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+SNIPPETS = (
+    "  lda #${:02x}",
+    "  sta ${:02x}",
+    "  inc ${:02x},x",
+    "  ldx ${:02x},y",
+    "  sta $c0{:02x}",
+    "  lda $c0{:02x},x",
+    "  sta $c0{:02x},y",
+    "  asl",
+    "  nop",
+    "  slo ${:02x}",
+    "  lax $c0{:02x},y",
+    "  jsr $c0{:02x}",
+)
+
+OPERANDS = {
+    "_": "",
+    "a": " a",
+    "#": " #${:02x}",
+    "zp": " ${:02x}",
+    "zp,x": " ${:02x},x",
+    "zp,y": " ${:02x},y",
+    "abs": " $c0{:02x}",
+    "abs,x": " $c0{:02x},x",
+    "abs,y": " $c0{:02x},y",
+    "ind": " ($c0{:02x})",
+    "iz,x": " (${:02x},x)",
+    "iz,y": " (${:02x}),y",
+}
+
+# modules whose import time is measured, in dependency order
+IMPORTS = (
+    "optables", "expr", "preproc", "tabulate", "link", "peephole", "disasm",
+    "cycles", "asmcache", "asmprof", "asm",
+)
+# the most lines of one program; at 16 bytes a line of .hex it still fits
+# the address space
+PROGRAM_LINES = 3000
+# what "startup" assembles, small enough that start-up is all there is
+TINY = ".org $0801\nloop: inc $d020\n  jmp loop\n"
+
+
+def synthetic_source(lines, seed=6502):
+    rnd = Random(seed)
+    out = [".org $0801"]
+    for i in range(lines):
+        if i % 16 == 0:
+            out.append("block{}:".format(i))
+            if i > 0:
+                out.append("  bne block{}".format(i - 16))
+        out.append(rnd.choice(SNIPPETS).format(rnd.randrange(256)))
+    return "\n".join(out) + "\n"
+
+
+def labels_source(lines, seed=6502):
+    # a label on every line, referenced backwards from all over the place
+    rnd = Random(seed)
+    out = [".org $0801"]
+    for i in range(lines):
+        if i == 0 or rnd.random() < 0.5:
+            out.append("l{}: nop".format(i))
+        else:
+            out.append("l{}: lda l{},x".format(i, rnd.randrange(i)))
+    return "\n".join(out) + "\n"
+
+
+def forward_source(lines, seed=6502):
+    # every reference points ahead, most of them far ahead, so nothing
+    # resolves before the end of the file
+    rnd = Random(seed)
+    out = [".org $0801"]
+    for i in range(lines):
+        if i % 8 == 0:
+            out.append("f{}:".format(i))
+        target = i - i % 8 + 8 * rnd.randrange(1, 64)
+        target = min(target, lines - lines % 8)
+        out.append(rnd.choice((
+            "  jsr f{}", "  jmp f{}", "  lda f{},y", "  sta f{}",
+        )).format(target))
+    out.append("f{}: rts".format(lines - lines % 8))
+    return "\n".join(out) + "\n"
+
+
+def hex_source(lines, seed=6502):
+    rnd = Random(seed)
+    out = [".org $0801"]
+    for i in range(lines):
+        out.append(".hex " + " ".join(
+            "{:02x}".format(rnd.randrange(256)) for _ in range(16)
+        ))
+    return "\n".join(out) + "\n"
+
+
+def modes_source(lines, seed=6502):
+    # every mnemonic in every mode it has, illegal opcodes included
+    rnd = Random(seed)
+    forms = sorted(ENCODE)
+    out = [".org $0801"]
+    for i in range(lines):
+        mnemonic, mode = forms[i % len(forms)]
+        if mode == "r":
+            out.append("m{}: {} m{}".format(i, mnemonic.lower(), i))
+            continue
+        out.append("  {}{}".format(
+            mnemonic.lower(), OPERANDS[mode].format(rnd.randrange(256))
+        ))
+    return "\n".join(out) + "\n"
+
+
+GENERATORS = {
+    "mixed": synthetic_source,
+    "labels": labels_source,
+    "forward": forward_source,
+    "hex": hex_source,
+    "modes": modes_source,
+}
+
+
+def programs(generator, lines, seed):
+    # lines of generated source, as as many programs as 64K need
+    return [
+        generator(min(PROGRAM_LINES, lines - start), seed + start)
+        for start in range(0, lines, PROGRAM_LINES)
+    ]
+
+
+def bench_assemble(sources, repeat):
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        parsers = [MOS6502Parser(StringIO(text), False) for text in sources]
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, sum(
+        len(data) for parser in parsers for _, data in parser.segments
+    )
+
+
+def run_python(code, prefix=None, args=None, env=None):
+    cmd = [executable, "-c", code] if args is None else [executable] + args
+    if prefix is not None:
+        cmd[1:1] = "-X", "pycache_prefix={}".format(prefix)
+    start = perf_counter()
+    run(cmd, cwd=dirname(abspath(__file__)), check=True, env=env)
+    return perf_counter() - start
+
+
+def bench_import(repeat):
+    # interpreter start-up is measured the same way and subtracted; cold
+    # imports get an empty bytecode cache every time, warm ones the usual
+    code = "import " + ", ".join(IMPORTS)
+    cold = warm = None
+    with TemporaryDirectory() as tmp:
+        for i in range(repeat):
+            elapsed = run_python(code, "{}/c{}".format(tmp, i)) - \
+                run_python("pass", "{}/p{}".format(tmp, i))
+            if cold is None or elapsed < cold:
+                cold = elapsed
+    run_python(code)
+    for i in range(repeat):
+        elapsed = run_python(code) - run_python("pass")
+        if warm is None or elapsed < warm:
+            warm = elapsed
+    # in-process re-import from the already loaded bytecode
+    inproc = None
+    for _ in range(repeat):
+        for name in IMPORTS:
+            modules.pop(name, None)
+        start = perf_counter()
+        for name in IMPORTS:
+            import_module(name)
+        elapsed = perf_counter() - start
+        if inproc is None or elapsed < inproc:
+            inproc = elapsed
+    # a whole asm.py run on a three line file, as a build script sees it,
+    # and the same through asmd.py
+    startup = daemon = None
+    with TemporaryDirectory() as tmp:
+        with open("{}/tiny.asm".format(tmp), "w") as fh:
+            fh.write(TINY)
+        args = ["-o", "{}/tiny.prg".format(tmp), "{}/tiny.asm".format(tmp)]
+        run_python(None, args=["asm.py"] + args)
+        for i in range(repeat):
+            elapsed = run_python(None, args=["asm.py"] + args) - \
+                run_python("pass")
+            if startup is None or elapsed < startup:
+                startup = elapsed
+        env = dict(environ, ASMD_SOCKET="{}/asmd.sock".format(tmp))
+        server = Popen([executable, "asmd.py", "--serve", "-w", "1"],
+                       cwd=dirname(abspath(__file__)), env=env)
+        try:
+            while not exists(env["ASMD_SOCKET"]):
+                sleep(0.01)
+            for i in range(repeat):
+                elapsed = run_python(None, args=["asmd.py"] + args,
+                                     env=env) - run_python("pass")
+                if daemon is None or elapsed < daemon:
+                    daemon = elapsed
+        finally:
+            run_python(None, args=["asmd.py", "--stop"], env=env)
+            server.wait()
+    return {
+        "cold": max(0.0, cold),
+        "warm": max(0.0, warm),
+        "reimport": inproc,
+        "startup": max(0.0, startup),
+        "daemon": max(0.0, daemon),
+    }
+
+
+def compare(results, baseline):
+    for name, new in results["assemble"].items():
+        old = baseline["assemble"].get(name)
+        if old is None:
+            continue
+        print("{:>8}: {:+.1f}% lines/s".format(
+            name, 100 * (new["lines_per_s"] / old["lines_per_s"] - 1)
+        ))
+    for name, new in results["import"].items():
+        old = baseline["import"].get(name)
+        if old:
+            print("{:>8}: {:+.1f}% time".format(
+                name, 100 * (new / old - 1)
+            ))
+
+
+def main():
+    ap = ArgumentParser(description="asm.py benchmarks")
+    ap.add_argument("-n", "--lines", type=int, default=100000)
+    ap.add_argument("-r", "--repeat", type=int, default=3)
+    ap.add_argument("-s", "--seed", type=int, default=6502)
+    ap.add_argument("-g", "--generator", dest="generators", action="append",
+                    choices=sorted(GENERATORS),
+                    help="only run these sources, default: all")
+    ap.add_argument("--no-import", dest="imports", action="store_false",
+                    help="skip the import benchmarks")
+    ap.add_argument("--json", dest="json", metavar="FILE", default=None,
+                    help="save the results for a later --compare")
+    ap.add_argument("--compare", dest="compare", metavar="FILE",
+                    default=None, help="print the change against these "
+                                       "saved results")
+    args = ap.parse_args()
+    results = {
+        "python": "{} {}".format(python_implementation(), python_version()),
+        "lines": args.lines,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "assemble": {},
+        "import": {},
+    }
+    for name in args.generators or sorted(GENERATORS):
+        sources = programs(GENERATORS[name], args.lines, args.seed)
+        lines = sum(source.count("\n") for source in sources)
+        best, size = bench_assemble(sources, args.repeat)
+        results["assemble"][name] = {
+            "lines": lines,
+            "bytes": size,
+            "seconds": best,
+            "lines_per_s": lines / best,
+            "bytes_per_s": size / best,
+        }
+        print("{:>8}: {} lines, {} bytes in {:.3f}s, {:.0f} lines/s, "
+              "{:.0f} bytes/s".format(
+                  name, lines, size, best, lines / best, size / best
+              ))
+    if args.imports:
+        results["import"] = bench_import(args.repeat)
+        for name, seconds in results["import"].items():
+            print("{:>8}: {:.1f}ms".format(name, seconds * 1000))
+    if args.json is not None:
+        with open(args.json, "w") as fh:
+            dump(results, fh, indent=2)
+            fh.write("\n")
+    if args.compare is not None:
+        with open(args.compare) as fh:
+            compare(results, load(fh))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from argparse import ArgumentParser, FileType
+from optables import DECODE, ILLEGAL
+from random import Random
+from sys import argv
+from textwrap import dedent
+from time import perf_counter
+
+# addressing modes: compute ea and the address of the next instruction
+MODE_CODE = {
+    "_": """
+    pc = (pc + 1) & 0xffff
+""",
+    "a": """
+    pc = (pc + 1) & 0xffff
+""",
+    "#": """
+    ea = (pc + 1) & 0xffff
+    pc = (pc + 2) & 0xffff
+""",
+    "zp": """
+    ea = mem[(pc + 1) & 0xffff]
+    pc = (pc + 2) & 0xffff
+""",
+    "zp,x": """
+    ea = (mem[(pc + 1) & 0xffff] + self.x) & 0xff
+    pc = (pc + 2) & 0xffff
+""",
+    "zp,y": """
+    ea = (mem[(pc + 1) & 0xffff] + self.y) & 0xff
+    pc = (pc + 2) & 0xffff
+""",
+    "abs": """
+    ea = mem[(pc + 1) & 0xffff] | mem[(pc + 2) & 0xffff] << 8
+    pc = (pc + 3) & 0xffff
+""",
+    "abs,x": """
+    base = mem[(pc + 1) & 0xffff] | mem[(pc + 2) & 0xffff] << 8
+    ea = (base + self.x) & 0xffff
+    pc = (pc + 3) & 0xffff
+""",
+    "abs,y": """
+    base = mem[(pc + 1) & 0xffff] | mem[(pc + 2) & 0xffff] << 8
+    ea = (base + self.y) & 0xffff
+    pc = (pc + 3) & 0xffff
+""",
+    "iz,x": """
+    z = (mem[(pc + 1) & 0xffff] + self.x) & 0xff
+    ea = mem[z] | mem[(z + 1) & 0xff] << 8
+    pc = (pc + 2) & 0xffff
+""",
+    "iz,y": """
+    z = mem[(pc + 1) & 0xffff]
+    base = mem[z] | mem[(z + 1) & 0xff] << 8
+    ea = (base + self.y) & 0xffff
+    pc = (pc + 2) & 0xffff
+""",
+    "ind": """
+    z = mem[(pc + 1) & 0xffff] | mem[(pc + 2) & 0xffff] << 8
+    ea = mem[z] | mem[(z & 0xff00) | ((z + 1) & 0xff)] << 8
+    pc = (pc + 3) & 0xffff
+""",
+    "r": """
+    pc = (pc + 2) & 0xffff
+    ea = (pc + ((mem[(pc - 1) & 0xffff] ^ 0x80) - 0x80)) & 0xffff
+""",
+}
+
+BRANCH = {
+    "BPL": "not self.nf & 0x80",
+    "BMI": "self.nf & 0x80",
+    "BVC": "not self.v",
+    "BVS": "self.v",
+    "BCC": "not self.c",
+    "BCS": "self.c",
+    "BNE": "self.zf",
+    "BEQ": "not self.zf",
+}
+
+# operations on ea, or on the accumulator in mode "a"
+OP_CODE = {
+    "LDA": "self.a = self.nf = self.zf = mem[ea]",
+    "LDX": "self.x = self.nf = self.zf = mem[ea]",
+    "LDY": "self.y = self.nf = self.zf = mem[ea]",
+    "STA": "mem[ea] = self.a",
+    "STX": "mem[ea] = self.x",
+    "STY": "mem[ea] = self.y",
+    "AND": "self.a = self.nf = self.zf = self.a & mem[ea]",
+    "ORA": "self.a = self.nf = self.zf = self.a | mem[ea]",
+    "EOR": "self.a = self.nf = self.zf = self.a ^ mem[ea]",
+    "ADC": "self.adc(mem[ea])",
+    "SBC": "self.sbc(mem[ea])",
+    "CMP": "self.compare(self.a, mem[ea])",
+    "CPX": "self.compare(self.x, mem[ea])",
+    "CPY": "self.compare(self.y, mem[ea])",
+    "BIT": """
+    m = mem[ea]
+    self.nf = m
+    self.v = m & 0x40
+    self.zf = self.a & m
+""",
+    "ASL": """
+    m = mem[ea] << 1
+    self.c = m >> 8
+    mem[ea] = self.nf = self.zf = m & 0xff
+""",
+    "LSR": """
+    m = mem[ea]
+    self.c = m & 1
+    mem[ea] = self.nf = self.zf = m >> 1
+""",
+    "ROL": """
+    m = mem[ea] << 1 | self.c
+    self.c = m >> 8
+    mem[ea] = self.nf = self.zf = m & 0xff
+""",
+    "ROR": """
+    m = mem[ea] | self.c << 8
+    self.c = m & 1
+    mem[ea] = self.nf = self.zf = m >> 1
+""",
+    "INC": "mem[ea] = self.nf = self.zf = (mem[ea] + 1) & 0xff",
+    "DEC": "mem[ea] = self.nf = self.zf = (mem[ea] - 1) & 0xff",
+    "INX": "self.x = self.nf = self.zf = (self.x + 1) & 0xff",
+    "INY": "self.y = self.nf = self.zf = (self.y + 1) & 0xff",
+    "DEX": "self.x = self.nf = self.zf = (self.x - 1) & 0xff",
+    "DEY": "self.y = self.nf = self.zf = (self.y - 1) & 0xff",
+    "TAX": "self.x = self.nf = self.zf = self.a",
+    "TAY": "self.y = self.nf = self.zf = self.a",
+    "TXA": "self.a = self.nf = self.zf = self.x",
+    "TYA": "self.a = self.nf = self.zf = self.y",
+    "TSX": "self.x = self.nf = self.zf = self.s",
+    "TXS": "self.s = self.x",
+    "CLC": "self.c = 0",
+    "SEC": "self.c = 1",
+    "CLI": "self.i = 0",
+    "SEI": "self.i = 1",
+    "CLD": "self.d = 0",
+    "SED": "self.d = 1",
+    "CLV": "self.v = 0",
+    "NOP": "pass",
+    "JMP": "self.pc = ea",
+    "JSR": """
+    pc = (pc - 1) & 0xffff
+    self.push(pc >> 8)
+    self.push(pc & 0xff)
+    self.pc = ea
+""",
+    "RTS": """
+    pc = self.pull()
+    self.pc = ((self.pull() << 8 | pc) + 1) & 0xffff
+""",
+    "RTI": """
+    self.set_p(self.pull())
+    pc = self.pull()
+    self.pc = self.pull() << 8 | pc
+""",
+    "BRK": """
+    pc = (pc + 1) & 0xffff
+    self.push(pc >> 8)
+    self.push(pc & 0xff)
+    self.push(self.get_p() | 0x10)
+    self.i = 1
+    self.pc = mem[0xfffe] | mem[0xffff] << 8
+""",
+    "PHA": "self.push(self.a)",
+    "PHP": "self.push(self.get_p() | 0x10)",
+    "PLA": "self.a = self.nf = self.zf = self.pull()",
+    "PLP": "self.set_p(self.pull())",
+    "JAM": """
+    self.halted = True
+    self.pc = (pc - 1) & 0xffff
+""",
+    # illegal opcodes
+    "SLO": """
+    m = mem[ea] << 1
+    self.c = m >> 8
+    mem[ea] = m = m & 0xff
+    self.a = self.nf = self.zf = self.a | m
+""",
+    "RLA": """
+    m = mem[ea] << 1 | self.c
+    self.c = m >> 8
+    mem[ea] = m = m & 0xff
+    self.a = self.nf = self.zf = self.a & m
+""",
+    "SRE": """
+    m = mem[ea]
+    self.c = m & 1
+    mem[ea] = m = m >> 1
+    self.a = self.nf = self.zf = self.a ^ m
+""",
+    "RRA": """
+    m = mem[ea] | self.c << 8
+    self.c = m & 1
+    mem[ea] = m = m >> 1
+    self.adc(m)
+""",
+    "SAX": "mem[ea] = self.a & self.x",
+    "LAX": "self.a = self.x = self.nf = self.zf = mem[ea]",
+    "DCP": """
+    mem[ea] = m = (mem[ea] - 1) & 0xff
+    self.compare(self.a, m)
+""",
+    "ISB": """
+    mem[ea] = m = (mem[ea] + 1) & 0xff
+    self.sbc(m)
+""",
+    "ANC": """
+    self.a = self.nf = self.zf = self.a & mem[ea]
+    self.c = self.a >> 7
+""",
+    "ASR": """
+    m = self.a & mem[ea]
+    self.c = m & 1
+    self.a = self.nf = self.zf = m >> 1
+""",
+    "ARR": """
+    m = (self.a & mem[ea]) >> 1 | self.c << 7
+    self.a = self.nf = self.zf = m
+    self.c = m >> 6 & 1
+    self.v = (m >> 6 ^ m >> 5) & 1
+""",
+    "ANE": "self.a = self.nf = self.zf = (self.a | 0xee) & self.x & mem[ea]",
+    "LXA": "self.a = self.x = self.nf = self.zf = (self.a | 0xee) & mem[ea]",
+    "SBX": """
+    m = (self.a & self.x) - mem[ea]
+    self.c = 0 if m < 0 else 1
+    self.x = self.nf = self.zf = m & 0xff
+""",
+    "SHA": "mem[ea] = self.a & self.x & ((base >> 8) + 1) & 0xff",
+    "SHX": "mem[ea] = self.x & ((base >> 8) + 1) & 0xff",
+    "SHY": "mem[ea] = self.y & ((base >> 8) + 1) & 0xff",
+    "SHS": """
+    self.s = self.a & self.x
+    mem[ea] = self.s & ((base >> 8) + 1) & 0xff
+""",
+    "LAE": "self.a = self.x = self.s = self.nf = self.zf = mem[ea] & self.s",
+}
+
+ACCUMULATOR_CODE = {
+    "ASL": """
+    m = self.a << 1
+    self.c = m >> 8
+    self.a = self.nf = self.zf = m & 0xff
+""",
+    "LSR": """
+    self.c = self.a & 1
+    self.a = self.nf = self.zf = self.a >> 1
+""",
+    "ROL": """
+    m = self.a << 1 | self.c
+    self.c = m >> 8
+    self.a = self.nf = self.zf = m & 0xff
+""",
+    "ROR": """
+    m = self.a | self.c << 8
+    self.c = m & 1
+    self.a = self.nf = self.zf = m >> 1
+""",
+}
+
+
+def indent(code):
+    return "".join(
+        "    {}\n".format(line) for line in dedent(code).strip().split("\n")
+    )
+
+
+def compile_op(x, mnemonic, mode):
+    if mode == "r":
+        op = "if {}:\n    self.pc = ea".format(BRANCH[mnemonic])
+    elif mode == "a":
+        op = ACCUMULATOR_CODE[mnemonic]
+    else:
+        op = OP_CODE[mnemonic]
+    src = "def op_{:02X}(self):\n{}{}{}{}".format(
+        x,
+        indent("mem = self.mem\npc = self.pc"),
+        indent(MODE_CODE[mode]),
+        indent("self.pc = pc"),
+        indent(op),
+    )
+    namespace = {}
+    exec(compile(src, "<op_{:02X}>".format(x), "exec"), namespace)
+    return namespace["op_{:02X}".format(x)]
+
+
+# one specialized function per opcode byte, built once at import
+OPS = tuple(
+    compile_op(x, mnemonic, mode) for x, (mnemonic, mode) in enumerate(DECODE)
+)
+
+
+class CPU6502:
+    __slots__ = (
+        "mem", "a", "x", "y", "s", "pc", "nf", "zf", "v", "d", "i", "c",
+        "halted",
+    )
+
+    def __init__(self, mem=None):
+        self.mem = bytearray(0x10000) if mem is None else mem
+        self.a = self.x = self.y = 0
+        self.s = 0xff
+        self.pc = 0
+        # N is bit 7 of nf, Z is set when zf is 0
+        self.nf = 0
+        self.zf = 1
+        self.v = self.d = self.i = self.c = 0
+        self.halted = False
+
+    def get_p(self):
+        return (
+            (self.nf & 0x80) | (0x40 if self.v else 0) | 0x20 |
+            self.d << 3 | self.i << 2 | (0 if self.zf else 2) | self.c
+        )
+
+    def set_p(self, p):
+        self.nf = p
+        self.zf = 0 if p & 2 else 1
+        self.v = p & 0x40
+        self.d = p >> 3 & 1
+        self.i = p >> 2 & 1
+        self.c = p & 1
+
+    def push(self, value):
+        self.mem[0x100 | self.s] = value
+        self.s = (self.s - 1) & 0xff
+
+    def pull(self):
+        self.s = (self.s + 1) & 0xff
+        return self.mem[0x100 | self.s]
+
+    def compare(self, r, m):
+        r -= m
+        self.c = 0 if r < 0 else 1
+        self.nf = self.zf = r & 0xff
+
+    def adc(self, m):
+        a = self.a
+        if self.d:
+            lo = (a & 0x0f) + (m & 0x0f) + self.c
+            if lo > 9:
+                lo += 6
+            hi = (a >> 4) + (m >> 4) + (1 if lo > 0x0f else 0)
+            # NMOS: Z from the binary sum, N and V before the high fixup
+            self.zf = (a + m + self.c) & 0xff
+            self.nf = hi << 4 & 0xff
+            self.v = ~(a ^ m) & (a ^ hi << 4) & 0x80
+            if hi > 9:
+                hi += 6
+            self.c = 1 if hi > 0x0f else 0
+            self.a = (hi << 4 | lo & 0x0f) & 0xff
+            return
+        r = a + m + self.c
+        self.v = ~(a ^ m) & (a ^ r) & 0x80
+        self.c = r >> 8
+        self.a = self.nf = self.zf = r & 0xff
+
+    def sbc(self, m):
+        a = self.a
+        r = a - m - 1 + self.c
+        # NMOS: flags always come from the binary difference
+        self.v = (a ^ m) & (a ^ r) & 0x80
+        if self.d:
+            lo = (a & 0x0f) - (m & 0x0f) - 1 + self.c
+            hi = (a >> 4) - (m >> 4)
+            if lo < 0:
+                lo -= 6
+                hi -= 1
+            if hi < 0:
+                hi -= 6
+            self.c = 0 if r < 0 else 1
+            self.nf = self.zf = r & 0xff
+            self.a = (hi << 4 | lo & 0x0f) & 0xff
+            return
+        self.c = 0 if r < 0 else 1
+        self.a = self.nf = self.zf = r & 0xff
+
+    def load_prg(self, data):
+        org = data[0] | data[1] << 8
+        self.mem[org:org + len(data) - 2] = data[2:]
+        return org
+
+    def reset(self):
+        self.pc = self.mem[0xfffc] | self.mem[0xfffd] << 8
+        self.s = 0xfd
+        self.i = 1
+        self.halted = False
+
+    def step(self):
+        OPS[self.mem[self.pc]](self)
+
+    def run(self, until=None, count=-1):
+        # runs until pc reaches until, a JAM halts the cpu, or count
+        # instructions have executed; returns the instruction count
+        ops = OPS
+        mem = self.mem
+        until = -1 if until is None else until
+        n = 0
+        while n != count and self.pc != until and not self.halted:
+            ops[mem[self.pc]](self)
+            n += 1
+        return n
+
+    def call(self, addr, count=-1):
+        # JSR to addr and run until the matching RTS
+        self.push(0xff)
+        self.push(0xfe)
+        self.pc = addr
+        return self.run(0xffff, count)
+
+    def __str__(self):
+        return "<CPU6502(pc=${:04X} a=${:02X} x=${:02X} y=${:02X} " \
+            "s=${:02X} p=${:02X})>".format(
+                self.pc, self.a, self.x, self.y, self.s, self.get_p()
+            )
+
+
+def main():
+    ap = ArgumentParser(description="run a PRG on a bare 6502")
+    ap.add_argument("input", metavar="FILE", type=FileType("rb"))
+    ap.add_argument("start", metavar="START", nargs="?",
+                    type=lambda x: int(x, 16), help="entry point (hex)")
+    ap.add_argument("-n", "--count", dest="count", type=int, default=1000000,
+                    help="stop after this many instructions")
+    args = ap.parse_args()
+    cpu = CPU6502()
+    org = cpu.load_prg(args.input.read())
+    start = perf_counter()
+    n = cpu.call(org if args.start is None else args.start, args.count)
+    elapsed = perf_counter() - start
+    print(cpu)
+    print("{} instructions in {:.3f}s, {:.0f}/s".format(
+        n, elapsed, n / elapsed if elapsed > 0 else 0
+    ))
+
+
+def check(trials=40, seed=6502):
+    # single steps of every documented opcode against py65, from random
+    # registers, flags and memory
+    # only the check needs py65
+    from py65.devices.mpu6502 import MPU
+    rnd = Random(seed)
+    for op in range(256):
+        if ILLEGAL[op]:
+            continue
+        for _ in range(trials):
+            mem = bytearray(rnd.randbytes(0x10000))
+            pc = rnd.randrange(0x200, 0xff00)
+            mem[pc] = op
+            a, x, y, s, p = rnd.randbytes(5)
+            p |= 0x30
+            cpu = CPU6502(bytearray(mem))
+            cpu.a, cpu.x, cpu.y, cpu.s, cpu.pc = a, x, y, s, pc
+            cpu.set_p(p)
+            mpu = MPU()
+            mpu.memory = list(mem)
+            mpu.a, mpu.x, mpu.y, mpu.sp, mpu.p, mpu.pc = a, x, y, s, p, pc
+            cpu.step()
+            mpu.step()
+            # py65 keeps B set, the cpu has no such bit
+            assert(
+                (cpu.a, cpu.x, cpu.y, cpu.s, cpu.get_p() | 0x10, cpu.pc) ==
+                (mpu.a, mpu.x, mpu.y, mpu.sp, mpu.p | 0x30, mpu.pc)
+            ), "{} differs from py65".format(" ".join(DECODE[op]))
+            assert(cpu.mem == bytearray(mpu.memory)), \
+                "{} writes differ from py65".format(" ".join(DECODE[op]))
+
+
+if __name__ == "__main__":
+    if argv[1:] == ["--check"]:
+        check()
+    else:
+        main()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from argparse import ArgumentParser, FileType
+from asm import MOS6502Parser
+from collections import deque
+from disasm import load_prg
+from io import StringIO
+from link import image
+from time import perf_counter
+
+# The packed stream is a sequence of tokens:
+#   $00-$7f  literals, token + 1 bytes follow
+#   $80-$bf  short match, length (token & $3f) + 3, then one byte:
+#            distance - 1
+#   $c0-$fe  long match, length (token & $3f) + 4, then two bytes:
+#            distance - 1, high byte first
+#   $ff      end
+# A match copies from that many bytes back in the output, forward and one
+# byte at a time, so a distance shorter than the length repeats.
+MAX_LITERALS = 128
+MAX_MATCH = 66
+SHORT = 256
+LONG = 65536
+END = 0xff
+# hash chain candidates looked at per position
+DEPTH = 16
+
+BASIC = 0x0801
+# where the depacker runs from: the tape buffer, out of the way of
+# anything loaded at $0400 or above
+DEPACK = 0x033c
+DEPACK_END = 0x03fc
+# the kernal loads no further than this without writing into I/O
+LOAD_LIMIT = 0xd000
+TOP = 0x10000
+
+# 10 SYS2061, then the packed data is moved to the top of memory, the
+# depacker to DEPACK, and off it goes
+LOADER = """
+.hex 0b 08 0a 00 9e 32 30 36 31 00 00 00
+src = $f8
+dst = $fa
+  sei
+  lda #$34
+  sta $01
+  ldx #DEPACK_SIZE
+depacker:
+  lda payload-1,x
+  sta DEPACK-1,x
+  dex
+  bne depacker
+  ; whole pages from the last one down; the destination is never below
+  ; the source, so nothing is overwritten before it has been copied
+  lda #<[payload+DEPACK_SIZE+PACKED_SIZE-256]
+  sta src
+  lda #>[payload+DEPACK_SIZE+PACKED_SIZE-256]
+  sta src+1
+  lda #$00
+  sta dst
+  lda #$ff
+  sta dst+1
+  ldx #PAGES
+  ldy #$ff
+page:
+  lda (src),y
+  sta (dst),y
+  dey
+  cpy #$ff
+  bne page
+  dec src+1
+  dec dst+1
+  dex
+  bne page
+  lda #<PACKED
+  sta src
+  lda #>PACKED
+  sta src+1
+  lda #<ORG
+  sta dst
+  lda #>ORG
+  sta dst+1
+  jmp DEPACK
+payload:
+"""
+
+DEPACKER = """
+src = $f8
+dst = $fa
+from = $fc
+  ldy #$00
+token:
+  jsr get
+  cmp #$80
+  bcs match
+  tax
+  inx
+literal:
+  jsr get
+  sta (dst),y
+  inc dst
+  bne literal_next
+  inc dst+1
+literal_next:
+  dex
+  bne literal
+  beq token
+match:
+  cmp #$ff
+  beq done
+  cmp #$c0
+  bcc short
+  and #$3f
+  adc #$03
+  tax
+  jsr get
+  eor #$ff
+  jmp offset
+short:
+  and #$3f
+  adc #$03
+  tax
+  lda #$ff
+offset:
+  ; from = dst - distance = dst + ~(distance - 1)
+  sta from+1
+  jsr get
+  eor #$ff
+  clc
+  adc dst
+  sta from
+  lda from+1
+  adc dst+1
+  sta from+1
+copy:
+  lda (from),y
+  sta (dst),y
+  iny
+  dex
+  bne copy
+  tya
+  clc
+  adc dst
+  sta dst
+  bcc copied
+  inc dst+1
+copied:
+  ldy #$00
+  beq token
+done:
+  lda #$37
+  sta $01
+  cli
+  jmp ENTRY
+get:
+  lda (src),y
+  inc src
+  bne got
+  inc src+1
+got:
+  rts
+"""
+
+
+def matches(data):
+    # per position, the longest match no further than SHORT bytes back
+    # and the longest one overall, as lengths and distances
+    n = len(data)
+    short_len = [0] * n
+    short_dist = [0] * n
+    long_len = [0] * n
+    long_dist = [0] * n
+    head = {}
+    prev = [-1] * n
+    for i in range(n - 2):
+        key = data[i:i + 3]
+        c = head.get(key, -1)
+        prev[i] = c
+        head[key] = i
+        limit = min(MAX_MATCH, n - i)
+        window = data[i:i + limit]
+        best = 2
+        depth = DEPTH
+        while c >= 0 and depth > 0 and i - c <= LONG:
+            depth -= 1
+            # only worth a look if it is longer than what we have
+            if best < limit and data[c + best] == window[best]:
+                if data.startswith(window, c):
+                    length = limit
+                else:
+                    length = 3
+                    while data[c + length] == window[length]:
+                        length += 1
+                if length > best:
+                    best = length
+                    if i - c <= SHORT:
+                        short_len[i] = length
+                        short_dist[i] = i - c
+                    else:
+                        long_len[i] = length
+                        long_dist[i] = i - c
+                    if length == limit:
+                        break
+            c = prev[c]
+    return short_len, short_dist, long_len, long_dist
+
+
+def parse(data):
+    # the cheapest token sequence, working back from the end: cost[i] is
+    # the size of the packed rest from i on
+    n = len(data)
+    short_len, short_dist, long_len, long_dist = matches(data)
+    cost = [0] * (n + 1)
+    # the best literal run from i on ends where j + cost[j] is least for
+    # j in i + 1 .. i + MAX_LITERALS; a sliding window minimum, the
+    # candidates ascending by that value
+    ends = deque([(n, n)])
+    choice = [None] * n
+    for i in range(n - 1, -1, -1):
+        if ends[-1][1] > i + MAX_LITERALS:
+            ends.pop()
+        low, j = ends[-1]
+        best = low - i + 1
+        pick = 0, j - i, 0
+        length = short_len[i]
+        if length:
+            window = cost[i + 3:i + length + 1]
+            low = min(window)
+            if low + 2 < best:
+                best = low + 2
+                pick = 1, window.index(low) + 3, short_dist[i]
+        length = long_len[i]
+        if length > short_len[i] and length >= 4:
+            window = cost[i + 4:i + length + 1]
+            low = min(window)
+            if low + 3 < best:
+                best = low + 3
+                pick = 2, window.index(low) + 4, long_dist[i]
+        cost[i] = best
+        while ends and ends[0][0] >= i + best:
+            ends.popleft()
+        ends.appendleft((i + best, i))
+        choice[i] = pick
+    return choice
+
+
+def pack(data):
+    data = bytes(data)
+    choice = parse(data)
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        kind, length, dist = choice[i]
+        if kind == 0:
+            out.append(length - 1)
+            out += data[i:i + length]
+        elif kind == 1:
+            out += bytes((0x80 | length - 3, dist - 1))
+        else:
+            out += bytes((0xc0 | length - 4, dist - 1 >> 8, dist - 1 & 0xff))
+        i += length
+    out.append(END)
+    return bytes(out)
+
+
+def unpack(packed):
+    out = bytearray()
+    i = 0
+    while True:
+        token = packed[i]
+        if token < 0x80:
+            out += packed[i + 1:i + token + 2]
+            i += token + 2
+            continue
+        elif token == END:
+            return out
+        elif token < 0xc0:
+            length = (token & 0x3f) + 3
+            dist = packed[i + 1] + 1
+            i += 2
+        else:
+            length = (token & 0x3f) + 4
+            dist = (packed[i + 1] << 8 | packed[i + 2]) + 1
+            i += 3
+        for _ in range(length):
+            out.append(out[-dist])
+
+
+def steps(packed):
+    # (bytes read, bytes written) after each token
+    written = 0
+    i = 0
+    while packed[i] != END:
+        token = packed[i]
+        if token < 0x80:
+            i += token + 2
+            written += token + 1
+        elif token < 0xc0:
+            i += 2
+            written += (token & 0x3f) + 3
+        else:
+            i += 3
+            written += (token & 0x3f) + 4
+        yield i, written
+
+
+def sys_address(org, data):
+    # the address in a "SYS nnnn" first BASIC line at $0801, if any
+    if org != BASIC or len(data) < 6 or data[4] != 0x9e:
+        return None
+    digits = bytes(data[5:data.find(0, 5)]).strip()
+    return int(digits) if digits.isdigit() else None
+
+
+def assemble(source, org, equates):
+    text = ".org ${:04x}\n".format(org) + "".join(
+        "{} = ${:x}\n".format(name, value) for name, value in equates.items()
+    ) + source
+    return MOS6502Parser(StringIO(text)).output
+
+
+def entry_point(org, data, start=None):
+    # by default the SYS address of a BASIC line at $0801, or else the
+    # start of the image
+    if start is None:
+        start = sys_address(org, data)
+    return org if start is None else start
+
+
+def crunch(segments, start=None):
+    # a PRG for $0801 that unpacks the segments and jumps to start
+    org, data = image(segments)
+    end = org + len(data)
+    start = entry_point(org, data, start)
+    if org < 0x400:
+        raise ValueError("cannot unpack below $0400")
+    packed = pack(data)
+    depacker = assemble(DEPACKER, DEPACK, {"ENTRY": start})
+    if len(depacker) > DEPACK_END - DEPACK:
+        raise ValueError("depacker too large")
+    pages = (len(packed) + 0xff) >> 8
+    loader = assemble(LOADER, BASIC, {
+        "DEPACK": DEPACK,
+        "DEPACK_SIZE": len(depacker),
+        "PACKED_SIZE": len(packed),
+        "PAGES": pages,
+        "PACKED": TOP - len(packed),
+        "ORG": org,
+    })
+    payload = BASIC + len(loader)
+    if payload + len(depacker) + len(packed) > LOAD_LIMIT:
+        raise ValueError("packed data does not fit below ${:04X}".format(
+            LOAD_LIMIT
+        ))
+    if TOP - pages * 256 < payload:
+        raise ValueError("packed data would overwrite the loader")
+    # unpacking in place must stay behind the packed data it reads
+    if end > TOP - len(packed) and any(
+        org + written > TOP - len(packed) + read
+        for read, written in steps(packed)
+    ):
+        raise ValueError("${:04X}-${:04X} too large to unpack in place".format(
+            org, end - 1
+        ))
+    return bytes((BASIC & 0xff, BASIC >> 8)) + loader + depacker + packed
+
+
+def verify(prg, segments, start=None, count=100000000):
+    # runs the PRG from its SYS line to the entry point on cpu6502; True
+    # when memory then holds the segments, and the instruction count
+    from cpu6502 import CPU6502
+    org, data = image(segments)
+    cpu = CPU6502()
+    cpu.load_prg(prg)
+    cpu.pc = sys_address(BASIC, prg[2:])
+    # the loader first, the entry point may well be where it starts
+    n = cpu.run(DEPACK, count)
+    n += cpu.run(entry_point(org, data, start), count - n)
+    return cpu.mem[org:org + len(data)] == data, n
+
+
+def blocks(size):
+    return (size + 253) // 254
+
+
+def main():
+    ap = ArgumentParser(description="pack a PRG into a self-unpacking PRG")
+    ap.add_argument("input", metavar="FILE", type=FileType("rb"))
+    ap.add_argument("-o", "--output", dest="output", default=None,
+                    help="output file, default: FILE with .crunched.prg")
+    ap.add_argument("-s", "--start", dest="start", default=None,
+                    type=lambda x: int(x, 16),
+                    help="entry point (hex), default: the SYS address of a "
+                         "BASIC line at $0801, or the load address")
+    ap.add_argument("--verify", dest="verify", action="store_true",
+                    help="unpack on cpu6502 and compare")
+    args = ap.parse_args()
+    org, data = load_prg(args.input.read())
+    segments = [(org, bytes(data))]
+    start = perf_counter()
+    try:
+        prg = crunch(segments, args.start)
+    except ValueError as e:
+        ap.exit(1, "{}\n".format(e))
+    elapsed = perf_counter() - start
+    output = args.output
+    if output is None:
+        output = "{}.crunched.prg".format(args.input.name.rsplit(".", 1)[0])
+    with open(output, "wb") as fh:
+        fh.write(prg)
+    # what a 1541 loads is whole blocks of 254 bytes
+    print("{}: {} -> {} bytes, {} -> {} blocks, in {:.3f}s".format(
+        output, len(data) + 2, len(prg), blocks(len(data) + 2),
+        blocks(len(prg)), elapsed
+    ))
+    if args.verify:
+        ok, n = verify(prg, segments, args.start)
+        print("{} after {} instructions".format(
+            "unpacked fine" if ok else "MISMATCH", n
+        ))
+        if not ok:
+            ap.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from collections import namedtuple
+from disasm import decode, format_instruction
+from link import BUDGET, FILE, image, INST, INVERT, JMP, LABEL, lo, ORG
+from optables import BRANCH_PAGE, BRANCH_TAKEN, CYCLES, ENCODE, PAGE_PENALTY
+
+# Cycle counts of linked code, straight-line: a block runs from a label or
+# .org to the next one, and its min/max are the sums over its
+# instructions, not over paths through loops. ".budget N" sets the most
+# cycles the enclosing block may take.
+
+Timing = namedtuple("Timing", ["address", "index", "size", "min", "max"])
+Block = namedtuple("Block", [
+    "label", "address", "min", "max", "budget", "filename", "lineno"
+])
+
+
+def same_page(a, b):
+    return a >> 8 == b >> 8
+
+
+def instruction_cycles(linker, i, pc):
+    item = linker.items[i]
+    if i in linker.relaxed:
+        # the opposite branch either skips the JMP or falls into it
+        inverted = CYCLES[ENCODE[INVERT[item[1]], "r"][0]]
+        skip = inverted + BRANCH_TAKEN
+        if not same_page(pc + 2, pc + 5):
+            skip += BRANCH_PAGE
+        jump = inverted + CYCLES[JMP]
+        return min(skip, jump), max(skip, jump)
+    mode = linker.mode(i)
+    x = ENCODE[item[1], mode][0]
+    base, penalty = CYCLES[x], PAGE_PENALTY[x]
+    if mode == "r":
+        target = linker.value(item[3], item[-1], pc)
+        penalty = BRANCH_TAKEN
+        if target is None or not same_page(target, pc + 2):
+            penalty += BRANCH_PAGE
+    elif penalty and mode in ("abs,x", "abs,y"):
+        # indexing from the start of a page never leaves it
+        value = linker.value(item[3], item[-1], pc)
+        if value is not None and lo(value) == 0:
+            penalty = 0
+    return base, base + penalty
+
+
+def analyze(linker):
+    items = linker.items
+    timings = []
+    blocks = []
+    block = None
+    filename = None
+    for i, pc in linker.walk():
+        item = items[i]
+        kind = item[0]
+        if kind == INST:
+            low, high = instruction_cycles(linker, i, pc)
+            timings.append(Timing(pc, i, linker.sizes[i], low, high))
+            if block is None:
+                block = [None, pc, 0, 0, None, filename, item[-1]]
+                blocks.append(block)
+            block[2] += low
+            block[3] += high
+        elif kind in (LABEL, ORG):
+            block = [
+                item[1] if kind == LABEL else None, pc, 0, 0, None, filename,
+                item[-1]
+            ]
+            blocks.append(block)
+        elif kind == BUDGET:
+            if block is None:
+                block = [None, pc, 0, 0, None, filename, item[-1]]
+                blocks.append(block)
+            block[4] = linker.value(item[1], item[-1])
+        elif kind == FILE:
+            filename = item[1]
+    return timings, [Block(*b) for b in blocks]
+
+
+def overruns(blocks):
+    return [
+        b for b in blocks if b.budget is not None and b.max > b.budget
+    ]
+
+
+def budget_warnings(linker):
+    if not any(item[0] == BUDGET for item in linker.items):
+        return []
+    msgs = []
+    for b in overruns(analyze(linker)[1]):
+        msg = "line {}: {} takes up to {} cycles, over its budget of {}"
+        msg = msg.format(
+            b.lineno, b.label or "block at ${:04x}".format(b.address), b.max,
+            b.budget
+        )
+        msgs.append(msg if b.filename is None else "{}: {}".format(
+            b.filename, msg
+        ))
+    return msgs
+
+
+def listing(linker):
+    # the disassembled output with cycles per instruction and block
+    timings, blocks = analyze(linker)
+    org, data = image(linker.segments)
+    starts = {}
+    for b in blocks:
+        if b.label is not None or b.max > 0:
+            starts.setdefault(b.address, []).append(b)
+    for t in timings:
+        for b in starts.pop(t.address, ()):
+            yield "{:<36}; {:>5}-{:<5}{}".format(
+                "{}:".format(b.label) if b.label else "",
+                b.min, b.max,
+                "" if b.budget is None else " budget {}{}".format(
+                    b.budget, " OVER" if b.max > b.budget else ""
+                )
+            ).rstrip()
+        first = True
+        for addr, x, operand, n in decode(
+            data, org, t.address, t.address + t.size - 1
+        ):
+            text = format_instruction(
+                addr, x, operand, data[addr - org:addr - org + n]
+            )
+            if first:
+                text = "{:<36}; {:>5}-{:<5}".format(text, t.min, t.max)
+                first = False
+            yield text.rstrip()
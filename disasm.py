@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from argparse import ArgumentParser, FileType
+from optables import DECODE, INSTRUCTION_LENGTH, LENGTH
+
+# operand templates in the notation of the VICE monitor
+OPERAND = {
+    "_": "",
+    "a": " A",
+    "#": " #${:02X}",
+    "zp": " ${:02X}",
+    "zp,x": " ${:02X},X",
+    "zp,y": " ${:02X},Y",
+    "abs": " ${:04X}",
+    "abs,x": " ${:04X},X",
+    "abs,y": " ${:04X},Y",
+    "iz,x": " (${:02X},X)",
+    "iz,y": " (${:02X}),Y",
+    "ind": " (${:04X})",
+    "r": " ${:04X}",
+}
+
+# per opcode byte: mnemonic, mode, length, "MNEMONIC operand" template
+TABLE = tuple(
+    (mnemonic, mode, INSTRUCTION_LENGTH[mode], mnemonic + OPERAND[mode])
+    for mnemonic, mode in DECODE
+)
+
+
+def load_prg(data):
+    data = memoryview(data)
+    return data[0] | data[1] << 8, data[2:]
+
+
+def decode(data, org=0, start=None, end=None):
+    # yields (address, opcode byte, operand, length) for each instruction
+    # starting between start and end inclusive; a truncated last
+    # instruction ends the stream
+    data = memoryview(data)
+    i = 0 if start is None else start - org
+    stop = len(data) if end is None else min(end - org + 1, len(data))
+    length = LENGTH
+    while i < stop:
+        x = data[i]
+        n = length[x]
+        if i + n > len(data):
+            return
+        if n == 1:
+            yield org + i, x, None, 1
+        elif n == 2:
+            yield org + i, x, data[i + 1], 2
+        else:
+            yield org + i, x, data[i + 1] | data[i + 2] << 8, 3
+        i += n
+
+
+def format_instruction(addr, x, operand, data):
+    mnemonic, mode, n, template = TABLE[x]
+    if mode == "r":
+        operand = (addr + 2 + (operand ^ 0x80) - 0x80) & 0xffff
+    return ".C:{:04x}  {:<12}{}".format(
+        addr, data.hex(" ").upper(), template.format(operand)
+    )
+
+
+def disassemble(data, org=0, start=None, end=None):
+    data = memoryview(data)
+    for addr, x, operand, n in decode(data, org, start, end):
+        yield format_instruction(
+            addr, x, operand, data[addr - org:addr - org + n]
+        )
+
+
+def main():
+    ap = ArgumentParser(description="simple 6502 Disassembler")
+    ap.add_argument("input", metavar="FILE", type=FileType("rb"))
+    ap.add_argument("start", metavar="START", nargs="?",
+                    type=lambda x: int(x, 16), help="first address (hex)")
+    ap.add_argument("end", metavar="END", nargs="?",
+                    type=lambda x: int(x, 16), help="last address (hex)")
+    args = ap.parse_args()
+    org, data = load_prg(args.input.read())
+    for line in disassemble(data, org, args.start, args.end):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
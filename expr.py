@@ -0,0 +1,269 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from functools import lru_cache
+from math import pi, sin, cos
+from re import compile as re_compile
+
+# Operand expressions: numbers ($hex, %binary, decimal), symbols, * for
+# the address of the current instruction, + - * / and the unary -, < (low
+# byte) and > (high byte). Brackets group, parentheses are left to the
+# indirect addressing modes, except after a function name: lo(x) and
+# hi(x) are < and >, sin(x, n) and cos(x, n) take x in 1/n of a turn.
+# Those two make for fractions, and / divides exactly once there is one;
+# what evaluate() returns is rounded to an int.
+#
+# parse() folds what it can and returns an int, a str for a lone symbol,
+# or a tree of plain tuples, so that pass one items still pickle.
+
+NUMBER = re_compile(r"\$([0-9a-fA-F]+)|%([01]+)|([0-9]+)")
+TOKEN = re_compile(
+    r"\s*(?:\$([0-9a-fA-F]+)|%([01]+)|([0-9]+)|([A-Za-z_]\w*)|(\S))"
+)
+PC = ("*", )
+
+
+def div(a, b):
+    if b == 0:
+        raise ValueError("division by zero")
+    if type(a) is int and type(b) is int:
+        return a // b
+    return a / b
+
+
+def integer(a):
+    return a if type(a) is int else round(a)
+
+
+BINARY = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": div,
+}
+UNARY = {
+    "neg": lambda a: -a,
+    "<": lambda a: integer(a) & 0xff,
+    ">": lambda a: (integer(a) >> 8) & 0xff,
+}
+# by name: (tree operator, number of arguments); the operators of sin
+# and cos are their names
+FUNCTIONS = {
+    "lo": ("<", 1),
+    "hi": (">", 1),
+    "sin": ("sin", 2),
+    "cos": ("cos", 2),
+}
+BINARY["sin"] = lambda a, n: sin(div(2 * pi * a, n))
+BINARY["cos"] = lambda a, n: cos(div(2 * pi * a, n))
+
+
+def number(m):
+    hexdigits, bindigits, decimal = m.groups()[:3]
+    if hexdigits is not None:
+        return int(hexdigits, 16)
+    if bindigits is not None:
+        return int(bindigits, 2)
+    return int(decimal)
+
+
+def tokenize(text):
+    pos = 0
+    tokens = []
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if m is None:
+            break
+        pos = m.end()
+        if m.group(4) is not None:
+            tokens.append(("sym", m.group(4)))
+        elif m.group(5) is not None:
+            tokens.append((m.group(5), None))
+        else:
+            tokens.append(("num", number(m)))
+    tokens.append(("end", None))
+    return tokens
+
+
+class ExprParser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def error(self, msg):
+        raise ValueError("{} in expression {!r}".format(msg, self.text))
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def peek(self):
+        return self.tokens[self.pos][0]
+
+    def parse(self):
+        tree = self.sum()
+        if self.peek() != "end":
+            self.error("unexpected {!r}".format(self.tokens[self.pos][0]))
+        return tree
+
+    def sum(self):
+        tree = self.product()
+        while self.peek() in ("+", "-"):
+            op = self.next()[0]
+            tree = fold(op, tree, self.product())
+        return tree
+
+    def product(self):
+        tree = self.unary()
+        while self.peek() in ("*", "/"):
+            op = self.next()[0]
+            tree = fold(op, tree, self.unary())
+        return tree
+
+    def unary(self):
+        kind, value = self.next()
+        if kind == "-":
+            return fold("neg", self.unary())
+        elif kind in ("<", ">"):
+            return fold(kind, self.unary())
+        elif kind == "+":
+            return self.unary()
+        elif kind == "sym" and self.peek() == "(":
+            return self.call(value)
+        elif kind in ("num", "sym"):
+            return value
+        elif kind == "*":
+            return PC
+        elif kind == "[":
+            tree = self.sum()
+            if self.next()[0] != "]":
+                self.error("missing ]")
+            return tree
+        self.error("unexpected {!r}".format(kind))
+
+    def call(self, name):
+        if name not in FUNCTIONS:
+            self.error("unknown function {}".format(name))
+        op, n = FUNCTIONS[name]
+        self.next()
+        args = [self.sum()]
+        while self.peek() == ",":
+            self.next()
+            args.append(self.sum())
+        if self.next()[0] != ")":
+            self.error("missing )")
+        if len(args) != n:
+            self.error("{} takes {} argument{}".format(
+                name, n, "" if n == 1 else "s"
+            ))
+        return fold(op, *args)
+
+
+def fold(op, *args):
+    # fractions stay unfolded, trees hold ints only
+    if all(type(arg) is int for arg in args):
+        if len(args) == 1:
+            value = UNARY[op](args[0])
+        else:
+            value = BINARY[op](*args)
+        if type(value) is int:
+            return value
+    return (op, ) + args
+
+
+def split(text):
+    # comma separated expressions, not splitting function arguments
+    args = []
+    depth = 0
+    start = 0
+    for pos, c in enumerate(text):
+        if c in "([":
+            depth += 1
+        elif c in ")]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            args.append(text[start:pos].strip())
+            start = pos + 1
+    args.append(text[start:].strip())
+    return args
+
+
+@lru_cache(maxsize=4096)
+def parse_tree(text):
+    m = NUMBER.fullmatch(text)
+    if m is not None:
+        return number(m)
+    return ExprParser(text).parse()
+
+
+def parse(text):
+    # most operands are a lone label
+    if text.isidentifier():
+        return text
+    return parse_tree(text)
+
+
+def uses_pc(tree):
+    if type(tree) is not tuple:
+        return False
+    return tree == PC or any(uses_pc(arg) for arg in tree[1:])
+
+
+def names(tree):
+    if type(tree) is str:
+        yield tree
+    elif type(tree) is tuple:
+        for arg in tree[1:]:
+            yield from names(arg)
+
+
+def rename(tree, mapping):
+    # tree with the names in mapping replaced
+    if type(tree) is str:
+        return mapping.get(tree, tree)
+    elif type(tree) is tuple and len(tree) > 1:
+        return (tree[0], ) + tuple(rename(arg, mapping) for arg in tree[1:])
+    return tree
+
+
+@lru_cache(maxsize=4096)
+def compile_tree(tree):
+    # closures taking (symbols, pc) and returning None while a symbol is
+    # still undefined
+    if type(tree) is int:
+        return lambda values, pc: tree
+    elif type(tree) is str:
+        return lambda values, pc: values.get(tree)
+    elif tree == PC:
+        return lambda values, pc: pc
+    fn = UNARY.get(tree[0]) if len(tree) == 2 else BINARY[tree[0]]
+    args = tuple(compile_tree(arg) for arg in tree[1:])
+    if len(args) == 1:
+        a, = args
+
+        def unary(values, pc):
+            x = a(values, pc)
+            return None if x is None else fn(x)
+        return unary
+    a, b = args
+
+    def binary(values, pc):
+        x = a(values, pc)
+        y = b(values, pc)
+        return None if x is None or y is None else fn(x, y)
+    return binary
+
+
+def evaluate(tree, values, pc=None):
+    if type(tree) is int:
+        return tree
+    elif type(tree) is str:
+        return values.get(tree)
+    value = compile_tree(tree)(values, pc)
+    return value if value is None else integer(value)
@@ -0,0 +1,480 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from collections import namedtuple
+from expr import evaluate, names, rename, uses_pc
+from mmap import mmap
+from optables import ENCODE
+from os.path import splitext
+from tabulate import tabulate, unresolved
+
+JMP = ENCODE["JMP", "abs"][0]
+
+lo = lambda x: x & 0xff
+hi = lambda x: (x >> 8) & 0xff
+
+# pass one items, see MOS6502Parser.items; every item ends in its line number
+ORG, LABEL, DATA, INST, FILE, EQU, BUDGET, TABLE = range(8)
+
+# a relaxed branch becomes the opposite branch over a JMP to its target
+INVERT = {
+    "BPL": "BMI", "BMI": "BPL", "BVC": "BVS", "BVS": "BVC",
+    "BCC": "BCS", "BCS": "BCC", "BNE": "BEQ", "BEQ": "BNE",
+}
+
+# a relocatable module: pass one items, with the instructions that
+# reference symbols serving as relocation records, the names it exports
+# with .export, and the (path, digest) of every file it included
+Object = namedtuple("Object", ["name", "items", "exports", "depends"])
+
+
+class Linker:
+    def __init__(self, items, profiler=None, relax=False, optimizer=None):
+        self.items = items
+        self.profiler = profiler
+        self.relax = relax
+        self.optimizer = optimizer
+        self.sizes = []
+        self.short = set()
+        self.relaxed = set()
+        self.symbols = {}
+        self.errors = []
+        # layout evaluates operands and equates over and over, each error
+        # is reported once
+        self.reported = set()
+        self.filename = None
+        self.org = None
+        # (start address, bytes), ascending and without padding in between
+        self.segments = []
+
+    @property
+    def output(self):
+        return image(self.segments)[1]
+
+    def error(self, lineno, msg):
+        if self.filename is not None:
+            msg = "{}: line {}: {}".format(self.filename, lineno, msg)
+        else:
+            msg = "line {}: {}".format(lineno, msg)
+        if msg not in self.reported:
+            self.reported.add(msg)
+            self.errors.append(msg)
+
+    def value(self, operand, lineno, pc=None):
+        try:
+            return evaluate(operand, self.symbols, pc)
+        except ValueError as e:
+            self.error(lineno, str(e))
+            return 0
+
+    def unresolved(self, operand, lineno):
+        self.error(lineno, "unresolved symbol {}".format(", ".join(
+            name for name in names(operand) if self.symbols.get(name) is None
+        )))
+
+    def assign(self, check=False):
+        symbols = {}
+        equates = []
+        pc = None
+        for item, size in zip(self.items, self.sizes):
+            kind = item[0]
+            if kind == LABEL:
+                if check and item[1] in symbols:
+                    self.error(item[2], "duplicate label {}".format(item[1]))
+                symbols[item[1]] = pc
+            elif kind == EQU:
+                if check and item[1] in symbols:
+                    self.error(item[3], "duplicate label {}".format(item[1]))
+                symbols[item[1]] = None
+                equates.append((item, pc))
+            elif kind == FILE:
+                self.filename = item[1]
+            elif kind == ORG:
+                if pc is not None and item[1] < pc:
+                    if check:
+                        msg = ".org ${:04X} below ${:04X}".format(item[1], pc)
+                        self.error(item[2], msg)
+                    continue
+                pc = item[1]
+            elif size > 0:
+                if pc is None:
+                    if check:
+                        self.error(item[-1], "code before .org")
+                    pc = 0
+                pc += size
+        self.symbols = symbols
+        # equates may refer to each other in any order, each round resolves
+        # at least one more or gives up
+        while equates:
+            pending = []
+            for item, pc in equates:
+                value = self.value(item[2], item[3], pc)
+                if value is None:
+                    pending.append((item, pc))
+                else:
+                    symbols[item[1]] = value
+            if len(pending) == len(equates):
+                break
+            equates = pending
+
+    def layout(self):
+        items = self.items
+        sizes = self.sizes
+        pending = []
+        for i, item in enumerate(items):
+            kind = item[0]
+            if kind == INST:
+                sizes.append(ENCODE[item[1], item[2][-1]][1])
+                # an operand using * moves with the layout, it stays long
+                if len(item[2]) > 1 and not uses_pc(item[3]):
+                    pending.append(i)
+            elif kind == DATA:
+                sizes.append(len(item[1]))
+            elif kind == TABLE:
+                sizes.append(item[3])
+            else:
+                sizes.append(0)
+        self.assign(True)
+        # shrinking moves symbols down, which pushes an operand that
+        # subtracts one up again, maybe over $ff; such operands grow back
+        # and stay long, so each changes size at most twice and this ends
+        short = self.short
+        while pending:
+            keep = []
+            for i in pending:
+                if self.fits(i):
+                    short.add(i)
+                    sizes[i] = ENCODE[items[i][1], items[i][2][0]][1]
+                else:
+                    keep.append(i)
+            if len(keep) == len(pending):
+                break
+            pending = keep
+            self.assign()
+            while True:
+                grown = [i for i in short if not self.fits(i)]
+                if len(grown) == 0:
+                    break
+                for i in grown:
+                    short.discard(i)
+                    sizes[i] = ENCODE[items[i][1], items[i][2][-1]][1]
+                self.assign()
+        if self.optimizer is not None:
+            self.optimizer.layout(self)
+        # relaxing only moves symbols up, and never undoes itself
+        while self.relax and self.relax_branches():
+            self.assign()
+
+    def fits(self, i):
+        # whether the operand of items[i] fits zero page as symbols stand
+        operand = self.items[i][3]
+        if type(operand) is str:
+            value = self.symbols.get(operand)
+        else:
+            value = self.value(operand, self.items[i][-1])
+        return value is not None and 0 <= value < 0x100
+
+    def walk(self):
+        # (index, address) of every item as assign() places it; sizes may
+        # change under way
+        sizes = self.sizes
+        pc = None
+        for i, item in enumerate(self.items):
+            if item[0] == ORG:
+                if pc is None or item[1] >= pc:
+                    pc = item[1]
+                yield i, pc
+            elif sizes[i] > 0:
+                if pc is None:
+                    pc = 0
+                yield i, pc
+                pc += sizes[i]
+            else:
+                yield i, pc
+
+    def mode(self, i):
+        modes = self.items[i][2]
+        return modes[0] if len(modes) == 1 or i in self.short else modes[-1]
+
+    def relax_branches(self):
+        items = self.items
+        sizes = self.sizes
+        grew = False
+        for i, pc in self.walk():
+            item = items[i]
+            if sizes[i] == 2 and item[0] == INST and item[2] == ("r", ) and \
+                    item[1] in INVERT:
+                target = self.value(item[3], item[-1], pc)
+                if target is not None and not -128 <= target - pc - 2 <= 127:
+                    self.relaxed.add(i)
+                    sizes[i] = 5
+                    grew = True
+        return grew
+
+    def emit(self):
+        out = bytearray()
+        self.segments = [(0, out)]
+        symbols = self.symbols
+        short = self.short
+        relaxed = self.relaxed
+        # expressions not using * are evaluated once, however often used
+        values = {}
+        sizes = self.sizes
+        pc = 0
+        over = False
+        for i, item in enumerate(self.items):
+            kind = item[0]
+            if sizes[i] > 0 and pc + sizes[i] > 0x10000 and not over:
+                self.error(item[-1], "address out of range")
+                over = True
+            if kind == DATA:
+                out.extend(item[1])
+                pc += len(item[1])
+            elif kind == TABLE:
+                out.extend(self.table(item, pc))
+                pc += item[3]
+            elif kind == INST:
+                _, mnemonic, modes, operand, lineno = item
+                if i in relaxed:
+                    value = self.value(operand, lineno, pc)
+                    if value is None:
+                        self.unresolved(operand, lineno)
+                        value = 0
+                    elif value < 0 or value > 0xffff:
+                        self.error(lineno, "address out of range")
+                    out.append(ENCODE[INVERT[mnemonic], "r"][0])
+                    out.append(3)
+                    out.append(JMP)
+                    out.append(lo(value))
+                    out.append(hi(value))
+                    pc += 5
+                    continue
+                mode = modes[0] if len(modes) == 1 or i in short else modes[-1]
+                inst, length = ENCODE[mnemonic, mode]
+                out.append(inst)
+                if length == 1:
+                    pc += length
+                    continue
+                if type(operand) is int:
+                    value = operand
+                elif type(operand) is str:
+                    value = symbols.get(operand)
+                elif uses_pc(operand):
+                    value = self.value(operand, lineno, pc)
+                else:
+                    value = values.get(operand)
+                    if value is None:
+                        value = values[operand] = self.value(operand, lineno)
+                pc += length
+                if value is None:
+                    self.unresolved(operand, lineno)
+                    # and not out of range on top of that
+                    value = pc if mode == "r" else 0
+                if mode == "r":
+                    value -= pc
+                    if value < -128 or value > 127:
+                        self.error(lineno, "branch out of range{}".format(
+                            "" if self.relax else ", try --relax"
+                        ))
+                    out.append(lo(value))
+                elif length == 2:
+                    if value < -0x80 or value > 0xff:
+                        self.error(lineno, "value out of range")
+                    out.append(lo(value))
+                else:
+                    if value < 0 or value > 0xffff:
+                        self.error(lineno, "address out of range")
+                    out.append(lo(value))
+                    out.append(hi(value))
+            elif kind == FILE:
+                self.filename = item[1]
+            elif kind == ORG:
+                if self.org is None:
+                    self.org = pc = item[1]
+                    if len(out) == 0:
+                        self.segments[0] = pc, out
+                elif item[1] > pc:
+                    out = bytearray()
+                    self.segments.append((item[1], out))
+                    pc = item[1]
+
+    def table(self, item, pc):
+        _, tree, first, count, lineno = item
+        missing = unresolved(tree, self.symbols)
+        if len(missing) > 0:
+            self.error(lineno, "unresolved symbol {}".format(
+                ", ".join(missing)
+            ))
+            return bytes(count)
+        try:
+            return tabulate(tree, first, count, self.symbols, pc)
+        except ValueError as e:
+            self.error(lineno, str(e))
+            return bytes(count)
+
+    def write(self, fh, fmt="prg"):
+        write(fh, self.segments, fmt)
+
+    def link(self):
+        prof = self.profiler
+        optimizer = self.optimizer
+        if prof is None:
+            if optimizer is not None:
+                self.items = optimizer.rewrite(self.items)
+            self.layout()
+            self.emit()
+        else:
+            if optimizer is not None:
+                with prof.phase("peephole"):
+                    self.items = optimizer.rewrite(self.items)
+            with prof.phase("layout"):
+                self.layout()
+            with prof.phase("emit"):
+                self.emit()
+            prof.count("items", len(self.items))
+            prof.count("labels", len(self.symbols))
+            prof.count("fixups", sum(
+                1 for item in self.items
+                if item[0] == INST and type(item[3]) in (str, tuple)
+            ))
+            prof.count("shrunk", len(self.short))
+            prof.count("relaxed", len(self.relaxed))
+            if optimizer is not None:
+                prof.count("peephole", len(optimizer.changes))
+            prof.count("bytes", sum(len(data) for _, data in self.segments))
+        if len(self.errors) > 0:
+            raise ValueError("\n".join(self.errors))
+        return self
+
+
+def image(segments):
+    # (start, bytes) with the gaps between the segments zero filled
+    if len(segments) == 0:
+        return 0, bytearray()
+    org = segments[0][0]
+    out = bytearray(image_size(segments))
+    for start, data in segments:
+        out[start - org:start - org + len(data)] = data
+    return org, out
+
+
+def write(fh, segments, fmt="prg"):
+    # prg: load address and image, raw: just the image; the gaps are
+    # skipped over where the file allows, leaving holes that read as zeros
+    org = segments[0][0] if len(segments) > 0 else 0
+    if fmt == "prg":
+        fh.write(bytes((lo(org), hi(org))))
+    pc = org
+    for start, data in segments:
+        if start > pc:
+            if fh.seekable():
+                fh.seek(start - pc, 1)
+            else:
+                fh.write(bytes(start - pc))
+        fh.write(data)
+        pc = start + len(data)
+
+
+def write_mmap(path, segments, fmt="prg"):
+    # for large images, only the segments are ever touched
+    org = segments[0][0] if len(segments) > 0 else 0
+    header = 2 if fmt == "prg" else 0
+    size = header + image_size(segments)
+    with open(path, "w+b") as fh:
+        fh.truncate(size)
+        if size == 0:
+            return
+        with mmap(fh.fileno(), size) as m:
+            if header:
+                m[0:2] = bytes((lo(org), hi(org)))
+            for start, data in segments:
+                offset = header + start - org
+                m[offset:offset + len(data)] = data
+
+
+def image_size(segments):
+    if len(segments) == 0:
+        return 0
+    return segments[-1][0] + len(segments[-1][1]) - segments[0][0]
+
+
+def write_segments(path, segments):
+    # one PRG per segment, as NAME.xxxx.EXT
+    root, ext = splitext(path)
+    names = []
+    for start, data in segments:
+        names.append("{}.{:04x}{}".format(root, start, ext))
+        with open(names[-1], "wb") as fh:
+            write(fh, [(start, data)])
+    return names
+
+
+def private(obj):
+    # the items of obj, the names it does not export made its own
+    exported = set(obj.exports)
+    mapping = {
+        item[1]: "{}@{}".format(item[1], obj.name) for item in obj.items
+        if item[0] in (LABEL, EQU) and item[1] not in exported
+    }
+    if len(mapping) == 0:
+        return obj.items
+    items = []
+    for item in obj.items:
+        kind = item[0]
+        if kind == LABEL:
+            item = LABEL, mapping.get(item[1], item[1]), item[2]
+        elif kind == EQU:
+            item = EQU, mapping.get(item[1], item[1]), \
+                rename(item[2], mapping), item[3]
+        elif kind == INST:
+            item = item[:3] + (rename(item[3], mapping), item[4])
+        elif kind in (BUDGET, TABLE):
+            item = (kind, rename(item[1], mapping)) + item[2:]
+        items.append(item)
+    return items
+
+
+def link(objects, profiler=None, relax=False, optimizer=None):
+    exports = {}
+    # the same equate may come from a header included by several modules
+    equates = {}
+    errors = []
+    for obj in objects:
+        values = {item[1]: item[2] for item in obj.items if item[0] == EQU}
+        for name in obj.exports:
+            if name in exports and equates.get(name, obj) != values.get(name):
+                errors.append("{}: label {} already defined in {}".format(
+                    obj.name, name, exports[name]
+                ))
+            exports.setdefault(name, obj.name)
+            if name in values:
+                equates.setdefault(name, values[name])
+    if len(errors) > 0:
+        raise ValueError("\n".join(errors))
+    # a module's code before its first .org continues the previous segment
+    segments = []
+    seen = set()
+    for obj in objects:
+        marker = FILE, obj.name, 0
+        if len(segments) == 0:
+            segments.append((-1, [marker]))
+        else:
+            segments[-1][1].append(marker)
+        for item in private(obj):
+            if item[0] == EQU:
+                if item[1] in seen:
+                    continue
+                seen.add(item[1])
+            elif item[0] == ORG:
+                segments.append((item[1], [marker]))
+            elif item[0] == FILE:
+                marker = item
+            segments[-1][1].append(item)
+    segments.sort(key=lambda s: s[0])
+    return Linker(
+        [item for _, items in segments for item in items], profiler, relax,
+        optimizer
+    ).link()
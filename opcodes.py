@@ -6,6 +6,7 @@
 # of the ISC license.  See the LICENSE file for details.
 
 from collections import namedtuple
+from os.path import abspath, dirname, join
 from sys import argv
 
 Opcode = namedtuple("Opcode", ["mnemonic", "modes", "aliases"])
@@ -135,11 +136,11 @@ OPCODES = (
     Opcode("TXA", {"_": 0x8A}),
     Opcode("ANE", {"#": 0x8B}, ("XAA", )),
     Opcode("BCC", {"r": 0x90}),
-    Opcode("SHA", {"abs,x": 0x93, "abs,y": 0x9F}, ("AHX", )),
+    Opcode("SHA", {"iz,y": 0x93, "abs,y": 0x9F}, ("AHX", )),
     Opcode("TYA", {"_": 0x98}),
     Opcode("TXS", {"_": 0x9A}),
-    Opcode("SHS", {"abs,x": 0x9B}, ("TAS", )),
-    Opcode("SHY", {"abs,y": 0x9C}),
+    Opcode("SHS", {"abs,y": 0x9B}, ("TAS", )),
+    Opcode("SHY", {"abs,x": 0x9C}),
     Opcode("SHX", {"abs,y": 0x9E}),
     Opcode("LDY", {
         "#": 0xA0, "zp": 0xA4, "zp,x": 0xB4, "abs": 0xAC, "abs,x": 0xBC
@@ -215,16 +216,168 @@ ILLEGAL = """
 0011000100010001
 0011100100111001
 """.replace("\n", "")
+ILLEGAL_BYTES = bytes(int(c) for c in ILLEGAL)
+
+# base cycles per opcode, 0 for the JAMs
+CYCLES = """
+7608335532224466
+2508446624274477
+6608335542224466
+2508446624274477
+6608335532223466
+2508446624274477
+6608335542225466
+2508446624274477
+2626333322224444
+2606444425255555
+2626333322224444
+2505444424244444
+2628335522224466
+2508446624274477
+2628335522224466
+2508446624274477
+""".replace("\n", "")
+CYCLES_BYTES = bytes(int(c) for c in CYCLES)
+
+# one more cycle when indexing crosses a page
+PAGE_PENALTY = """
+0000000000000000
+0100000001001100
+0000000000000000
+0100000001001100
+0000000000000000
+0100000001001100
+0000000000000000
+0100000001001100
+0000000000000000
+0000000000000000
+0000000000000000
+0101000001011111
+0000000000000000
+0100000001001100
+0000000000000000
+0100000001001100
+""".replace("\n", "")
+PAGE_PENALTY_BYTES = bytes(int(c) for c in PAGE_PENALTY)
+
+# a taken branch costs one more, two more into another page
+BRANCH_TAKEN = 1
+BRANCH_PAGE = 1
+
+
+MNEMONICS = {}
+DECODE = [None] * 256
+ENCODE = {}
+
+
+def build_index():
+    global DECODE
+    for op in OPCODES:
+        for name in (op.mnemonic, ) + tuple(op.aliases):
+            MNEMONICS.setdefault(name, op)
+        for mode, m in op.modes.items():
+            codes = m if type(m) is list else [m]
+            ENCODE[op.mnemonic, mode] = codes[0], INSTRUCTION_LENGTH[mode]
+            for x in codes:
+                # the only non-mnemonic alias, see compare_output()
+                if op.mnemonic == "LAX" and mode == "#":
+                    continue
+                DECODE[x] = op, mode
+    DECODE = tuple(DECODE)
+
+
+build_index()
 
 
 def is_illegal(x):
-    global ILLEGAL
-    return int(ILLEGAL[x])
+    return ILLEGAL_BYTES[x]
+
+
+def cycles(x):
+    return CYCLES_BYTES[x], PAGE_PENALTY_BYTES[x]
 
 
 def first_mode(opcode, mode):
-    mode = opcode.modes[mode]
-    return mode[0] if type(mode) is list else mode
+    return ENCODE[opcode.mnemonic, mode][0]
+
+
+def tables():
+    # everything the assembler, linker and disassemblers look up, in the
+    # form optables.py stores it
+    return (
+        ("INSTRUCTION_LENGTH", INSTRUCTION_LENGTH),
+        ("NAMES", {name: op.mnemonic for name, op in MNEMONICS.items()}),
+        # dicts rather than tuples, "r" in modes is a hash lookup
+        ("MODES", {op.mnemonic: {
+            mode: ENCODE[op.mnemonic, mode][0] for mode in op.modes
+        } for op in OPCODES}),
+        ("ENCODE", ENCODE),
+        ("DECODE", tuple((op.mnemonic, mode) for op, mode in DECODE)),
+        ("LENGTH", bytes(INSTRUCTION_LENGTH[mode] for _, mode in DECODE)),
+        ("ILLEGAL", ILLEGAL_BYTES),
+        ("CYCLES", CYCLES_BYTES),
+        ("PAGE_PENALTY", PAGE_PENALTY_BYTES),
+        ("BRANCH_TAKEN", BRANCH_TAKEN),
+        ("BRANCH_PAGE", BRANCH_PAGE),
+    )
+
+
+def literal(value, nested=False):
+    # repr() with the double quotes used everywhere else, one entry per
+    # line so that the generated file diffs well
+    if type(value) is str:
+        return "\"{}\"".format(value)
+    elif type(value) is dict and nested:
+        # opcodes, wrapped like the OPCODES table
+        lines = [""]
+        for k, v in value.items():
+            entry = "{}: 0x{:02X}, ".format(literal(k), v)
+            if len(lines[-1]) + len(entry) > 70:
+                lines.append("")
+            lines[-1] += entry
+        if len(lines) == 1:
+            return "{{{}}}".format(lines[0][:-2])
+        return "{{\n{}    }}".format("".join(
+            "        {}\n".format(line.rstrip()) for line in lines
+        ))
+    elif type(value) is dict:
+        return "{{\n{}}}".format("".join(
+            "    {}: {},\n".format(literal(k), literal(v, True))
+            for k, v in value.items()
+        ))
+    elif type(value) is tuple and len(value) > 8:
+        return "(\n{})".format("".join(
+            "    {},\n".format(literal(v)) for v in value
+        ))
+    elif type(value) is tuple:
+        return "({}{})".format(
+            ", ".join(literal(v) for v in value),
+            ", " if len(value) == 1 else ""
+        )
+    elif type(value) is bytes:
+        # adjacent literals are joined at compile time, still one constant
+        return "(\n{})".format("".join(
+            "    b\"{}\"\n".format("".join(
+                "\\x{:02x}".format(b) for b in value[i:i + 16]
+            )) for i in range(0, len(value), 16)
+        ))
+    return repr(value)
+
+
+def generate(fh):
+    fh.write(
+        "#\n"
+        "# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>\n"
+        "#\n"
+        "# This software may be modified and distributed under the terms\n"
+        "# of the ISC license.  See the LICENSE file for details.\n"
+        "\n"
+        "# Generated by \"opcodes.py --generate\" from the tables in\n"
+        "# opcodes.py, do not edit. Only literals, so importing this is\n"
+        "# just loading constants from the bytecode cache.\n"
+    )
+    for name, value in tables():
+        fh.write("\n{} = {}\n".format(name, literal(value)))
 
 
 def compare_output():
@@ -271,6 +424,7 @@ def main():
             if found:
                 break
         assert(found)
+        assert(DECODE[x] is not None)
     check = sorted([
         "BRK s",     "ORA (z,x)", "JAM i",     "SLO (z,x)", "NOP z",
         "ORA z",     "ASL z",     "SLO z",     "BPL r",     "ORA (z),y",
@@ -287,7 +441,7 @@ def main():
         "NOP z,x",   "ADC z,x",   "ROR z,x",   "RRA z,x",   "NOP #",
         "STA (z,x)", "NOP #",     "SAX (z,x)", "STY z",     "STA z",
         "STX z",     "SAX z",     "BCC r",     "STA (z),y", "JAM i",
-        "SHA a,x",   "STY z,x",   "STA z,x",   "STX z,y",   "SAX z,y",
+        "SHA (z),y", "STY z,x",   "STA z,x",   "STX z,y",   "SAX z,y",
         "LDY #",     "LDA (z,x)", "LDX #",     "LAX (z,x)", "LDY z",
         "LDA z",     "LDX z",     "LAX z",     "BCS r",     "LDA (z),y",
         "JAM i",     "LAX (z),y", "LDY z,x",   "LDA z,x",   "LDX z,y",
@@ -312,7 +466,7 @@ def main():
         "ADC a,y",   "NOP i",     "RRA a,y",   "NOP a,x",   "ADC a,x",
         "ROR a,x",   "RRA a,x",   "DEY i",     "NOP #",     "TXA i",
         "ANE #",     "STY a",     "STA a",     "STX a",     "SAX a",
-        "TYA i",     "STA a,y",   "TXS i",     "SHS a,x",   "SHY a,y",
+        "TYA i",     "STA a,y",   "TXS i",     "SHS a,y",   "SHY a,x",
         "STA a,x",   "SHX a,y",   "SHA a,y",   "TAY i",     "LDA #",
         "TAX i",     "LXA #",     "LDY a",     "LDA a",     "LDX a",
         "LAX a",     "CLV i",     "LDA a,y",   "TSX i",     "LAE a,y",
@@ -328,8 +482,15 @@ def main():
     opc_list = sorted(compare_output())
     for x in range(256):
         assert(opc_list[x] == check[x])
-
+    import optables
+    for name, value in tables():
+        assert(getattr(optables, name) == value), \
+            "optables.py is out of date, run opcodes.py --generate"
 
 
 if __name__ == "__main__":
-    main()
+    if argv[1:] == ["--generate"]:
+        with open(join(dirname(abspath(__file__)), "optables.py"), "w") as fh:
+            generate(fh)
+    else:
+        main()
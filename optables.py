@@ -0,0 +1,808 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+# Generated by "opcodes.py --generate" from the tables in
+# opcodes.py, do not edit. Only literals, so importing this is
+# just loading constants from the bytecode cache.
+
+INSTRUCTION_LENGTH = {
+    "_": 1,
+    "a": 1,
+    "#": 2,
+    "zp": 2,
+    "zp,x": 2,
+    "zp,y": 2,
+    "abs": 3,
+    "abs,x": 3,
+    "abs,y": 3,
+    "iz,x": 2,
+    "iz,y": 2,
+    "ind": 3,
+    "r": 2,
+}
+
+NAMES = {
+    "BRK": "BRK",
+    "ORA": "ORA",
+    "JAM": "JAM",
+    "CRS": "JAM",
+    "KIL": "JAM",
+    "HLT": "JAM",
+    "SLO": "SLO",
+    "ASO": "SLO",
+    "NOP": "NOP",
+    "ASL": "ASL",
+    "PHP": "PHP",
+    "ANC": "ANC",
+    "BPL": "BPL",
+    "CLC": "CLC",
+    "JSR": "JSR",
+    "AND": "AND",
+    "RLA": "RLA",
+    "BIT": "BIT",
+    "PLP": "PLP",
+    "ROL": "ROL",
+    "BMI": "BMI",
+    "SEC": "SEC",
+    "RTI": "RTI",
+    "EOR": "EOR",
+    "SRE": "SRE",
+    "LSE": "SRE",
+    "LSR": "LSR",
+    "PHA": "PHA",
+    "ASR": "ASR",
+    "ALR": "ASR",
+    "JMP": "JMP",
+    "BVC": "BVC",
+    "CLI": "CLI",
+    "PLA": "PLA",
+    "ADC": "ADC",
+    "RTS": "RTS",
+    "RRA": "RRA",
+    "ROR": "ROR",
+    "ARR": "ARR",
+    "BVS": "BVS",
+    "SEI": "SEI",
+    "STA": "STA",
+    "SAX": "SAX",
+    "STY": "STY",
+    "STX": "STX",
+    "DEY": "DEY",
+    "TXA": "TXA",
+    "ANE": "ANE",
+    "XAA": "ANE",
+    "BCC": "BCC",
+    "SHA": "SHA",
+    "AHX": "SHA",
+    "TYA": "TYA",
+    "TXS": "TXS",
+    "SHS": "SHS",
+    "TAS": "SHS",
+    "SHY": "SHY",
+    "SHX": "SHX",
+    "LDY": "LDY",
+    "LDA": "LDA",
+    "LDX": "LDX",
+    "LAX": "LAX",
+    "TAY": "TAY",
+    "TAX": "TAX",
+    "LXA": "LXA",
+    "BCS": "BCS",
+    "CLV": "CLV",
+    "TSX": "TSX",
+    "LAE": "LAE",
+    "LAS": "LAE",
+    "LAR": "LAE",
+    "CPY": "CPY",
+    "CMP": "CMP",
+    "DCP": "DCP",
+    "DEC": "DEC",
+    "INY": "INY",
+    "DEX": "DEX",
+    "SBX": "SBX",
+    "AXS": "SBX",
+    "BNE": "BNE",
+    "CLD": "CLD",
+    "CPX": "CPX",
+    "SBC": "SBC",
+    "ISB": "ISB",
+    "ISC": "ISB",
+    "INC": "INC",
+    "INX": "INX",
+    "BEQ": "BEQ",
+    "SED": "SED",
+}
+
+MODES = {
+    "BRK": {"_": 0x00},
+    "ORA": {
+        "#": 0x09, "zp": 0x05, "zp,x": 0x15, "abs": 0x0D, "abs,x": 0x1D,
+        "abs,y": 0x19, "iz,x": 0x01, "iz,y": 0x11,
+    },
+    "JAM": {"_": 0x02},
+    "SLO": {
+        "zp": 0x07, "zp,x": 0x17, "abs": 0x0F, "abs,x": 0x1F, "abs,y": 0x1B,
+        "iz,x": 0x03, "iz,y": 0x13,
+    },
+    "NOP": {
+        "_": 0xEA, "#": 0x80, "zp": 0x04, "zp,x": 0x14, "abs": 0x0C,
+        "abs,x": 0x1C,
+    },
+    "ASL": {"a": 0x0A, "zp": 0x06, "zp,x": 0x16, "abs": 0x0E, "abs,x": 0x1E},
+    "PHP": {"_": 0x08},
+    "ANC": {"#": 0x0B},
+    "BPL": {"r": 0x10},
+    "CLC": {"_": 0x18},
+    "JSR": {"abs": 0x20},
+    "AND": {
+        "#": 0x29, "zp": 0x25, "zp,x": 0x35, "abs": 0x2D, "abs,x": 0x3D,
+        "abs,y": 0x39, "iz,x": 0x21, "iz,y": 0x31,
+    },
+    "RLA": {
+        "zp": 0x27, "zp,x": 0x37, "abs": 0x2F, "abs,x": 0x3F, "abs,y": 0x3B,
+        "iz,x": 0x23, "iz,y": 0x33,
+    },
+    "BIT": {"zp": 0x24, "abs": 0x2C},
+    "PLP": {"_": 0x28},
+    "ROL": {"a": 0x2A, "zp": 0x26, "zp,x": 0x36, "abs": 0x2E, "abs,x": 0x3E},
+    "BMI": {"r": 0x30},
+    "SEC": {"_": 0x38},
+    "RTI": {"_": 0x40},
+    "EOR": {
+        "#": 0x49, "zp": 0x45, "zp,x": 0x55, "abs": 0x4D, "abs,x": 0x5D,
+        "abs,y": 0x59, "iz,x": 0x41, "iz,y": 0x51,
+    },
+    "SRE": {
+        "zp": 0x47, "zp,x": 0x57, "abs": 0x4F, "abs,x": 0x5F, "abs,y": 0x5B,
+        "iz,x": 0x43, "iz,y": 0x53,
+    },
+    "LSR": {"a": 0x4A, "zp": 0x46, "zp,x": 0x56, "abs": 0x4E, "abs,x": 0x5E},
+    "PHA": {"_": 0x48},
+    "ASR": {"#": 0x4B},
+    "JMP": {"abs": 0x4C, "ind": 0x6C},
+    "BVC": {"r": 0x50},
+    "CLI": {"_": 0x58},
+    "PLA": {"_": 0x68},
+    "ADC": {
+        "#": 0x69, "zp": 0x65, "zp,x": 0x75, "abs": 0x6D, "abs,x": 0x7D,
+        "abs,y": 0x79, "iz,x": 0x61, "iz,y": 0x71,
+    },
+    "RTS": {"_": 0x60},
+    "RRA": {
+        "zp": 0x67, "zp,x": 0x77, "abs": 0x6F, "abs,x": 0x7F, "abs,y": 0x7B,
+        "iz,x": 0x63, "iz,y": 0x73,
+    },
+    "ROR": {"a": 0x6A, "zp": 0x66, "zp,x": 0x76, "abs": 0x6E, "abs,x": 0x7E},
+    "ARR": {"#": 0x6B},
+    "BVS": {"r": 0x70},
+    "SEI": {"_": 0x78},
+    "STA": {
+        "zp": 0x85, "zp,x": 0x95, "abs": 0x8D, "abs,x": 0x9D, "abs,y": 0x99,
+        "iz,x": 0x81, "iz,y": 0x91,
+    },
+    "SAX": {"zp": 0x87, "zp,y": 0x97, "abs": 0x8F, "iz,x": 0x83},
+    "STY": {"zp": 0x84, "zp,x": 0x94, "abs": 0x8C},
+    "STX": {"zp": 0x86, "zp,y": 0x96, "abs": 0x8E},
+    "DEY": {"_": 0x88},
+    "TXA": {"_": 0x8A},
+    "ANE": {"#": 0x8B},
+    "BCC": {"r": 0x90},
+    "SHA": {"iz,y": 0x93, "abs,y": 0x9F},
+    "TYA": {"_": 0x98},
+    "TXS": {"_": 0x9A},
+    "SHS": {"abs,y": 0x9B},
+    "SHY": {"abs,x": 0x9C},
+    "SHX": {"abs,y": 0x9E},
+    "LDY": {"#": 0xA0, "zp": 0xA4, "zp,x": 0xB4, "abs": 0xAC, "abs,x": 0xBC},
+    "LDA": {
+        "#": 0xA9, "zp": 0xA5, "zp,x": 0xB5, "abs": 0xAD, "abs,x": 0xBD,
+        "abs,y": 0xB9, "iz,x": 0xA1, "iz,y": 0xB1,
+    },
+    "LDX": {"#": 0xA2, "zp": 0xA6, "zp,y": 0xB6, "abs": 0xAE, "abs,y": 0xBE},
+    "LAX": {
+        "#": 0xAB, "zp": 0xA7, "zp,y": 0xB7, "abs": 0xAF, "abs,y": 0xBF,
+        "iz,x": 0xA3, "iz,y": 0xB3,
+    },
+    "TAY": {"_": 0xA8},
+    "TAX": {"_": 0xAA},
+    "LXA": {"#": 0xAB},
+    "BCS": {"r": 0xB0},
+    "CLV": {"_": 0xB8},
+    "TSX": {"_": 0xBA},
+    "LAE": {"abs,y": 0xBB},
+    "CPY": {"#": 0xC0, "zp": 0xC4, "abs": 0xCC},
+    "CMP": {
+        "#": 0xC9, "zp": 0xC5, "zp,x": 0xD5, "abs": 0xCD, "abs,x": 0xDD,
+        "abs,y": 0xD9, "iz,x": 0xC1, "iz,y": 0xD1,
+    },
+    "DCP": {
+        "zp": 0xC7, "zp,x": 0xD7, "abs": 0xCF, "abs,x": 0xDF, "abs,y": 0xDB,
+        "iz,x": 0xC3, "iz,y": 0xD3,
+    },
+    "DEC": {"zp": 0xC6, "zp,x": 0xD6, "abs": 0xCE, "abs,x": 0xDE},
+    "INY": {"_": 0xC8},
+    "DEX": {"_": 0xCA},
+    "SBX": {"#": 0xCB},
+    "BNE": {"r": 0xD0},
+    "CLD": {"_": 0xD8},
+    "CPX": {"#": 0xE0, "zp": 0xE4, "abs": 0xEC},
+    "SBC": {
+        "#": 0xE9, "zp": 0xE5, "zp,x": 0xF5, "abs": 0xED, "abs,x": 0xFD,
+        "abs,y": 0xF9, "iz,x": 0xE1, "iz,y": 0xF1,
+    },
+    "ISB": {
+        "zp": 0xE7, "zp,x": 0xF7, "abs": 0xEF, "abs,x": 0xFF, "abs,y": 0xFB,
+        "iz,x": 0xE3, "iz,y": 0xF3,
+    },
+    "INC": {"zp": 0xE6, "zp,x": 0xF6, "abs": 0xEE, "abs,x": 0xFE},
+    "INX": {"_": 0xE8},
+    "BEQ": {"r": 0xF0},
+    "SED": {"_": 0xF8},
+}
+
+ENCODE = {
+    ("BRK", "_"): (0, 1),
+    ("ORA", "#"): (9, 2),
+    ("ORA", "zp"): (5, 2),
+    ("ORA", "zp,x"): (21, 2),
+    ("ORA", "abs"): (13, 3),
+    ("ORA", "abs,x"): (29, 3),
+    ("ORA", "abs,y"): (25, 3),
+    ("ORA", "iz,x"): (1, 2),
+    ("ORA", "iz,y"): (17, 2),
+    ("JAM", "_"): (2, 1),
+    ("SLO", "zp"): (7, 2),
+    ("SLO", "zp,x"): (23, 2),
+    ("SLO", "abs"): (15, 3),
+    ("SLO", "abs,x"): (31, 3),
+    ("SLO", "abs,y"): (27, 3),
+    ("SLO", "iz,x"): (3, 2),
+    ("SLO", "iz,y"): (19, 2),
+    ("NOP", "_"): (234, 1),
+    ("NOP", "#"): (128, 2),
+    ("NOP", "zp"): (4, 2),
+    ("NOP", "zp,x"): (20, 2),
+    ("NOP", "abs"): (12, 3),
+    ("NOP", "abs,x"): (28, 3),
+    ("ASL", "a"): (10, 1),
+    ("ASL", "zp"): (6, 2),
+    ("ASL", "zp,x"): (22, 2),
+    ("ASL", "abs"): (14, 3),
+    ("ASL", "abs,x"): (30, 3),
+    ("PHP", "_"): (8, 1),
+    ("ANC", "#"): (11, 2),
+    ("BPL", "r"): (16, 2),
+    ("CLC", "_"): (24, 1),
+    ("JSR", "abs"): (32, 3),
+    ("AND", "#"): (41, 2),
+    ("AND", "zp"): (37, 2),
+    ("AND", "zp,x"): (53, 2),
+    ("AND", "abs"): (45, 3),
+    ("AND", "abs,x"): (61, 3),
+    ("AND", "abs,y"): (57, 3),
+    ("AND", "iz,x"): (33, 2),
+    ("AND", "iz,y"): (49, 2),
+    ("RLA", "zp"): (39, 2),
+    ("RLA", "zp,x"): (55, 2),
+    ("RLA", "abs"): (47, 3),
+    ("RLA", "abs,x"): (63, 3),
+    ("RLA", "abs,y"): (59, 3),
+    ("RLA", "iz,x"): (35, 2),
+    ("RLA", "iz,y"): (51, 2),
+    ("BIT", "zp"): (36, 2),
+    ("BIT", "abs"): (44, 3),
+    ("PLP", "_"): (40, 1),
+    ("ROL", "a"): (42, 1),
+    ("ROL", "zp"): (38, 2),
+    ("ROL", "zp,x"): (54, 2),
+    ("ROL", "abs"): (46, 3),
+    ("ROL", "abs,x"): (62, 3),
+    ("BMI", "r"): (48, 2),
+    ("SEC", "_"): (56, 1),
+    ("RTI", "_"): (64, 1),
+    ("EOR", "#"): (73, 2),
+    ("EOR", "zp"): (69, 2),
+    ("EOR", "zp,x"): (85, 2),
+    ("EOR", "abs"): (77, 3),
+    ("EOR", "abs,x"): (93, 3),
+    ("EOR", "abs,y"): (89, 3),
+    ("EOR", "iz,x"): (65, 2),
+    ("EOR", "iz,y"): (81, 2),
+    ("SRE", "zp"): (71, 2),
+    ("SRE", "zp,x"): (87, 2),
+    ("SRE", "abs"): (79, 3),
+    ("SRE", "abs,x"): (95, 3),
+    ("SRE", "abs,y"): (91, 3),
+    ("SRE", "iz,x"): (67, 2),
+    ("SRE", "iz,y"): (83, 2),
+    ("LSR", "a"): (74, 1),
+    ("LSR", "zp"): (70, 2),
+    ("LSR", "zp,x"): (86, 2),
+    ("LSR", "abs"): (78, 3),
+    ("LSR", "abs,x"): (94, 3),
+    ("PHA", "_"): (72, 1),
+    ("ASR", "#"): (75, 2),
+    ("JMP", "abs"): (76, 3),
+    ("JMP", "ind"): (108, 3),
+    ("BVC", "r"): (80, 2),
+    ("CLI", "_"): (88, 1),
+    ("PLA", "_"): (104, 1),
+    ("ADC", "#"): (105, 2),
+    ("ADC", "zp"): (101, 2),
+    ("ADC", "zp,x"): (117, 2),
+    ("ADC", "abs"): (109, 3),
+    ("ADC", "abs,x"): (125, 3),
+    ("ADC", "abs,y"): (121, 3),
+    ("ADC", "iz,x"): (97, 2),
+    ("ADC", "iz,y"): (113, 2),
+    ("RTS", "_"): (96, 1),
+    ("RRA", "zp"): (103, 2),
+    ("RRA", "zp,x"): (119, 2),
+    ("RRA", "abs"): (111, 3),
+    ("RRA", "abs,x"): (127, 3),
+    ("RRA", "abs,y"): (123, 3),
+    ("RRA", "iz,x"): (99, 2),
+    ("RRA", "iz,y"): (115, 2),
+    ("ROR", "a"): (106, 1),
+    ("ROR", "zp"): (102, 2),
+    ("ROR", "zp,x"): (118, 2),
+    ("ROR", "abs"): (110, 3),
+    ("ROR", "abs,x"): (126, 3),
+    ("ARR", "#"): (107, 2),
+    ("BVS", "r"): (112, 2),
+    ("SEI", "_"): (120, 1),
+    ("STA", "zp"): (133, 2),
+    ("STA", "zp,x"): (149, 2),
+    ("STA", "abs"): (141, 3),
+    ("STA", "abs,x"): (157, 3),
+    ("STA", "abs,y"): (153, 3),
+    ("STA", "iz,x"): (129, 2),
+    ("STA", "iz,y"): (145, 2),
+    ("SAX", "zp"): (135, 2),
+    ("SAX", "zp,y"): (151, 2),
+    ("SAX", "abs"): (143, 3),
+    ("SAX", "iz,x"): (131, 2),
+    ("STY", "zp"): (132, 2),
+    ("STY", "zp,x"): (148, 2),
+    ("STY", "abs"): (140, 3),
+    ("STX", "zp"): (134, 2),
+    ("STX", "zp,y"): (150, 2),
+    ("STX", "abs"): (142, 3),
+    ("DEY", "_"): (136, 1),
+    ("TXA", "_"): (138, 1),
+    ("ANE", "#"): (139, 2),
+    ("BCC", "r"): (144, 2),
+    ("SHA", "iz,y"): (147, 2),
+    ("SHA", "abs,y"): (159, 3),
+    ("TYA", "_"): (152, 1),
+    ("TXS", "_"): (154, 1),
+    ("SHS", "abs,y"): (155, 3),
+    ("SHY", "abs,x"): (156, 3),
+    ("SHX", "abs,y"): (158, 3),
+    ("LDY", "#"): (160, 2),
+    ("LDY", "zp"): (164, 2),
+    ("LDY", "zp,x"): (180, 2),
+    ("LDY", "abs"): (172, 3),
+    ("LDY", "abs,x"): (188, 3),
+    ("LDA", "#"): (169, 2),
+    ("LDA", "zp"): (165, 2),
+    ("LDA", "zp,x"): (181, 2),
+    ("LDA", "abs"): (173, 3),
+    ("LDA", "abs,x"): (189, 3),
+    ("LDA", "abs,y"): (185, 3),
+    ("LDA", "iz,x"): (161, 2),
+    ("LDA", "iz,y"): (177, 2),
+    ("LDX", "#"): (162, 2),
+    ("LDX", "zp"): (166, 2),
+    ("LDX", "zp,y"): (182, 2),
+    ("LDX", "abs"): (174, 3),
+    ("LDX", "abs,y"): (190, 3),
+    ("LAX", "#"): (171, 2),
+    ("LAX", "zp"): (167, 2),
+    ("LAX", "zp,y"): (183, 2),
+    ("LAX", "abs"): (175, 3),
+    ("LAX", "abs,y"): (191, 3),
+    ("LAX", "iz,x"): (163, 2),
+    ("LAX", "iz,y"): (179, 2),
+    ("TAY", "_"): (168, 1),
+    ("TAX", "_"): (170, 1),
+    ("LXA", "#"): (171, 2),
+    ("BCS", "r"): (176, 2),
+    ("CLV", "_"): (184, 1),
+    ("TSX", "_"): (186, 1),
+    ("LAE", "abs,y"): (187, 3),
+    ("CPY", "#"): (192, 2),
+    ("CPY", "zp"): (196, 2),
+    ("CPY", "abs"): (204, 3),
+    ("CMP", "#"): (201, 2),
+    ("CMP", "zp"): (197, 2),
+    ("CMP", "zp,x"): (213, 2),
+    ("CMP", "abs"): (205, 3),
+    ("CMP", "abs,x"): (221, 3),
+    ("CMP", "abs,y"): (217, 3),
+    ("CMP", "iz,x"): (193, 2),
+    ("CMP", "iz,y"): (209, 2),
+    ("DCP", "zp"): (199, 2),
+    ("DCP", "zp,x"): (215, 2),
+    ("DCP", "abs"): (207, 3),
+    ("DCP", "abs,x"): (223, 3),
+    ("DCP", "abs,y"): (219, 3),
+    ("DCP", "iz,x"): (195, 2),
+    ("DCP", "iz,y"): (211, 2),
+    ("DEC", "zp"): (198, 2),
+    ("DEC", "zp,x"): (214, 2),
+    ("DEC", "abs"): (206, 3),
+    ("DEC", "abs,x"): (222, 3),
+    ("INY", "_"): (200, 1),
+    ("DEX", "_"): (202, 1),
+    ("SBX", "#"): (203, 2),
+    ("BNE", "r"): (208, 2),
+    ("CLD", "_"): (216, 1),
+    ("CPX", "#"): (224, 2),
+    ("CPX", "zp"): (228, 2),
+    ("CPX", "abs"): (236, 3),
+    ("SBC", "#"): (233, 2),
+    ("SBC", "zp"): (229, 2),
+    ("SBC", "zp,x"): (245, 2),
+    ("SBC", "abs"): (237, 3),
+    ("SBC", "abs,x"): (253, 3),
+    ("SBC", "abs,y"): (249, 3),
+    ("SBC", "iz,x"): (225, 2),
+    ("SBC", "iz,y"): (241, 2),
+    ("ISB", "zp"): (231, 2),
+    ("ISB", "zp,x"): (247, 2),
+    ("ISB", "abs"): (239, 3),
+    ("ISB", "abs,x"): (255, 3),
+    ("ISB", "abs,y"): (251, 3),
+    ("ISB", "iz,x"): (227, 2),
+    ("ISB", "iz,y"): (243, 2),
+    ("INC", "zp"): (230, 2),
+    ("INC", "zp,x"): (246, 2),
+    ("INC", "abs"): (238, 3),
+    ("INC", "abs,x"): (254, 3),
+    ("INX", "_"): (232, 1),
+    ("BEQ", "r"): (240, 2),
+    ("SED", "_"): (248, 1),
+}
+
+DECODE = (
+    ("BRK", "_"),
+    ("ORA", "iz,x"),
+    ("JAM", "_"),
+    ("SLO", "iz,x"),
+    ("NOP", "zp"),
+    ("ORA", "zp"),
+    ("ASL", "zp"),
+    ("SLO", "zp"),
+    ("PHP", "_"),
+    ("ORA", "#"),
+    ("ASL", "a"),
+    ("ANC", "#"),
+    ("NOP", "abs"),
+    ("ORA", "abs"),
+    ("ASL", "abs"),
+    ("SLO", "abs"),
+    ("BPL", "r"),
+    ("ORA", "iz,y"),
+    ("JAM", "_"),
+    ("SLO", "iz,y"),
+    ("NOP", "zp,x"),
+    ("ORA", "zp,x"),
+    ("ASL", "zp,x"),
+    ("SLO", "zp,x"),
+    ("CLC", "_"),
+    ("ORA", "abs,y"),
+    ("NOP", "_"),
+    ("SLO", "abs,y"),
+    ("NOP", "abs,x"),
+    ("ORA", "abs,x"),
+    ("ASL", "abs,x"),
+    ("SLO", "abs,x"),
+    ("JSR", "abs"),
+    ("AND", "iz,x"),
+    ("JAM", "_"),
+    ("RLA", "iz,x"),
+    ("BIT", "zp"),
+    ("AND", "zp"),
+    ("ROL", "zp"),
+    ("RLA", "zp"),
+    ("PLP", "_"),
+    ("AND", "#"),
+    ("ROL", "a"),
+    ("ANC", "#"),
+    ("BIT", "abs"),
+    ("AND", "abs"),
+    ("ROL", "abs"),
+    ("RLA", "abs"),
+    ("BMI", "r"),
+    ("AND", "iz,y"),
+    ("JAM", "_"),
+    ("RLA", "iz,y"),
+    ("NOP", "zp,x"),
+    ("AND", "zp,x"),
+    ("ROL", "zp,x"),
+    ("RLA", "zp,x"),
+    ("SEC", "_"),
+    ("AND", "abs,y"),
+    ("NOP", "_"),
+    ("RLA", "abs,y"),
+    ("NOP", "abs,x"),
+    ("AND", "abs,x"),
+    ("ROL", "abs,x"),
+    ("RLA", "abs,x"),
+    ("RTI", "_"),
+    ("EOR", "iz,x"),
+    ("JAM", "_"),
+    ("SRE", "iz,x"),
+    ("NOP", "zp"),
+    ("EOR", "zp"),
+    ("LSR", "zp"),
+    ("SRE", "zp"),
+    ("PHA", "_"),
+    ("EOR", "#"),
+    ("LSR", "a"),
+    ("ASR", "#"),
+    ("JMP", "abs"),
+    ("EOR", "abs"),
+    ("LSR", "abs"),
+    ("SRE", "abs"),
+    ("BVC", "r"),
+    ("EOR", "iz,y"),
+    ("JAM", "_"),
+    ("SRE", "iz,y"),
+    ("NOP", "zp,x"),
+    ("EOR", "zp,x"),
+    ("LSR", "zp,x"),
+    ("SRE", "zp,x"),
+    ("CLI", "_"),
+    ("EOR", "abs,y"),
+    ("NOP", "_"),
+    ("SRE", "abs,y"),
+    ("NOP", "abs,x"),
+    ("EOR", "abs,x"),
+    ("LSR", "abs,x"),
+    ("SRE", "abs,x"),
+    ("RTS", "_"),
+    ("ADC", "iz,x"),
+    ("JAM", "_"),
+    ("RRA", "iz,x"),
+    ("NOP", "zp"),
+    ("ADC", "zp"),
+    ("ROR", "zp"),
+    ("RRA", "zp"),
+    ("PLA", "_"),
+    ("ADC", "#"),
+    ("ROR", "a"),
+    ("ARR", "#"),
+    ("JMP", "ind"),
+    ("ADC", "abs"),
+    ("ROR", "abs"),
+    ("RRA", "abs"),
+    ("BVS", "r"),
+    ("ADC", "iz,y"),
+    ("JAM", "_"),
+    ("RRA", "iz,y"),
+    ("NOP", "zp,x"),
+    ("ADC", "zp,x"),
+    ("ROR", "zp,x"),
+    ("RRA", "zp,x"),
+    ("SEI", "_"),
+    ("ADC", "abs,y"),
+    ("NOP", "_"),
+    ("RRA", "abs,y"),
+    ("NOP", "abs,x"),
+    ("ADC", "abs,x"),
+    ("ROR", "abs,x"),
+    ("RRA", "abs,x"),
+    ("NOP", "#"),
+    ("STA", "iz,x"),
+    ("NOP", "#"),
+    ("SAX", "iz,x"),
+    ("STY", "zp"),
+    ("STA", "zp"),
+    ("STX", "zp"),
+    ("SAX", "zp"),
+    ("DEY", "_"),
+    ("NOP", "#"),
+    ("TXA", "_"),
+    ("ANE", "#"),
+    ("STY", "abs"),
+    ("STA", "abs"),
+    ("STX", "abs"),
+    ("SAX", "abs"),
+    ("BCC", "r"),
+    ("STA", "iz,y"),
+    ("JAM", "_"),
+    ("SHA", "iz,y"),
+    ("STY", "zp,x"),
+    ("STA", "zp,x"),
+    ("STX", "zp,y"),
+    ("SAX", "zp,y"),
+    ("TYA", "_"),
+    ("STA", "abs,y"),
+    ("TXS", "_"),
+    ("SHS", "abs,y"),
+    ("SHY", "abs,x"),
+    ("STA", "abs,x"),
+    ("SHX", "abs,y"),
+    ("SHA", "abs,y"),
+    ("LDY", "#"),
+    ("LDA", "iz,x"),
+    ("LDX", "#"),
+    ("LAX", "iz,x"),
+    ("LDY", "zp"),
+    ("LDA", "zp"),
+    ("LDX", "zp"),
+    ("LAX", "zp"),
+    ("TAY", "_"),
+    ("LDA", "#"),
+    ("TAX", "_"),
+    ("LXA", "#"),
+    ("LDY", "abs"),
+    ("LDA", "abs"),
+    ("LDX", "abs"),
+    ("LAX", "abs"),
+    ("BCS", "r"),
+    ("LDA", "iz,y"),
+    ("JAM", "_"),
+    ("LAX", "iz,y"),
+    ("LDY", "zp,x"),
+    ("LDA", "zp,x"),
+    ("LDX", "zp,y"),
+    ("LAX", "zp,y"),
+    ("CLV", "_"),
+    ("LDA", "abs,y"),
+    ("TSX", "_"),
+    ("LAE", "abs,y"),
+    ("LDY", "abs,x"),
+    ("LDA", "abs,x"),
+    ("LDX", "abs,y"),
+    ("LAX", "abs,y"),
+    ("CPY", "#"),
+    ("CMP", "iz,x"),
+    ("NOP", "#"),
+    ("DCP", "iz,x"),
+    ("CPY", "zp"),
+    ("CMP", "zp"),
+    ("DEC", "zp"),
+    ("DCP", "zp"),
+    ("INY", "_"),
+    ("CMP", "#"),
+    ("DEX", "_"),
+    ("SBX", "#"),
+    ("CPY", "abs"),
+    ("CMP", "abs"),
+    ("DEC", "abs"),
+    ("DCP", "abs"),
+    ("BNE", "r"),
+    ("CMP", "iz,y"),
+    ("JAM", "_"),
+    ("DCP", "iz,y"),
+    ("NOP", "zp,x"),
+    ("CMP", "zp,x"),
+    ("DEC", "zp,x"),
+    ("DCP", "zp,x"),
+    ("CLD", "_"),
+    ("CMP", "abs,y"),
+    ("NOP", "_"),
+    ("DCP", "abs,y"),
+    ("NOP", "abs,x"),
+    ("CMP", "abs,x"),
+    ("DEC", "abs,x"),
+    ("DCP", "abs,x"),
+    ("CPX", "#"),
+    ("SBC", "iz,x"),
+    ("NOP", "#"),
+    ("ISB", "iz,x"),
+    ("CPX", "zp"),
+    ("SBC", "zp"),
+    ("INC", "zp"),
+    ("ISB", "zp"),
+    ("INX", "_"),
+    ("SBC", "#"),
+    ("NOP", "_"),
+    ("SBC", "#"),
+    ("CPX", "abs"),
+    ("SBC", "abs"),
+    ("INC", "abs"),
+    ("ISB", "abs"),
+    ("BEQ", "r"),
+    ("SBC", "iz,y"),
+    ("JAM", "_"),
+    ("ISB", "iz,y"),
+    ("NOP", "zp,x"),
+    ("SBC", "zp,x"),
+    ("INC", "zp,x"),
+    ("ISB", "zp,x"),
+    ("SED", "_"),
+    ("SBC", "abs,y"),
+    ("NOP", "_"),
+    ("ISB", "abs,y"),
+    ("NOP", "abs,x"),
+    ("SBC", "abs,x"),
+    ("INC", "abs,x"),
+    ("ISB", "abs,x"),
+)
+
+LENGTH = (
+    b"\x01\x02\x01\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x03\x02\x01\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x01\x02\x01\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x01\x02\x01\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x02\x02\x02\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x02\x02\x02\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x02\x02\x02\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+    b"\x02\x02\x02\x02\x02\x02\x02\x02\x01\x02\x01\x02\x03\x03\x03\x03"
+    b"\x02\x02\x01\x02\x02\x02\x02\x02\x01\x03\x01\x03\x03\x03\x03\x03"
+)
+
+ILLEGAL = (
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x00\x01\x01\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x01\x01\x01\x00\x00\x01"
+    b"\x00\x00\x01\x01\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x01\x01\x01\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x01\x01\x01\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x01\x01\x01\x00\x00\x01"
+    b"\x01\x00\x01\x01\x00\x00\x00\x01\x00\x01\x00\x01\x00\x00\x00\x01"
+    b"\x00\x00\x01\x02\x00\x00\x00\x01\x00\x00\x00\x02\x02\x00\x02\x02"
+    b"\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x02\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x00\x00\x00\x01\x00\x00\x00\x02\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x01\x01\x01\x00\x00\x01"
+    b"\x00\x00\x01\x01\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01"
+    b"\x00\x00\x01\x01\x01\x00\x00\x01\x00\x00\x01\x01\x01\x00\x00\x01"
+)
+
+CYCLES = (
+    b"\x07\x06\x00\x08\x03\x03\x05\x05\x03\x02\x02\x02\x04\x04\x06\x06"
+    b"\x02\x05\x00\x08\x04\x04\x06\x06\x02\x04\x02\x07\x04\x04\x07\x07"
+    b"\x06\x06\x00\x08\x03\x03\x05\x05\x04\x02\x02\x02\x04\x04\x06\x06"
+    b"\x02\x05\x00\x08\x04\x04\x06\x06\x02\x04\x02\x07\x04\x04\x07\x07"
+    b"\x06\x06\x00\x08\x03\x03\x05\x05\x03\x02\x02\x02\x03\x04\x06\x06"
+    b"\x02\x05\x00\x08\x04\x04\x06\x06\x02\x04\x02\x07\x04\x04\x07\x07"
+    b"\x06\x06\x00\x08\x03\x03\x05\x05\x04\x02\x02\x02\x05\x04\x06\x06"
+    b"\x02\x05\x00\x08\x04\x04\x06\x06\x02\x04\x02\x07\x04\x04\x07\x07"
+    b"\x02\x06\x02\x06\x03\x03\x03\x03\x02\x02\x02\x02\x04\x04\x04\x04"
+    b"\x02\x06\x00\x06\x04\x04\x04\x04\x02\x05\x02\x05\x05\x05\x05\x05"
+    b"\x02\x06\x02\x06\x03\x03\x03\x03\x02\x02\x02\x02\x04\x04\x04\x04"
+    b"\x02\x05\x00\x05\x04\x04\x04\x04\x02\x04\x02\x04\x04\x04\x04\x04"
+    b"\x02\x06\x02\x08\x03\x03\x05\x05\x02\x02\x02\x02\x04\x04\x06\x06"
+    b"\x02\x05\x00\x08\x04\x04\x06\x06\x02\x04\x02\x07\x04\x04\x07\x07"
+    b"\x02\x06\x02\x08\x03\x03\x05\x05\x02\x02\x02\x02\x04\x04\x06\x06"
+    b"\x02\x05\x00\x08\x04\x04\x06\x06\x02\x04\x02\x07\x04\x04\x07\x07"
+)
+
+PAGE_PENALTY = (
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x01\x01\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x01\x01\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x01\x01\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x01\x01\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x01\x00\x00\x00\x00\x00\x01\x00\x01\x01\x01\x01\x01"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x01\x01\x00\x00"
+    b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    b"\x00\x01\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x01\x01\x00\x00"
+)
+
+BRANCH_TAKEN = 1
+
+BRANCH_PAGE = 1
@@ -0,0 +1,356 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from expr import evaluate, names, uses_pc
+from link import DATA, EQU, FILE, INST, LABEL, ORG, TABLE
+from optables import ENCODE
+
+# Rewrites of pass one items that keep what the code does, handed to the
+# Linker like the profiler. Before layout, within straight runs of
+# instructions between labels:
+#   JSR x / RTS               JMP x, where x is a routine of this program
+#                             that gets to its RTS without using the stack
+#   LDA #n ... LDA #n         the second one goes when nothing in between
+#                             changed A or made N and Z stop reflecting it
+#   STA a / LDA a             the LDA goes when N and Z already reflect A
+# and likewise for X and Y. After operands have shrunk, a branch or JMP
+# to a JMP goes straight to where that one leads, if it stays in range.
+#
+# Code that is addressed other than through its labels is left alone:
+# runs using * and runs after a label that some operand adds to or
+# subtracts from, as self-modifying code does. Loads from the processor
+# port and I/O, and through pointers, are never taken as repeats.
+
+LOADS = {"LDA": "A", "LDX": "X", "LDY": "Y"}
+STORES = {"A": "STA", "X": "STX", "Y": "STY"}
+
+# N and Z reflect this register afterwards; keyed by mnemonic, or by
+# (mnemonic, mode) where the mode makes the difference
+RESULT = {
+    "LDA": "A", "TXA": "A", "TYA": "A", "PLA": "A", "ADC": "A", "SBC": "A",
+    "AND": "A", "ORA": "A", "EOR": "A", "ANC": "A", "ASR": "A", "ARR": "A",
+    "ANE": "A", "LXA": "A", "LAE": "A", "LAX": "A", "SLO": "A", "RLA": "A",
+    "SRE": "A", "RRA": "A", "ISB": "A",
+    ("ASL", "a"): "A", ("LSR", "a"): "A", ("ROL", "a"): "A",
+    ("ROR", "a"): "A",
+    "LDX": "X", "TAX": "X", "TSX": "X", "INX": "X", "DEX": "X", "SBX": "X",
+    "LDY": "Y", "TAY": "Y", "INY": "Y", "DEY": "Y",
+}
+# leave N and Z as they are
+PRESERVE = {
+    "STA", "STX", "STY", "SAX", "SHA", "SHS", "SHX", "SHY", "TXS", "PHA",
+    "PHP", "SEI", "CLI", "SEC", "CLC", "SED", "CLD", "CLV", "NOP",
+    "BPL", "BMI", "BVC", "BVS", "BCC", "BCS", "BNE", "BEQ",
+}
+# anything else, JSR and JMP included, leaves them reflecting nothing
+# N and Z stay as they were
+KEEP = ""
+
+# reads with side effects, or of memory that changes by itself
+VOLATILE = ((0x0000, 0x0001), (0xd000, 0xdfff))
+INDIRECT = {"iz,x", "iz,y", "ind"}
+
+MAX_HOPS = 8
+# may look at or change a return address
+STACK = {"PLA", "PLP", "TSX", "TXS", "RTI", "BRK", "JAM", "JMP"}
+
+
+def effects():
+    # (mnemonic, mode): the register N and Z reflect afterwards, None for
+    # none, or KEEP
+    table = {}
+    for mnemonic, mode in ENCODE:
+        key = mnemonic, mode
+        result = RESULT.get(key, RESULT.get(mnemonic))
+        if result is None and mnemonic in PRESERVE:
+            result = KEEP
+        table[key] = result
+    return table
+
+
+EFFECTS = effects()
+
+
+def offsets(tree):
+    # names that are added to or subtracted from
+    if type(tree) is tuple:
+        if tree[0] in ("+", "-"):
+            yield from names(tree)
+        else:
+            for arg in tree[1:]:
+                yield from offsets(arg)
+
+
+def text(operand):
+    if type(operand) is int:
+        return "${:X}".format(operand)
+    elif type(operand) is str:
+        return operand
+    return "[...]"
+
+
+class Optimizer:
+    def __init__(self):
+        self.changes = []
+        self.equates = {}
+        # indexes of the rewritten items that must stay as they are
+        self.fixed = set()
+        # (index, filename) of the JMPs and branches to labels
+        self.jumps = []
+        # the index of the instruction at each label, see layout()
+        self.at = {}
+        # label: (index, block) in the items given to rewrite()
+        self.labels = {}
+        self.unsafe = set()
+        # label: whether JSR label / RTS may be JMP label, see returns()
+        self.returning = {}
+
+    def change(self, filename, lineno, msg):
+        msg = "line {}: {}".format(lineno, msg)
+        self.changes.append(
+            msg if filename is None else "{}: {}".format(filename, msg)
+        )
+
+    def volatile(self, operand, mode):
+        if mode in INDIRECT:
+            return True
+        try:
+            value = evaluate(operand, self.equates)
+        except ValueError:
+            return True
+        if value is None:
+            # a label, so memory of our own
+            return False
+        end = value + 0xff if "," in mode else value
+        return any(value <= high and low <= end for low, high in VOLATILE)
+
+    def scan(self, items):
+        # the blocks to leave alone, numbered as in rewrite(), and the
+        # values of the equates that do not depend on labels
+        protected = set()
+        equates = []
+        starts = {}
+        unsafe = set()
+        block = 0
+        fresh = True
+        for i, item in enumerate(items):
+            kind = item[0]
+            if kind == INST:
+                fresh = False
+                if type(item[3]) is tuple:
+                    if uses_pc(item[3]):
+                        unsafe.add(block)
+                    protected.update(offsets(item[3]))
+            elif kind == LABEL or kind == ORG:
+                if not fresh:
+                    block += 1
+                    fresh = True
+                if kind == LABEL:
+                    starts[item[1]] = block
+                    self.labels[item[1]] = i, block
+            elif kind == DATA:
+                fresh = False
+            elif kind == TABLE:
+                fresh = False
+                protected.update(offsets(item[1]))
+            elif kind == EQU:
+                protected.update(offsets(item[2]))
+                equates.append(item)
+        unsafe.update(starts[name] for name in protected if name in starts)
+        values = self.equates
+        while equates:
+            pending = []
+            for item in equates:
+                try:
+                    value = evaluate(item[2], values)
+                except ValueError:
+                    continue
+                if value is None:
+                    pending.append(item)
+                else:
+                    values[item[1]] = value
+            if len(pending) == len(equates):
+                break
+            equates = pending
+        self.unsafe = unsafe
+        return unsafe
+
+    def returns(self, items, name):
+        # whether the code at label name runs into an RTS without pulling,
+        # looking at the stack pointer or leaving by JMP, branching only
+        # within itself and calling only such code; nothing else can tell
+        # the JSR from a JMP
+        if name in self.returning:
+            return self.returning[name]
+        # recursion is not worth the trouble
+        self.returning[name] = ok = False
+        inside = set()
+        targets = []
+        i = self.labels[name][0] if name in self.labels else len(items)
+        for item in items[i:]:
+            kind = item[0]
+            if kind == LABEL:
+                if self.labels[item[1]][1] in self.unsafe:
+                    break
+                inside.add(item[1])
+            elif kind == INST:
+                if item[1] == "RTS":
+                    ok = all(t in inside for t in targets)
+                    break
+                elif item[1] in STACK:
+                    break
+                elif item[1] == "JSR" and (
+                    type(item[3]) is not str or
+                    not self.returns(items, item[3])
+                ):
+                    break
+                elif item[2] == ("r", ):
+                    if type(item[3]) is not str:
+                        break
+                    targets.append(item[3])
+            elif kind in (DATA, TABLE, ORG):
+                break
+        self.returning[name] = ok
+        return ok
+
+    def rewrite(self, items):
+        unsafe = self.scan(items)
+        change = self.change
+        fixed = self.fixed
+        jumps = self.jumps
+        out = []
+        append = out.append
+        filename = None
+        block = 0
+        fresh = True
+        # the value of the register in flags, if an immediate load set it;
+        # whatever makes N and Z reflect a register also writes it, and
+        # whatever else writes one makes them reflect none or another
+        known = {"A": None, "X": None, "Y": None}
+        flags = None
+        prev = prev_index = None
+        for item in items:
+            kind = item[0]
+            if kind != INST:
+                if kind == LABEL or kind == ORG:
+                    if not fresh:
+                        block += 1
+                        fresh = True
+                    flags = prev = None
+                elif kind == DATA or kind == TABLE:
+                    fresh = False
+                    flags = prev = None
+                elif kind == FILE:
+                    filename = item[1]
+                append(item)
+                continue
+            fresh = False
+            if block in unsafe:
+                fixed.add(len(out))
+                flags = prev = None
+                append(item)
+                continue
+            _, mnemonic, modes, operand, lineno = item
+            mode = modes[-1]
+            if mnemonic == "RTS" and prev is not None and \
+                    prev[1] == "JSR" and type(prev[3]) is str and \
+                    self.returns(items, prev[3]):
+                out[prev_index] = INST, "JMP", ("abs", ), prev[3], prev[4]
+                change(filename, prev[4], "JSR {} and RTS: JMP {}".format(
+                    text(prev[3]), text(prev[3])
+                ))
+                jumps.append((prev_index, filename))
+                flags = prev = None
+                continue
+            register = LOADS.get(mnemonic)
+            if register is not None and flags == register:
+                if mode == "#" and known[register] == operand:
+                    change(filename, lineno, "{} #{} again: dropped".format(
+                        mnemonic, text(operand)
+                    ))
+                    continue
+                if mode != "#" and prev is not None and \
+                        prev[1] == STORES[register] and prev[2] == modes and \
+                        prev[3] == operand and \
+                        not self.volatile(operand, mode):
+                    change(filename, lineno, "{} {} after {}: dropped".format(
+                        mnemonic, text(operand), prev[1]
+                    ))
+                    continue
+            if type(operand) is str and (
+                mode == "r" or mnemonic == "JMP" and mode == "abs"
+            ):
+                jumps.append((len(out), filename))
+            prev_index = len(out)
+            append(item)
+            prev = item
+            result = EFFECTS[mnemonic, mode]
+            if result != KEEP:
+                flags = result
+                if result is not None:
+                    known[result] = operand if register == result and \
+                        mode == "#" else None
+        return out
+
+    def target(self, items, name):
+        # the JMP at a label, if it can be jumped past
+        i = self.at.get(name)
+        if i is None or i in self.fixed:
+            return None
+        item = items[i]
+        if item[1] != "JMP" or item[2] != ("abs", ) or uses_pc(item[3]):
+            return None
+        return item
+
+    def layout(self, linker):
+        # branches and JMPs to JMPs, once sizes are known
+        if not self.jumps:
+            return
+        items = linker.items
+        at = self.at
+        labels = []
+        for i, item in enumerate(items):
+            kind = item[0]
+            if kind == LABEL:
+                labels.append(item[1])
+            elif kind == INST:
+                for name in labels:
+                    at[name] = i
+                labels = []
+            elif kind == DATA or kind == ORG or kind == TABLE:
+                labels = []
+        todo = [
+            (i, filename) for i, filename in self.jumps
+            if self.target(items, items[i][3]) is not None
+        ]
+        if not todo:
+            return
+        # addresses only matter to branches, and walk() passes every item
+        pcs = {}
+        if any(items[i][2] == ("r", ) for i, _ in todo):
+            wanted = {i for i, _ in todo}
+            pcs = {i: pc for i, pc in linker.walk() if i in wanted}
+        for i, filename in todo:
+            item = items[i]
+            branch = item[2] == ("r", )
+            pc = pcs.get(i)
+            name = item[3]
+            for _ in range(MAX_HOPS):
+                jump = self.target(items, name)
+                if jump is None:
+                    break
+                value = linker.value(jump[3], jump[-1])
+                if value is None or branch and \
+                        not -128 <= value - pc - 2 <= 127:
+                    break
+                name = jump[3]
+                if type(name) is not str:
+                    break
+            if name != item[3]:
+                items[i] = item[:3] + (name, item[4])
+                self.change(filename, item[4], "{} {} via JMP: {} {}".format(
+                    item[1], item[3], item[1], text(name)
+                ))
@@ -0,0 +1,219 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from expr import parse as parse_expr
+from hashlib import blake2b
+from os import stat
+from os.path import dirname, isfile, join
+from re import compile as re_compile, IGNORECASE
+
+# .include "file"
+# .macro name[ param[, param...]] ... .endm, used as name[ arg[, arg...]];
+#   \param in the body stands for the argument, \@ for a number unique to
+#   each expansion, for labels
+# .rept count ... .endr, \@ works here too
+OPEN = {".macro": ".endm", ".rept": ".endr"}
+DIRECTIVE = re_compile(r"\.(?:include|macro|rept|endm|endr)\b", IGNORECASE)
+MAX_DEPTH = 64
+
+
+def split_line(line):
+    # (label, directive or macro name, rest), all without the comment
+    code = line.split(";", 1)[0]
+    label = ""
+    colon = code.find(":")
+    if colon >= 0:
+        label, code = code[:colon + 1], code[colon + 1:]
+    words = code.split(None, 1)
+    if len(words) == 0:
+        return label, "", ""
+    return label, words[0].lower(), words[1].strip() if len(words) > 1 else ""
+
+
+class IncludeCache:
+    # path -> (mtime, size, digest) and digest -> split lines, so a header
+    # shared by many modules is read and split once per process, and only
+    # re-read when its mtime or size changes
+    def __init__(self):
+        self.files = {}
+        self.contents = {}
+
+    def lookup(self, path):
+        st = stat(path)
+        entry = self.files.get(path)
+        if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+            return entry[2], self.contents[entry[2]]
+        with open(path, "rb") as fh:
+            data = fh.read()
+        digest = blake2b(data, digest_size=16).digest()
+        lines = self.contents.get(digest)
+        if lines is None:
+            lines = data.decode().split("\n")
+            if len(lines) > 0 and lines[-1] == "":
+                lines.pop()
+            lines = self.contents[digest] = tuple(
+                (line, split_line(line)) for line in lines
+            )
+        self.files[path] = st.st_mtime_ns, st.st_size, digest
+        return digest, lines
+
+    def digest(self, path):
+        try:
+            return self.lookup(path)[0]
+        except OSError:
+            return None
+
+
+INCLUDES = IncludeCache()
+
+
+class Preprocessor:
+    def __init__(self, include_path=(), cache=INCLUDES):
+        self.include_path = tuple(include_path)
+        self.cache = cache
+        self.macros = {}
+        # name -> digest of every file included so far
+        self.includes = {}
+        self.expansions = 0
+        self.depth = 0
+        # [directive, rest, lines, nesting, name, lineno] while collecting
+        self.block = None
+
+    def error(self, name, lineno, msg):
+        msg = "line {}: {}".format(lineno, msg)
+        raise ValueError(msg if name is None else "{}: {}".format(name, msg))
+
+    def line(self, name, lineno, line, parts=None):
+        # (name, lineno, line) for every line the parser gets to see, or
+        # None when that is just the line itself
+        block = self.block
+        if parts is None:
+            if block is None and not self.macros and (
+                "." not in line or DIRECTIVE.search(line) is None
+            ):
+                return None
+            parts = split_line(line)
+        label, word, rest = parts
+        if block is not None:
+            if word in OPEN:
+                block[3] += 1
+            elif word in (".endm", ".endr"):
+                if block[3] == 0:
+                    self.block = None
+                    return self.close(block, word, name, lineno)
+                block[3] -= 1
+            block[2].append((name, lineno, line))
+            return ()
+        if word in OPEN:
+            if label:
+                self.error(name, lineno, "label on {}".format(word))
+            self.block = [word, rest, [], 0, name, lineno]
+            return ()
+        elif word == ".include":
+            return self.include(name, lineno, label, rest)
+        elif word in self.macros:
+            return self.expand(name, lineno, label, word, rest)
+        elif word in (".endm", ".endr"):
+            self.error(name, lineno, "{} without {}".format(word, {
+                v: k for k, v in OPEN.items()
+            }[word]))
+        return None
+
+    def lines(self, name, numbered):
+        for lineno, (line, parts) in numbered:
+            lines = self.line(name, lineno, line, parts)
+            if lines is None:
+                yield name, lineno, line
+            else:
+                yield from lines
+
+    def finish(self):
+        if self.block is not None:
+            _, _, _, _, name, lineno = self.block
+            self.error(name, lineno, "{} without {}".format(
+                self.block[0], OPEN[self.block[0]]
+            ))
+
+    def enter(self, name, lineno):
+        if self.depth >= MAX_DEPTH:
+            self.error(name, lineno, "nesting too deep")
+        self.depth += 1
+
+    def close(self, block, word, name, lineno):
+        directive, rest, body, _, start_name, start_lineno = block
+        if OPEN[directive] != word:
+            self.error(name, lineno, "{} closes {}".format(word, directive))
+        if directive == ".macro":
+            words = rest.split(None, 1)
+            if len(words) == 0:
+                self.error(start_name, start_lineno, "macro without a name")
+            params = [p.strip() for p in words[1].split(",")] \
+                if len(words) > 1 else []
+            self.macros[words[0].lower()] = params, body
+            return ()
+        count = parse_expr(rest)
+        if type(count) is not int or count < 0:
+            self.error(start_name, start_lineno, "bad .rept count")
+        return self.repeat(count, body, name, lineno)
+
+    def replay(self, body, subst):
+        self.expansions += 1
+        subst = subst + [("@", str(self.expansions))]
+        for name, lineno, line in body:
+            for param, arg in subst:
+                line = line.replace("\\" + param, arg)
+            lines = self.line(name, lineno, line)
+            if lines is None:
+                yield name, lineno, line
+            else:
+                yield from lines
+
+    def repeat(self, count, body, name, lineno):
+        self.enter(name, lineno)
+        try:
+            for _ in range(count):
+                yield from self.replay(body, [])
+        finally:
+            self.depth -= 1
+
+    def expand(self, name, lineno, label, word, rest):
+        params, body = self.macros[word]
+        args = [a.strip() for a in rest.split(",")] if rest else []
+        if len(args) != len(params):
+            self.error(name, lineno, "{} takes {} arguments, not {}".format(
+                word, len(params), len(args)
+            ))
+        self.enter(name, lineno)
+        try:
+            if label:
+                yield name, lineno, label
+            yield from self.replay(body, sorted(
+                zip(params, args), key=lambda pa: -len(pa[0])
+            ))
+        finally:
+            self.depth -= 1
+
+    def resolve(self, name, lineno, path):
+        here = dirname(name) if name is not None else ""
+        for directory in (here, ) + self.include_path:
+            candidate = join(directory, path)
+            if isfile(candidate):
+                return candidate
+        self.error(name, lineno, "cannot find {}".format(path))
+
+    def include(self, name, lineno, label, rest):
+        if len(rest) < 2 or rest[0] != '"' or rest[-1] != '"':
+            self.error(name, lineno, '.include needs a "file name"')
+        path = self.resolve(name, lineno, rest[1:-1])
+        digest, lines = self.cache.lookup(path)
+        self.includes[path] = digest
+        self.enter(name, lineno)
+        try:
+            if label:
+                yield name, lineno, label
+            yield from self.lines(path, enumerate(lines, 1))
+        finally:
+            self.depth -= 1
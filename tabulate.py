@@ -0,0 +1,100 @@
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from expr import compile_tree, integer, names, PC
+from sys import modules
+
+# The bytes of .byte, .fill and .table: an expression over the index i,
+# evaluated for the whole range at once with NumPy, or one index at a
+# time without it. Importing NumPy takes longer than evaluating 64K
+# values one at a time, so it is only used once something else has
+# imported it, like asmd.py.
+
+INDEX = "i"
+# fewer values than this are quicker one at a time
+VECTOR_MIN = 64
+
+
+def numpy(count):
+    if count < VECTOR_MIN:
+        return None
+    return modules.get("numpy")
+
+
+def unresolved(tree, symbols):
+    # the names that have no value yet, apart from the index
+    return sorted({
+        name for name in names(tree)
+        if name != INDEX and symbols.get(name) is None
+    })
+
+
+def as_bytes(values):
+    if any(v < -0x80 or v > 0xff for v in values):
+        raise ValueError("value out of range")
+    return bytes(v & 0xff for v in values)
+
+
+def scalar(tree, first, count, symbols, pc):
+    values = {name: symbols.get(name) for name in names(tree)}
+    fn = compile_tree(tree)
+    out = []
+    for i in range(first, first + count):
+        values[INDEX] = i
+        out.append(integer(fn(values, pc)))
+    return as_bytes(out)
+
+
+def vector(np, tree, index, symbols, pc):
+    if type(tree) is int:
+        return tree
+    elif type(tree) is str:
+        return index if tree == INDEX else symbols[tree]
+    elif tree == PC:
+        return pc
+    args = [vector(np, arg, index, symbols, pc) for arg in tree[1:]]
+    op = tree[0]
+    if op == "+":
+        return args[0] + args[1]
+    elif op == "-":
+        return args[0] - args[1]
+    elif op == "*":
+        return args[0] * args[1]
+    elif op == "/":
+        a, b = args
+        if np.any(np.asarray(b) == 0):
+            raise ValueError("division by zero")
+        if np.asarray(a).dtype.kind == "f" or np.asarray(b).dtype.kind == "f":
+            return np.true_divide(a, b)
+        return np.floor_divide(a, b)
+    elif op == "neg":
+        return -args[0]
+    elif op in ("<", ">"):
+        a = np.asarray(args[0])
+        if a.dtype.kind == "f":
+            a = np.rint(a).astype(np.int64)
+        return a & 0xff if op == "<" else (a >> 8) & 0xff
+    elif op in ("sin", "cos"):
+        if np.any(np.asarray(args[1]) == 0):
+            raise ValueError("division by zero")
+        fn = np.sin if op == "sin" else np.cos
+        return fn(2 * np.pi * np.asarray(args[0]) / args[1])
+    raise ValueError("cannot tabulate {}".format(op))
+
+
+def tabulate(tree, first, count, symbols, pc=None):
+    # count bytes of tree for i = first, first + 1, ...; every other
+    # name must have a value in symbols
+    np = numpy(count)
+    if np is None:
+        return scalar(tree, first, count, symbols, pc)
+    index = np.arange(first, first + count, dtype=np.int64)
+    values = np.broadcast_to(vector(np, tree, index, symbols, pc), (count, ))
+    if values.dtype.kind == "f":
+        values = np.rint(values)
+    if count > 0 and (values.min() < -0x80 or values.max() > 0xff):
+        raise ValueError("value out of range")
+    return values.astype(np.int64).astype(np.uint8).tobytes()
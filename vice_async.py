@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+from argparse import ArgumentParser
+from asyncio import (
+    create_subprocess_exec, gather, Lock, open_connection, Queue, run, sleep,
+    wait_for,
+)
+from os.path import abspath, dirname, join
+from subprocess import DEVNULL
+from sys import executable
+from tempfile import TemporaryDirectory
+from vice_test import (
+    BREAK, IDLE_PC, memory_commands, parse_ranges, parse_registers, PROMPT,
+    RECV_SIZE, Stop, STOP, unprompt,
+)
+
+
+class AsyncViceClient:
+    def __init__(self, host, port, timeout=None, interval=0.1, symbols=None):
+        self.host = host
+        self.port = int(port)
+        # timeout bounds each read, None waits for the prompt forever
+        self.timeout = timeout
+        self.interval = interval
+        # label: address, for run_to()
+        self.symbols = {} if symbols is None else symbols
+        self.reader = None
+        self.writer = None
+        self.buf = bytearray()
+        self.lock = Lock()
+
+    async def connect(self):
+        while True:
+            try:
+                self.reader, self.writer = await open_connection(
+                    self.host, self.port
+                )
+                break
+            except (ConnectionRefusedError, ConnectionAbortedError):
+                await sleep(self.interval)
+        del self.buf[:]
+        await self.read_response()
+        return self
+
+    async def read_response(self):
+        buf = self.buf
+        scan = 0
+        while True:
+            m = PROMPT.search(buf, scan)
+            if m is not None:
+                ret = bytes(buf[:m.end()])
+                del buf[:m.end()]
+                return ret
+            scan = max(0, len(buf) - 16)
+            data = await wait_for(self.reader.read(RECV_SIZE), self.timeout)
+            if len(data) == 0:
+                ret = bytes(buf)
+                del buf[:]
+                return ret
+            buf += data
+
+    async def commands(self, cmds):
+        # pipelined: all commands go out in one write, then one response
+        # per command is read back in order
+        cmds = list(cmds)
+        async with self.lock:
+            self.writer.write("".join(
+                "{}\n".format(cmd) for cmd in cmds
+            ).encode())
+            await self.writer.drain()
+            ret = []
+            for _ in cmds:
+                ret.append(unprompt((await self.read_response()).decode()))
+            return ret
+
+    async def command(self, cmd):
+        return (await self.commands((cmd, )))[0]
+
+    async def wait_ready(self):
+        # the machine is ready once it idles with a program loaded
+        number = (await self.set_breakpoints([IDLE_PC]))[0]
+        try:
+            await self.resume()
+            while (await self.command("m 0801 0802"))[9:14] == "00 00":
+                await self.resume()
+        finally:
+            await self.command("del {}".format(number))
+
+    def address(self, target):
+        if type(target) is str:
+            if target not in self.symbols:
+                raise ValueError("unknown label {}".format(target))
+            return self.symbols[target]
+        return target
+
+    async def set_breakpoints(self, addresses):
+        numbers = []
+        for addr, output in zip(addresses, await self.commands(
+            "break {:04x}".format(addr) for addr in addresses
+        )):
+            m = BREAK.search(output)
+            if m is None:
+                raise ValueError("no breakpoint at ${:04x}: {}".format(
+                    addr, output.strip()
+                ))
+            numbers.append(int(m.group(1)))
+        return numbers
+
+    async def resume(self, timeout=None):
+        # like ViceClient.resume, timeout bounds the wait for a checkpoint
+        async with self.lock:
+            saved, self.timeout = self.timeout, timeout
+            try:
+                self.writer.write(b"x\n")
+                await self.writer.drain()
+                output = unprompt((await self.read_response()).decode())
+            finally:
+                self.timeout = saved
+        m = STOP.search(output)
+        if m is None:
+            raise ValueError("no checkpoint was reached: {}".format(
+                output.strip()
+            ))
+        return int(m.group(2), 16)
+
+    async def run_to(self, *targets, memory=(), timeout=None):
+        # see ViceClient.run_to
+        assert(len(targets) > 0)
+        addresses = [self.address(t) for t in targets]
+        numbers = await self.set_breakpoints(addresses)
+        dels = ["del {}".format(n) for n in numbers]
+        try:
+            address = await self.resume(timeout)
+        except BaseException:
+            await self.commands(dels)
+            raise
+        memory = list(memory)
+        outputs = await self.commands(
+            ["r"] + list(memory_commands(memory)) + dels
+        )
+        return Stop(
+            address, targets[addresses.index(address)]
+            if address in addresses else None,
+            parse_registers(outputs[0]), parse_ranges(outputs[1:], memory)
+        )
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+
+class Instance:
+    def __init__(self, proc, client, snapshot):
+        self.proc = proc
+        self.client = client
+        self.snapshot = snapshot
+
+
+class VicePool:
+    def __init__(self, size, autoload, base_port=9998, host="localhost",
+                 command=("x64", )):
+        self.size = size
+        self.autoload = abspath(autoload)
+        self.base_port = base_port
+        self.host = host
+        self.command = tuple(command)
+        self.instances = []
+        self.idle = Queue()
+        self.tmpdir = None
+
+    async def start_instance(self, i):
+        address = "{}:{}".format(self.host, self.base_port + i)
+        proc = await create_subprocess_exec(
+            *self.command, "-autoload", self.autoload,
+            "-remotemonitor", "-remotemonitoraddress", address,
+            stdin=DEVNULL, stdout=DEVNULL,
+        )
+        client = AsyncViceClient(self.host, self.base_port + i)
+        await client.connect()
+        await client.wait_ready()
+        # every job starts from this snapshot instead of a fresh x64
+        snapshot = join(self.tmpdir.name, "{}.vsf".format(i))
+        await client.command('dump "{}"'.format(snapshot))
+        return Instance(proc, client, snapshot)
+
+    async def start(self):
+        self.tmpdir = TemporaryDirectory()
+        self.instances = await gather(*(
+            self.start_instance(i) for i in range(self.size)
+        ))
+        for instance in self.instances:
+            self.idle.put_nowait(instance)
+        return self
+
+    async def run(self, job, prg=None):
+        instance = await self.idle.get()
+        try:
+            cmds = ['undump "{}"'.format(instance.snapshot)]
+            if prg is not None:
+                cmds.append('l "{}" 0'.format(abspath(prg)))
+            await instance.client.commands(cmds)
+            return await job(instance.client)
+        finally:
+            self.idle.put_nowait(instance)
+
+    async def map(self, job, prgs):
+        return await gather(*(self.run(job, prg) for prg in prgs))
+
+    async def close(self):
+        for instance in self.instances:
+            instance.client.writer.write(b"quit\n")
+            await instance.client.close()
+        for instance in self.instances:
+            if instance.proc.returncode is None:
+                instance.proc.terminate()
+            await instance.proc.wait()
+        self.instances = []
+        if self.tmpdir is not None:
+            self.tmpdir.cleanup()
+            self.tmpdir = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def check(client):
+    return await client.commands(("d 080d 0819", "d 0830 083b", "m 0900 0907"))
+
+
+async def run_pool(args):
+    command = ("x64", )
+    if args.stub:
+        command = executable, join(dirname(abspath(__file__)), "vice_stub.py")
+    async with VicePool(args.instances, args.input[0], args.port,
+                        command=command) as pool:
+        for prg, out in zip(args.input, await pool.map(check, args.input)):
+            print(prg)
+            for x in out:
+                print(x)
+
+
+def main():
+    ap = ArgumentParser(description="run PRGs on a pool of x64 instances")
+    ap.add_argument("input", metavar="FILE", nargs="+")
+    ap.add_argument("-n", "--instances", dest="instances", type=int,
+                    default=2)
+    ap.add_argument("-p", "--port", dest="port", type=int, default=9998,
+                    help="remote monitor port of the first instance")
+    ap.add_argument("--stub", dest="stub", action="store_true",
+                    help="use vice_stub.py instead of x64")
+    run(run_pool(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016, mar77i <mar77i at mar77i dot ch>
+#
+# This software may be modified and distributed under the terms
+# of the ISC license.  See the LICENSE file for details.
+
+# A stand-in for x64's remote monitor, backed by cpu6502. It takes the
+# same -remotemonitor flags as x64 and answers the monitor commands the
+# clients in this repository use, so they can be exercised on machines
+# without VICE. There is no C64 behind it: no ROMs, no I/O, no BASIC.
+
+from argparse import ArgumentParser
+from cpu6502 import CPU6502
+from disasm import disassemble
+from pickle import dump, load
+from socket import AF_INET, SO_REUSEADDR, SOCK_STREAM, socket, SOL_SOCKET
+from struct import pack, unpack_from
+from threading import Thread
+from vice_test import (
+    API_VERSION, IDLE_PC, MEMORY_GET, MEMORY_SET, parse_address, STX
+)
+
+RUN_LIMIT = 10000000
+
+
+def parse_hex(x):
+    return int(x.lstrip("$"), 16)
+
+
+class MonitorStub:
+    def __init__(self, autoload=None):
+        self.cpu = CPU6502()
+        # x64 idles in the BASIC input loop, ViceClient.connect waits for
+        # it with a breakpoint; here it is JMP IDLE_PC
+        self.cpu.mem[IDLE_PC:IDLE_PC + 3] = bytes((
+            0x4c, IDLE_PC & 0xff, IDLE_PC >> 8
+        ))
+        self.cpu.pc = IDLE_PC
+        self.breakpoints = {}
+        self.number = 0
+        self.quit = False
+        if autoload is not None:
+            with open(autoload, "rb") as fh:
+                self.cpu.load_prg(fh.read())
+
+    def prompt(self):
+        return "(C:${:04x}) ".format(self.cpu.pc)
+
+    def registers(self):
+        cpu = self.cpu
+        return "  ADDR A  X  Y  SP 00 01 NV-BDIZC LIN CYC  STOPWATCH\n" \
+            ".;{:04x} {:02x} {:02x} {:02x} {:02x} {:02x} {:02x} {:08b} " \
+            "000 000    0\n".format(
+                cpu.pc, cpu.a, cpu.x, cpu.y, cpu.s, cpu.mem[0], cpu.mem[1],
+                cpu.get_p()
+            )
+
+    def memory(self, start, end):
+        mem = self.cpu.mem
+        out = []
+        for addr in range(start, end + 1, 16):
+            row = mem[addr:min(addr + 16, end + 1)]
+            groups = [row[i:i + 4].hex(" ") for i in range(0, len(row), 4)]
+            out.append(">C:{:04x}  {:<53}{}\n".format(
+                addr, "  ".join(groups), "".join(
+                    chr(x) if 0x20 <= x < 0x7f else "." for x in row
+                )
+            ))
+        return "".join(out)
+
+    def run(self):
+        cpu = self.cpu
+        for n in range(RUN_LIMIT):
+            if cpu.halted:
+                break
+            if cpu.pc in self.breakpoints and n > 0:
+                number = self.breakpoints[cpu.pc]
+                return "#{} (Stop on  exec {:04x})  {}".format(
+                    number, cpu.pc, self.registers().split("\n")[1]
+                ) + "\n"
+            cpu.step()
+        return ""
+
+    def command(self, line):
+        args = line.split()
+        if len(args) == 0:
+            return ""
+        cmd = args[0].lower()
+        cpu = self.cpu
+        if cmd in ("m", "mem"):
+            start = parse_hex(args[1]) if len(args) > 1 else 0
+            end = parse_hex(args[2]) if len(args) > 2 else start + 0x7f
+            return self.memory(start, end)
+        elif cmd == ">":
+            addr = parse_hex(args[1])
+            data = bytes(parse_hex(x) for x in args[2:])
+            cpu.mem[addr:addr + len(data)] = data
+        elif cmd == "r":
+            if len(args) > 1:
+                for assign in " ".join(args[1:]).split(","):
+                    reg, value = assign.split("=")
+                    reg = reg.strip().lower()
+                    if reg == "pc":
+                        cpu.pc = parse_hex(value)
+                    elif reg == "sp":
+                        cpu.s = parse_hex(value)
+                    else:
+                        setattr(cpu, reg, parse_hex(value))
+                return ""
+            return self.registers()
+        elif cmd in ("d", "disass"):
+            start = parse_hex(args[1]) if len(args) > 1 else cpu.pc
+            end = parse_hex(args[2]) if len(args) > 2 else start + 0x20
+            return "".join(
+                "{}\n".format(x)
+                for x in disassemble(cpu.mem, 0, start, end)
+            )
+        elif cmd in ("l", "load"):
+            with open(line.split('"')[1], "rb") as fh:
+                data = fh.read()
+            org = cpu.load_prg(data)
+            return "Loading {} from {:04X} to {:04X} ({:04X} bytes)\n".format(
+                line.split('"')[1], org, org + len(data) - 3, len(data) - 2
+            )
+        elif cmd == "dump":
+            with open(line.split('"')[1], "wb") as fh:
+                dump((bytes(cpu.mem), cpu.pc, cpu.a, cpu.x, cpu.y, cpu.s,
+                      cpu.get_p()), fh)
+        elif cmd == "undump":
+            with open(line.split('"')[1], "rb") as fh:
+                mem, cpu.pc, cpu.a, cpu.x, cpu.y, cpu.s, p = load(fh)
+            cpu.mem[:] = mem
+            cpu.set_p(p)
+            cpu.halted = False
+        elif cmd in ("break", "bk"):
+            addr = parse_hex(args[1])
+            self.number += 1
+            number = self.number
+            self.breakpoints[addr] = number
+            return "BREAK: {}  C:${:04x}  (Stop on exec)\n".format(
+                number, addr
+            )
+        elif cmd in ("del", "delete"):
+            if len(args) > 1:
+                number = int(args[1])
+                self.breakpoints = {
+                    addr: n for addr, n in self.breakpoints.items()
+                    if n != number
+                }
+            else:
+                self.breakpoints = {}
+        elif cmd in ("g", "goto"):
+            if len(args) > 1:
+                cpu.pc = parse_hex(args[1])
+            return self.run()
+        elif cmd in ("x", "exit"):
+            return self.run()
+        elif cmd == "quit":
+            self.quit = True
+        else:
+            return "*** Unknown command {}\n".format(cmd)
+        return ""
+
+    def binary_command(self, cmd, body):
+        mem = self.cpu.mem
+        if cmd in (MEMORY_GET, MEMORY_SET):
+            _, start, end, memspace, _ = unpack_from("<BHHBH", body)
+            if memspace != 0 or end < start:
+                return 0x80, b""
+            if cmd == MEMORY_GET:
+                data = mem[start:end + 1]
+                return 0, pack("<H", len(data) & 0xffff) + data
+            mem[start:end + 1] = body[8:8 + end + 1 - start]
+            return 0, b""
+        return 0x83, b""
+
+    def serve_binary(self, conn):
+        buf = bytearray()
+        while not self.quit:
+            data = conn.recv(1 << 16)
+            if len(data) == 0:
+                return
+            buf += data
+            while len(buf) >= 11:
+                _, _, length, request_id, cmd = unpack_from("<BBIIB", buf)
+                if len(buf) < 11 + length:
+                    break
+                error, body = self.binary_command(cmd, buf[11:11 + length])
+                del buf[:11 + length]
+                conn.sendall(pack(
+                    "<BBIBBI", STX, API_VERSION, len(body), cmd, error,
+                    request_id
+                ) + body)
+
+    def serve(self, conn):
+        conn.sendall(self.prompt().encode())
+        buf = b""
+        while not self.quit:
+            data = conn.recv(1 << 16)
+            if len(data) == 0:
+                return
+            *lines, buf = (buf + data).split(b"\n")
+            for line in lines:
+                out = self.command(line.decode().strip())
+                if self.quit:
+                    return
+                conn.sendall((out + self.prompt()).encode())
+
+
+def listen(address, serve, stub):
+    server = socket(AF_INET, SOCK_STREAM)
+    server.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+    server.bind(tuple(parse_address(address)))
+    server.listen(1)
+    while not stub.quit:
+        conn, _ = server.accept()
+        with conn:
+            serve(conn)
+
+
+def main():
+    ap = ArgumentParser(description="stand-in for the x64 remote monitor")
+    ap.add_argument("-remotemonitor", action="store_true")
+    ap.add_argument("-remotemonitoraddress", default="localhost:6510")
+    ap.add_argument("-binarymonitor", action="store_true")
+    ap.add_argument("-binarymonitoraddress", default="ip4://127.0.0.1:6502")
+    ap.add_argument("-autoload", default=None)
+    args = ap.parse_args()
+    stub = MonitorStub(args.autoload)
+    if args.binarymonitor:
+        Thread(target=listen, daemon=True, args=(
+            args.binarymonitoraddress, stub.serve_binary, stub
+        )).start()
+    listen(args.remotemonitoraddress, stub.serve, stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,42 @@
 #!/usr/bin/env python3
 
+from collections import namedtuple
 from os import fork
+from re import compile as re_compile
 from time import sleep
-from socket import AF_INET, MSG_DONTWAIT, SOCK_STREAM, socket, timeout
+from socket import (
+    AF_INET, create_connection, IPPROTO_TCP, SO_RCVBUF, SOCK_STREAM, socket,
+    SOL_SOCKET, TCP_NODELAY, timeout
+)
+from struct import pack, unpack_from
 from subprocess import DEVNULL, run
 from sys import argv
 
+# the monitor ends every response with a "(C:$xxxx) " prompt
+PROMPT = re_compile(rb"(?:^|\n)\(C:\$[0-9a-fA-F]{4}\) ")
+RECV_SIZE = 1 << 16
+# "BREAK: 1  C:$e5cf  (Stop on exec)" after "break e5cf"
+BREAK = re_compile(r"BREAK: (\d+)\s+C:\$([0-9a-fA-F]{4})")
+# "#1 (Stop on  exec e5cf) ..." when the machine runs into one
+STOP = re_compile(r"#(\d+) \(Stop on\s+exec ([0-9a-fA-F]{4})\)")
+# the BASIC input loop, where x64 idles once a program is loaded
+IDLE_PC = 0xe5cf
+
+# VICE binary monitor protocol (-binarymonitor)
+STX = 0x02
+API_VERSION = 0x02
+MEMORY_GET = 0x01
+MEMORY_SET = 0x02
+EVENT_ID = 0xffffffff
+BINARY_CHUNK = 0x8000
+# text fallback: bytes per "m" and ">" command
+TEXT_CHUNK = 0x1000
+TEXT_WRITE_CHUNK = 0x40
+
 
 def parse_address(addr):
+    if "://" in addr:
+        addr = addr.split("://", 1)[1]
     addr = addr.split(":")
     assert(len(addr) == 2)
     yield addr[0]
@@ -22,16 +51,149 @@ def unprompt(output):
     return "\n".join(output)
 
 
+# where run_to() stopped, with the registers by the names "r" gives them
+# (PC for ADDR, P for NV-BDIZC) and the memory ranges asked for
+Stop = namedtuple("Stop", ["address", "target", "registers", "memory"])
+
+
+def parse_registers(output):
+    # "  ADDR A  X  Y  SP 00 01 NV-BDIZC LIN CYC  STOPWATCH"
+    # ".;e5cf 00 00 0a f3 2f 37 00100010 000 000    0"
+    lines = [line for line in output.split("\n") if line.strip()]
+    regs = {}
+    for name, value in zip(lines[0].split(), lines[1].split()):
+        if name == "ADDR":
+            regs["PC"] = int(value.lstrip(".;"), 16)
+        elif name == "NV-BDIZC":
+            regs["P"] = int(value, 2)
+        elif name in ("LIN", "CYC", "STOPWATCH"):
+            regs[name] = int(value)
+        else:
+            regs[name] = int(value, 16)
+    return regs
+
+
+def memory_commands(ranges):
+    # "m" commands for (start, end) ranges, end inclusive
+    for start, end in ranges:
+        for addr in range(start, end + 1, TEXT_CHUNK):
+            yield "m {:04x} {:04x}".format(
+                addr, min(addr + TEXT_CHUNK - 1, end)
+            )
+
+
+def parse_ranges(outputs, ranges):
+    # the memory of each range from the responses to memory_commands()
+    outputs = iter(outputs)
+    ret = []
+    for start, end in ranges:
+        view = bytearray(end + 1 - start)
+        for _ in range(start, end + 1, TEXT_CHUNK):
+            parse_memory(next(outputs), start, view)
+        ret.append(view)
+    return ret
+
+
+def parse_memory(output, start, view):
+    # fills view from "m" output lines ">C:0800  00 01 02 03  ...   ...."
+    for line in output.split("\n"):
+        if line[0:3] != ">C:":
+            continue
+        offset = int(line[3:7], 16) - start
+        data = bytes.fromhex(line[9:].split("   ", 1)[0])
+        view[offset:offset + len(data)] = data
+
+
+class BinaryMonitor:
+    def __init__(self, host, port, timeout=None):
+        self.sock = create_connection((host, int(port)), timeout)
+        # requests are pipelined, don't let Nagle hold them back
+        self.sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self.sock.setsockopt(SOL_SOCKET, SO_RCVBUF, RECV_SIZE * 4)
+        self.request_id = 0
+        self.header = memoryview(bytearray(12))
+
+    def recv_exact(self, view):
+        while len(view) > 0:
+            n = self.sock.recv_into(view)
+            if n == 0:
+                raise ConnectionError("binary monitor closed the connection")
+            view = view[n:]
+
+    def request(self, cmd, *body):
+        self.request_id = (self.request_id + 1) & 0x7fffffff
+        length = sum(len(x) for x in body)
+        self.sock.sendmsg([
+            pack("<BBIIB", STX, API_VERSION, length, self.request_id, cmd)
+        ] + list(body))
+        return self.request_id
+
+    def response(self, request_id, into=None):
+        # events (request id 0xffffffff) that arrive in between are skipped
+        while True:
+            self.recv_exact(self.header)
+            stx, _, length, kind, error, rid = unpack_from(
+                "<BBIBBI", self.header
+            )
+            assert(stx == STX)
+            if rid == request_id and into is not None and error == 0:
+                size = bytearray(2)
+                self.recv_exact(memoryview(size))
+                size = size[0] | size[1] << 8
+                assert(size == len(into) and length == size + 2)
+                self.recv_exact(into)
+                return
+            body = bytearray(length)
+            self.recv_exact(memoryview(body))
+            if rid == EVENT_ID:
+                continue
+            if error != 0:
+                raise ValueError("binary monitor error {:02x}".format(error))
+            assert(rid == request_id)
+            return body
+
+    def read_memory(self, start, view):
+        chunks = []
+        for offset in range(0, len(view), BINARY_CHUNK):
+            n = min(BINARY_CHUNK, len(view) - offset)
+            chunks.append((self.request(MEMORY_GET, pack(
+                "<BHHBH", 0, start + offset, start + offset + n - 1, 0, 0
+            )), view[offset:offset + n]))
+        for request_id, into in chunks:
+            self.response(request_id, into)
+
+    def write_memory(self, start, view):
+        ids = []
+        for offset in range(0, len(view), BINARY_CHUNK):
+            n = min(BINARY_CHUNK, len(view) - offset)
+            ids.append(self.request(MEMORY_SET, pack(
+                "<BHHBH", 0, start + offset, start + offset + n - 1, 0, 0
+            ), view[offset:offset + n]))
+        for request_id in ids:
+            self.response(request_id)
+
+    def close(self):
+        self.sock.close()
+
+
 class ViceClient:
-    def __init__(self, host, port, timeout=1):
+    def __init__(self, host, port, timeout=1, binary=None, symbols=None,
+                 interval=0.1):
         self.host = host
         self.port = int(port)
         self.timeout = timeout
+        # between attempts to connect while x64 is starting up
+        self.interval = interval
+        # "host:port" of the binary monitor, if x64 runs one
+        self.binary_address = binary
+        self.binary = None
+        # label: address, for run_to(), e.g. MOS6502Parser(...).labels
+        self.symbols = {} if symbols is None else symbols
         self.sock = None
         self.cp = 0
-        while not self.connect():
-            self.sock.close()
-            sleep(self.timeout)
+        self.buf = bytearray()
+        self.chunk = memoryview(bytearray(RECV_SIZE))
+        self.connect()
 
     def connect_when_available(self):
         while True:
@@ -42,36 +204,114 @@ class ViceClient:
                 pass
             except ConnectionAbortedError:
                 pass
-            sleep(self.timeout)
+            sleep(self.interval)
 
     def connect(self):
         self.sock = socket(AF_INET, SOCK_STREAM)
+        self.sock.setsockopt(SOL_SOCKET, SO_RCVBUF, RECV_SIZE * 4)
         self.connect_when_available()
         self.sock.settimeout(self.timeout)
-        self.command("m 0800 0807")
-        self.check_cp()
-        return not self.basic_empty() and \
-            self.cp in (0xe5d1, 0xe5d4, 0xe5cd, 0xe5cf)
+        del self.buf[:]
+        # entering the monitor on connect prints the first prompt
+        self.readall()
+        # the machine is ready once it idles with a program loaded
+        number = self.set_breakpoints([IDLE_PC])[0]
+        try:
+            self.resume()
+            while self.basic_empty():
+                self.resume()
+        finally:
+            self.command("del {}".format(number))
+        self.cp = IDLE_PC
 
     def check_cp(self):
-        regs = self.command("r").split("\n")
-        if len(regs) == 3:
-            self.cp = int(regs[1][2:6], 16)
+        self.cp = parse_registers(self.command("r"))["PC"]
+
+    def address(self, target):
+        if type(target) is str:
+            if target not in self.symbols:
+                raise ValueError("unknown label {}".format(target))
+            return self.symbols[target]
+        return target
+
+    def set_breakpoints(self, addresses):
+        # their checkpoint numbers
+        numbers = []
+        for addr, output in zip(addresses, self.commands(
+            "break {:04x}".format(addr) for addr in addresses
+        )):
+            m = BREAK.search(output)
+            if m is None:
+                raise ValueError("no breakpoint at ${:04x}: {}".format(
+                    addr, output.strip()
+                ))
+            numbers.append(int(m.group(1)))
+        return numbers
+
+    def resume(self, timeout=None):
+        # leaves the monitor and waits until a checkpoint enters it again,
+        # the address it stopped at; timeout None waits forever
+        self.sock.settimeout(timeout)
+        try:
+            output = self.command("x")
+        finally:
+            self.sock.settimeout(self.timeout)
+        m = STOP.search(output)
+        if m is None:
+            raise ValueError("no checkpoint was reached: {}".format(
+                output.strip()
+            ))
+        return int(m.group(2), 16)
+
+    def run_to(self, *targets, memory=(), timeout=None):
+        # runs on until the first of targets, labels or addresses; the
+        # registers and memory, (start, end) ranges, come back in the one
+        # exchange that also clears the breakpoints
+        assert(len(targets) > 0)
+        addresses = [self.address(t) for t in targets]
+        numbers = self.set_breakpoints(addresses)
+        dels = ["del {}".format(n) for n in numbers]
+        try:
+            address = self.resume(timeout)
+        except BaseException:
+            self.commands(dels)
+            raise
+        memory = list(memory)
+        outputs = self.commands(
+            ["r"] + list(memory_commands(memory)) + dels
+        )
+        self.cp = address
+        return Stop(
+            address, targets[addresses.index(address)]
+            if address in addresses else None,
+            parse_registers(outputs[0]), parse_ranges(outputs[1:], memory)
+        )
 
     def basic_empty(self):
         return self.command("m 0801 0802")[9:14] == "00 00"
 
     def readall(self):
-        ret = []
-        try:
-            ret.append(self.sock.recv(1024))
-            while len(ret[-1]) > 0:
-                ret.append(self.sock.recv(1024))
-        except timeout:
-            pass
-        if len(ret) and not len(ret[-1]):
-            ret.pop()
-        return b"".join(ret)
+        # returns everything up to and including the next prompt, the
+        # timeout only bounds how long a missing prompt is waited for
+        buf = self.buf
+        scan = 0
+        while True:
+            m = PROMPT.search(buf, scan)
+            if m is not None:
+                ret = bytes(buf[:m.end()])
+                del buf[:m.end()]
+                return ret
+            # a partial prompt may straddle two reads
+            scan = max(0, len(buf) - 16)
+            try:
+                n = self.sock.recv_into(self.chunk)
+            except timeout:
+                n = 0
+            if n == 0:
+                ret = bytes(buf)
+                del buf[:]
+                return ret
+            buf += self.chunk[:n]
 
     def command(self, cmd):
         cmd = "{}\n".format(cmd)
@@ -81,6 +321,48 @@ class ViceClient:
         #print("<", len(ret), ret.replace("\n", "\\n"))
         return ret
 
+    def commands(self, cmds):
+        # pipelined: one write, then one prompt-terminated response each
+        cmds = list(cmds)
+        self.sock.sendall("".join(
+            "{}\n".format(cmd) for cmd in cmds
+        ).encode())
+        return [unprompt(self.readall().decode()) for _ in cmds]
+
+    def binary_monitor(self):
+        if self.binary is None and self.binary_address is not None:
+            self.binary = BinaryMonitor(
+                *parse_address(self.binary_address), self.timeout
+            )
+        return self.binary
+
+    def read_memory(self, start, buf):
+        # fills buf (bytearray or writable memoryview) from start on
+        view = memoryview(buf).cast("B")
+        if self.binary_monitor() is not None:
+            self.binary.read_memory(start, view)
+            return buf
+        cmds = []
+        for offset in range(0, len(view), TEXT_CHUNK):
+            n = min(TEXT_CHUNK, len(view) - offset)
+            cmds.append("m {:04x} {:04x}".format(
+                start + offset, start + offset + n - 1
+            ))
+        for output in self.commands(cmds):
+            parse_memory(output, start, view)
+        return buf
+
+    def write_memory(self, start, data):
+        view = memoryview(data).cast("B")
+        if self.binary_monitor() is not None:
+            self.binary.write_memory(start, view)
+            return
+        self.commands([
+            "> {:04x} {}".format(
+                start + offset, view[offset:offset + TEXT_WRITE_CHUNK].hex(" ")
+            ) for offset in range(0, len(view), TEXT_WRITE_CHUNK)
+        ])
+
 
 def main():
     vice_cmd = [